@@ -0,0 +1,47 @@
+import threading
+
+from pyairtable import Api
+
+import rate_limiter
+
+# One pooled, keep-alive HTTP transport for all Airtable traffic in the process.
+#
+# Every session and the outbox flusher share the same Api and requests Session, so
+# connections (and their TLS handshakes) are reused instead of being opened per
+# session or per call. The session is routed through the shared rate limiter.
+
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 30
+POOL_SIZE = 10
+# Base URL of the Airtable API - only changed to point at a stand-in server (see benchmarks/)
+ENDPOINT_URL = None
+
+_lock = threading.Lock()
+_apis = {}
+
+
+def configure(connect_timeout=None, read_timeout=None, pool_size=None, endpoint_url=None):
+    """Change timeouts, pool size and endpoint (applies to Api objects created afterwards)"""
+    global CONNECT_TIMEOUT, READ_TIMEOUT, POOL_SIZE, ENDPOINT_URL
+    if endpoint_url:
+        ENDPOINT_URL = endpoint_url
+    if connect_timeout:
+        CONNECT_TIMEOUT = float(connect_timeout)
+    if read_timeout:
+        READ_TIMEOUT = float(read_timeout)
+    if pool_size:
+        POOL_SIZE = int(pool_size)
+
+
+def get_api(api_key):
+    """Shared pyairtable Api for an API key, created on first use"""
+    with _lock:
+        api = _apis.get(api_key)
+        if api is None:
+            # pyairtable's own retries are off - the rate limiter retries 429s for every caller
+            options = {'endpoint_url': ENDPOINT_URL} if ENDPOINT_URL else {}
+            api = Api(api_key, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), retry_strategy=False, **options)
+            rate_limiter.install(api.session, pool_size=POOL_SIZE)
+            _apis[api_key] = api
+        return api
+
@@ -1,10 +1,17 @@
 import os
 import streamlit as st
 import pandas as pd
-from pyairtable import Api, Base, Table
-from dotenv import load_dotenv
-import requests
+import numpy as np
 import math
+import time
+from concurrent import futures
+import airtable_client
+import disk_snapshot
+import metrics
+import outbox
+import rate_limiter
+import risk_scoring
+import risk_store
 
 # Load configuration from environment variables or streamlit secrets
 # Streamlit secrets are defined in .streamlit/secrets.toml
@@ -14,6 +21,73 @@ RISK_REGISTER_TABLE_ID = st.secrets.get("airtable", {}).get("AIRTABLE_TABLE_ID",
 RISK_TYPES_TABLE_ID = st.secrets.get("airtable", {}).get("RISK_TYPES_TABLE_ID", "")
 RISK_CHANGES_TABLE_ID = st.secrets.get("airtable", {}).get("RISK_CHANGES_TABLE_ID", "tblRw7CFjBSPvMNcs")  # Use hardcoded ID as fallback
 RISK_CHANGES_TABLE_NAME = "Risk Changes History"  # Changed to "History" as requested
+# How long (in seconds) the shared Risk Register snapshot is reused before it is re-fetched
+REGISTER_SNAPSHOT_TTL = float(st.secrets.get("airtable", {}).get("REGISTER_SNAPSHOT_TTL", 300))
+# "delta" refreshes only fetch records modified since the last sync, "full" re-downloads the whole register
+REGISTER_SYNC_MODE = st.secrets.get("airtable", {}).get("REGISTER_SYNC_MODE", "delta")
+# "full" keeps the whole register in memory; "filtered" only fetches the risks matching the
+# ABBYY page's filters (filtered by Airtable, with only the fields the pages show)
+REGISTER_LOAD_MODE = st.secrets.get("airtable", {}).get("REGISTER_LOAD_MODE", "full")
+# How often (in seconds) a delta sync also lists all record IDs to pick up deleted risks
+REGISTER_RECONCILE_INTERVAL = float(st.secrets.get("airtable", {}).get("REGISTER_RECONCILE_INTERVAL", 3600))
+# How long (in seconds) the shared Risk Changes History index is used before it is delta-synced
+RISK_CHANGES_TTL = float(st.secrets.get("airtable", {}).get("RISK_CHANGES_TTL", 60))
+# Local SQLite file that queues saves until they have been written to Airtable
+OUTBOX_PATH = st.secrets.get("airtable", {}).get("OUTBOX_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "outbox.sqlite3"))
+outbox.configure(OUTBOX_PATH)
+# Directory holding the on-disk copy of the register used for fast restarts and offline
+# (read-only) use - set it to "" to turn the copy off
+SNAPSHOT_DIR = st.secrets.get("airtable", {}).get("SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshot"))
+disk_snapshot.configure(SNAPSHOT_DIR)
+# Airtable allows 5 requests per second per base - shared by every session in this process
+rate_limiter.configure(
+    requests_per_second=st.secrets.get("airtable", {}).get("REQUESTS_PER_SECOND", 5),
+    max_retries=st.secrets.get("airtable", {}).get("RATE_LIMIT_RETRIES", 5)
+)
+# One pooled keep-alive connection pool shared by all Airtable calls in this process
+airtable_client.configure(
+    connect_timeout=st.secrets.get("airtable", {}).get("CONNECT_TIMEOUT", 5),
+    read_timeout=st.secrets.get("airtable", {}).get("READ_TIMEOUT", 30),
+    pool_size=st.secrets.get("airtable", {}).get("HTTP_POOL_SIZE", 10),
+    endpoint_url=st.secrets.get("airtable", {}).get("AIRTABLE_ENDPOINT_URL")
+)
+# Where to write performance metrics ("prometheus" text file or "jsonl" lines) - off by default
+metrics.configure(
+    path=st.secrets.get("airtable", {}).get("METRICS_PATH", ""),
+    export_format=st.secrets.get("airtable", {}).get("METRICS_FORMAT", "prometheus"),
+    interval=st.secrets.get("airtable", {}).get("METRICS_INTERVAL", 15)
+)
+metrics.start_exporter()
+for table_id, table_name in [(RISK_REGISTER_TABLE_ID, "risk_register"), (RISK_TYPES_TABLE_ID, "risk_types"),
+                             (RISK_CHANGES_TABLE_ID, "risk_changes")]:
+    if table_id:
+        metrics.name_table(table_id, table_name)
+# Show the timings of the last rerun and Airtable request stats in the sidebar
+SHOW_PERFORMANCE_PANEL = bool(st.secrets.get("airtable", {}).get("SHOW_PERFORMANCE_PANEL", False))
+
+# Risk Changes History field IDs for each value saved with an ABBYY response
+RISK_CHANGE_FIELD_IDS = {
+    'risk_reference': "fldJwiM65ftTV4wA3",  # Original Risk Reference - TEXT FIELD, use string
+    'fh_personnel': "fldMvXyJc8zCAHJJg",  # FH Personnel
+    'abbyy_personnel': "fld6RKhK7kWfsJost",  # ABBYY Personnel
+    'status': "fldfTsmdEsXG2dcAo",  # Status
+    'risk_category': "flde0fUGwJlykaRnM",  # Risk Category - text field
+    'risk_type': "fldYdVmw8pCKyRagq",  # Risk Type - linked record IDs if available, otherwise text
+    'risk_description': "fldrpv5xlWDVnIE5d",  # Risk Description
+    'impact': "fldDmecXGLkpnK8lM",  # Impact
+    'root_causes': "fldcXaPheiACBgbEv",  # Root Causes
+    'components': "fldqf7xmu3Z2EgTm0",  # Components
+    'original_severity': "fldTr9bdRevGV7zyi",  # Original Severity Level
+    'new_severity': "fldEYZSgQTr00GHf5",  # New Severity Level
+    'original_likelihood': "fldUZEGlpdaMMGTC9",  # Original Likelihood Level
+    'new_likelihood': "fld860nkAw1DUJaro",  # New Likelihood Level
+    'original_detectability': "fldXO1FfoUa89lnsA",  # Original Detectability Level
+    'new_detectability': "fld60ppjc9HEM8RPo",  # New Detectability Level
+    'original_risk_level': "fldXsSjjUWPjRftIm",  # Original Overall Risk Level
+    'new_risk_level': "fldDJXURZKKyfz8pg",  # New Overall Risk Level
+    'abbyy_response': "fldQ66bxR2keyBdHm",  # ABBYY's Response
+    'abbyy_comment': "fldv1dx6ISiPTrzx4",  # ABBYY Comments
+}
 
 # Debug mode - disable by default for production
 show_debug = False
@@ -30,38 +104,14 @@ def connect_to_airtable():
         return None, None, None
     
     try:
-        api = Api(AIRTABLE_API_KEY)
-        risk_register_table = Table(AIRTABLE_API_KEY, BASE_ID, RISK_REGISTER_TABLE_ID)
-        
-        # Try to access Risk Types table but don't fail if it's not accessible
-        try:
-            risk_types_table = Table(AIRTABLE_API_KEY, BASE_ID, RISK_TYPES_TABLE_ID) if RISK_TYPES_TABLE_ID else None
-            # Test if we can access it by getting a record
-            if risk_types_table:
-                risk_types_table.first()
-                st.sidebar.success("Connected to Risk Types table successfully")
-        except Exception as e:
-            st.warning(f"Could not access Risk Types table: {e}")
-            st.info("Risk Type names will be shown as IDs. Check your API token permissions.")
-            risk_types_table = None
-        
-        # Access risk changes table
-        try:
-            if RISK_CHANGES_TABLE_ID:
-                risk_changes_table = Table(AIRTABLE_API_KEY, BASE_ID, RISK_CHANGES_TABLE_ID)
-                try:
-                    risk_changes_table.first()
-                    st.sidebar.success(f"Connected to '{RISK_CHANGES_TABLE_NAME}' table successfully")
-                except Exception as e:
-                    st.warning(f"Error accessing '{RISK_CHANGES_TABLE_NAME}' table: {e}")
-                    risk_changes_table = None
-                
-            return risk_register_table, risk_changes_table, risk_types_table
-            
-        except Exception as e:
-            st.warning(f"Could not access risk changes table: {e}")
-            risk_changes_table = None
-            return risk_register_table, None, risk_types_table
+        # All tables share one pooled connection, rate limiter and timeouts across sessions.
+        # Creating a table object makes no request - if the token can't read a table, the
+        # error shows up when it is loaded
+        api = airtable_client.get_api(AIRTABLE_API_KEY)
+        risk_register_table = api.table(BASE_ID, RISK_REGISTER_TABLE_ID)
+        risk_types_table = api.table(BASE_ID, RISK_TYPES_TABLE_ID) if RISK_TYPES_TABLE_ID else None
+        risk_changes_table = api.table(BASE_ID, RISK_CHANGES_TABLE_ID) if RISK_CHANGES_TABLE_ID else None
+        return risk_register_table, risk_changes_table, risk_types_table
         
     except Exception as e:
         st.error(f"Error connecting to Airtable: {e}")
@@ -98,131 +148,370 @@ def json_safe_value(value):
     
     return value
 
-def get_risk_details(records_df, selected_risk_reference):
-    """Get risk details based on selected reference"""
-    filtered_record = None
-    if selected_risk_reference:
-        # Try all columns to find the matching record
-        for col in records_df.columns:
-            # Convert both to string for comparison
-            records_df['string_val'] = records_df[col].astype(str)
-            filtered = records_df[records_df['string_val'] == str(selected_risk_reference)]
-            if not filtered.empty:
-                filtered_record = filtered.iloc[0].to_dict()
-                break
-    
-    return filtered_record
+def display_value(record, field):
+    """Cleaned display string of a record field ("" if it isn't set)"""
+    value = record.get(field)
+    return "" if risk_store.is_missing(value) else clean_display_value(value)
 
-def get_risk_type_display(filtered_record, risk_types_dict):
-    """Extract and format risk type information"""
-    risk_type_display = ""
-    risk_type_ids = []
-    
-    # Get linked record IDs first
-    if 'Risk types' in filtered_record:
-        risk_types = filtered_record['Risk types']
-        if isinstance(risk_types, list) and risk_types:
-            if isinstance(risk_types[0], dict) and 'id' in risk_types[0]:
-                # Extract IDs from linked records
-                risk_type_ids = [item['id'] for item in risk_types]
-            elif isinstance(risk_types[0], str):
-                # If it's already a list of ID strings
-                risk_type_ids = risk_types
-    
-    # Also try the field ID for risk types
-    if not risk_type_ids and 'fldNqIWQ5VqVT7itc' in filtered_record:
-        risk_types_raw = filtered_record['fldNqIWQ5VqVT7itc']
-        if isinstance(risk_types_raw, list) and risk_types_raw:
-            if isinstance(risk_types_raw[0], dict) and 'id' in risk_types_raw[0]:
-                # Extract IDs from linked records
-                risk_type_ids = [item['id'] for item in risk_types_raw]
-            elif isinstance(risk_types_raw[0], str):
-                # If it's already a list of ID strings
-                risk_type_ids = risk_types_raw
-        # Handle case where it might be a single string ID
-        elif isinstance(risk_types_raw, str):
-            risk_type_ids = [risk_types_raw]
+def build_risk_change_data(values):
+    """Map ABBYY response values onto the Risk Changes field IDs
+
+    Text values are sent as strings (missing ones as ""), the Risk Type may be a
+    list of linked record IDs, and Status starts as "Todo".
+    """
+    data = {}
+    for key, field_id in RISK_CHANGE_FIELD_IDS.items():
+        value = values.get(key)
+        if isinstance(value, list):
+            data[field_id] = value
+        elif risk_store.is_missing(value) or value == "":
+            data[field_id] = ""
+        else:
+            data[field_id] = str(value)
+    data[RISK_CHANGE_FIELD_IDS['status']] = values.get('status', "Todo")
     
-    # Look up the names from our dictionary
-    if risk_type_ids and risk_types_dict:
-        risk_type_names = []
-        for type_id in risk_type_ids:
-            # Get the name from our cached dictionary
-            if type_id in risk_types_dict:
-                risk_type_names.append(risk_types_dict[type_id])
-            else:
-                # If we couldn't load the risk types table, just show the ID
-                risk_type_names.append(f"Type ID: {type_id}")
-        
-        if risk_type_names:
-            risk_type_display = ", ".join(risk_type_names)
+    # Ensure all values are JSON-safe (no NaN values)
+    return {k: json_safe_value(v) for k, v in data.items()}
+
+@metrics.timed("build_accept_data")
+def build_accept_data(records_df, position, fh_personnel, abbyy_personnel):
+    """Build the Risk Changes data for accepting the risk at a row position unchanged (as the single-risk save does)"""
+    record = records_df.iloc[position].to_dict()
+    display = get_risk_display(records_df, position=position)
+    risk_type_display, risk_type_ids = display['risk_type'], display['risk_type_ids']
+    reference = record.get(risk_store.REFERENCE_FIELD)
     
-    # If we still don't have names, use the risk categories as fallback
-    if not risk_type_display and 'Risk category (from Risk types)' in filtered_record:
-        risk_categories = filtered_record['Risk category (from Risk types)']
-        if isinstance(risk_categories, list):
-            risk_type_display = ", ".join(str(cat) for cat in risk_categories if cat is not None)
-        else:
-            risk_type_display = str(risk_categories) if risk_categories else ""
+    return build_risk_change_data({
+        'risk_reference': record['record_id'] if risk_store.is_missing(reference) else reference,
+        'fh_personnel': fh_personnel,
+        'abbyy_personnel': abbyy_personnel,
+        'risk_category': display['Risk category (from Risk types)'],
+        'risk_type': risk_type_ids if risk_type_ids else risk_type_display,
+        'risk_description': display['Risk description'],
+        'impact': display['Impact'],
+        'root_causes': display['Rootcause description (from rootcause)'],
+        'components': display['Component (Where will the risk occur)'],
+        'original_severity': record.get('Severity'),
+        'original_likelihood': record.get('Likelihood'),
+        'original_detectability': record.get('Detectability'),
+        'original_risk_level': format_risk_level(record.get('Overall Risk Score'), with_score=False),
+        'abbyy_response': "Accept",
+    })
+
+@metrics.timed("build_bulk_review_table")
+def build_bulk_review_table(records_df, positions, selected=False):
+    """Table of the given risks for the bulk accept view, indexed by row position"""
+    rows = records_df.iloc[positions]
+    display = risk_store.get_display_strings(records_df)
     
-    # Try to get specific risk type name from lookup field if available
-    if not risk_type_display and 'Risk type' in filtered_record:
-        risk_type_display = filtered_record['Risk type']
+    def display_column(column):
+        if column not in display:
+            return [""] * len(rows)
+        return display[column][positions].tolist()
     
-    # Try alternative fields as a last resort
-    if not risk_type_display and 'AI, algorithmic or autonomous system reference /name' in filtered_record:
-        risk_type_display = filtered_record['AI, algorithmic or autonomous system reference /name']
+    references = rows[risk_store.REFERENCE_FIELD] if risk_store.REFERENCE_FIELD in rows.columns else rows['record_id']
     
-    # Set a fallback if nothing found
-    if not risk_type_display:
-        if risk_type_ids:
-            # If we have IDs but couldn't look them up, show them as is
-            risk_type_display = f"Type IDs: {', '.join(risk_type_ids)}"
-        else:
-            risk_type_display = "Unknown Risk Type"
+    return pd.DataFrame({
+        'Accept': selected,
+        'Risk Reference': references.fillna(rows['record_id']).astype(str).tolist(),
+        'Risk Description': display_column('Risk description'),
+        'Overall Risk Level': display_column('Overall Risk Level'),
+    }, index=list(positions))
+
+@metrics.timed("get_risk_details")
+def get_risk_details(records_df, selected_risk_reference):
+    """Get risk details based on selected reference (risk reference or record ID)"""
+    filtered_record = None
+    if selected_risk_reference:
+        # Constant-time lookup in the per-snapshot index - records_df is never modified
+        position = risk_store.get_ref_index(records_df).get(str(selected_risk_reference))
+        if position is not None:
+            # Leave out empty cells, so fields that aren't set read as missing rather than NaN
+            filtered_record = {
+                field: value for field, value in records_df.iloc[position].to_dict().items()
+                if not risk_store.is_missing(value)
+            }
     
-    return risk_type_display, risk_type_ids
+    return filtered_record
+
+@metrics.timed("get_risk_display")
+def get_risk_display(records_df, selected_risk_reference=None, position=None):
+    """Display strings of a risk's detail fields as {column: string} ("" where a field isn't set)
+
+    Also holds the risk's Risk Type as 'risk_type' (names) and 'risk_type_ids' (linked
+    record IDs), resolved with the session's risk_types_dict. The risk is picked by
+    reference (or record ID) or by row position. Everything is computed for the whole
+    register once per snapshot, so this is a dictionary read.
+    """
+    if position is None:
+        position = risk_store.get_ref_index(records_df).get(str(selected_risk_reference))
+    if position is None:
+        return {**{column: "" for column in risk_store.DISPLAY_FIELDS}, 'risk_type': "Unknown Risk Type", 'risk_type_ids': []}
+    risk_types_dict = st.session_state.get('risk_types_dict')
+    return risk_store.get_display_record(records_df, position, {} if risk_types_dict is None else risk_types_dict)
+
+@metrics.timed("get_facet_options")
+def get_facet_options(records_df, facet):
+    """Sorted filter options for a facet ('responsible', 'risk_level' or 'ai_system')"""
+    facet_index = risk_store.get_facet_index(records_df)
+    if facet not in facet_index:
+        return []
+    return sorted(facet_index[facet]['values'])
+
+def has_facet(records_df, facet):
+    """Check whether the register has a column for a filter facet"""
+    return facet in risk_store.get_facet_index(records_df)
+
+@metrics.timed("filter_risk_positions")
+def filter_risk_positions(records_df, selections):
+    """Row positions of records_df matching the selected filters ({facet: [values]})"""
+    return risk_store.filter_positions(records_df, selections)
+
+@metrics.timed("search_risks")
+def search_risks(records_df, query, positions=None):
+    """Row positions of the risks matching a search box query, best first
+
+    An empty query leaves positions (all rows if None) as they are; otherwise only
+    the matches among positions are kept, in rank order.
+    """
+    if not query or not query.strip():
+        return list(range(len(records_df))) if positions is None else positions
+    ranked = risk_store.search_positions(records_df, query)
+    if positions is not None:
+        ranked = ranked[np.isin(ranked, positions)]
+    return ranked.tolist()
+
+@metrics.timed("get_risk_references")
+def get_risk_references(records_df, positions=None):
+    """Risk references to offer in the selectbox (all rows, or only the given row positions)"""
+    return risk_store.get_risk_references(records_df, positions)
 
 def calculate_risk_level(severity, likelihood, detectability):
     """Calculate risk level based on severity, likelihood, and detectability"""
-    # Convert severity to numeric values: High=3, Medium=2, Low=1
-    severity_score = 3 if severity == "High" else (2 if severity == "Medium" else 1)
-    
-    # Convert likelihood to numeric values: High=3, Medium=2, Low=1
-    likelihood_score = 3 if likelihood == "High" else (2 if likelihood == "Medium" else 1)
-    
-    # Convert detectability to numeric values: Low=3, Medium=2, High=1 (note the inverse scale)
-    detectability_score = 3 if detectability == "Low" else (2 if detectability == "Medium" else 1)
-    
-    # Calculate overall score using the formula
-    overall_score = severity_score * likelihood_score * detectability_score
-    
-    # Convert score to risk level
-    if overall_score >= 15:  # High risk (15-27)
-        new_level = "High"
-    elif overall_score >= 6:  # Medium risk (6-14)
-        new_level = "Medium"
-    else:  # Low risk (1-5)
-        new_level = "Low"
-    
-    return new_level, overall_score
+    # Accepts both "High" and the form's "1. High" style labels - see risk_scoring for the scale
+    return risk_scoring.score_risk(severity, likelihood, detectability)
 
+def format_risk_level(value, with_score=True):
+    """Format a stored Overall Risk Score for display (numeric scores become a level name)"""
+    return risk_scoring.format_risk_level(value, with_score)
+
+def wait_for_changes_index():
+    """Wait for a Risk Changes History load or sync load_risk_data() left running in the background
+
+    The register renders without waiting for it - only the pages' responses do, behind
+    a spinner. A failed load is reported here (the index is fetched again on next use).
+    """
+    changes_future = st.session_state.get('changes_future')
+    if changes_future is None:
+        return
+    if not changes_future.done():
+        with st.spinner("Loading responses..."):
+            futures.wait([changes_future])
+    st.session_state.pop('changes_future', None)
+    if changes_future.exception() is not None:
+        st.warning(f"Could not load '{RISK_CHANGES_TABLE_NAME}' records: {changes_future.exception()}")
+
+def get_risk_changes_index(risk_changes_table):
+    """Get the process-wide Risk Changes History index, delta-syncing it if the TTL has expired"""
+    wait_for_changes_index()
+    return risk_store.get_changes_index(
+        risk_changes_table,
+        ttl=RISK_CHANGES_TTL,
+        reconcile_interval=REGISTER_RECONCILE_INTERVAL
+    )
+
+@metrics.timed("get_risk_changes_record")
 def get_risk_changes_record(risk_changes_table, selected_risk_reference):
     """Get risk changes record for a specific risk reference"""
     try:
         if risk_changes_table:
-            # Query by the Original Risk Reference field
-            formula = f"{{Original Risk Reference}} = '{selected_risk_reference}'"
-            risk_changes_records = risk_changes_table.all(formula=formula)
+            # Look up the Original Risk Reference in the shared index (no request unless it's stale)
+            changes_index = get_risk_changes_index(risk_changes_table)
             
             # Return the most recent record if available
-            if risk_changes_records:
-                return risk_changes_records[-1]  # Most recent record
+            return risk_store.latest_risk_change(changes_index, selected_risk_reference)
     except Exception as e:
         st.error(f"Error retrieving risk changes record: {e}")
     
     return None
 
+@metrics.timed("queue_risk_change_create")
+def queue_risk_change_create(fields):
+    """Queue a new Risk Changes record - returns immediately, the outbox writes it to Airtable"""
+    return outbox.enqueue_create('risk_changes', fields)
+
+@metrics.timed("queue_risk_change_creates")
+def queue_risk_change_creates(fields_list):
+    """Queue several new Risk Changes records in one go (sent as batch creates of 10)"""
+    return outbox.enqueue_many('risk_changes', 'create', [(None, fields) for fields in fields_list])
+
+@metrics.timed("queue_risk_change_update")
+def queue_risk_change_update(record_id, fields):
+    """Queue an update to a Risk Changes record - returns immediately, the outbox writes it to Airtable"""
+    return outbox.enqueue_update('risk_changes', record_id, fields)
+
+@metrics.timed("queue_risk_change_updates")
+def queue_risk_change_updates(updates):
+    """Queue several (record_id, fields) Risk Changes updates in one go (sent as batch updates of 10)"""
+    return outbox.enqueue_many('risk_changes', 'update', updates)
+
+@metrics.timed("get_fh_signoff_queue")
+def get_fh_signoff_queue(risk_changes_table):
+    """Latest Risk Changes record per risk that ABBYY accepted and FH hasn't responded to yet"""
+    changes_index = get_risk_changes_index(risk_changes_table)
+    queue = []
+    for risk_reference, records in changes_index['by_reference'].items():
+        fields = records[-1].get('fields', {})
+        if fields.get("ABBYY's Response") == "Accept" and not fields.get("FH Response"):
+            queue.append(records[-1])
+    return queue
+
+@metrics.timed("build_fh_signoff_table")
+def build_fh_signoff_table(queue, selected=False):
+    """Table of Risk Changes records for the bulk FH sign-off view, indexed by record ID"""
+    return pd.DataFrame({
+        'Sign Off': selected,
+        'Risk Reference': [display_value(record['fields'], 'Original Risk Reference') for record in queue],
+        'ABBYY Personnel': [display_value(record['fields'], 'ABBYY Personnel') for record in queue],
+        'Risk Description': [display_value(record['fields'], 'Risk Description') for record in queue],
+        'Change Notes': "",
+    }, index=[record['id'] for record in queue])
+
+def begin_rerun(page):
+    """Start timing this rerun of a page (call first thing in the page script)"""
+    # A rerun that never reached end_rerun() (an exception) lasted until its last span
+    previous = metrics.finish_trace(st.session_state.get('rerun_trace'))
+    if previous is not None:
+        st.session_state['last_rerun_trace'] = previous
+    st.session_state['rerun_trace'] = metrics.start_trace(page)
+
+def end_rerun():
+    """Finish timing this rerun (call at the end of the page script and before every st.stop())"""
+    trace = st.session_state.pop('rerun_trace', None)
+    if trace is not None:
+        trace['ended'] = time.perf_counter()
+        st.session_state['last_rerun_trace'] = metrics.finish_trace(trace)
+
+def show_performance_panel():
+    """Sidebar panel with where this session's last rerun spent its time, and Airtable request stats"""
+    with st.sidebar.expander("Performance"):
+        trace = st.session_state.get('last_rerun_trace')
+        if trace:
+            # Time outside the timed stages is widget and layout code
+            timed_seconds = sum(seconds for name, depth, seconds in trace['spans'] if depth == 0)
+            stages = [("\u2003" * depth + name, seconds) for name, depth, seconds in trace['spans']]
+            stages.append(("other (widgets and layout)", max(trace['seconds'] - timed_seconds, 0.0)))
+            st.caption(f"Last rerun of {trace['page']}: {trace['seconds'] * 1000:.0f} ms")
+            st.dataframe(pd.DataFrame({
+                'Stage': [name for name, seconds in stages],
+                'ms': [round(seconds * 1000, 1) for name, seconds in stages],
+            }), hide_index=True)
+        
+        request_stats = metrics.request_summary()
+        if request_stats:
+            st.caption("Airtable requests since the server started")
+            st.dataframe(pd.DataFrame(request_stats), hide_index=True)
+
+def is_read_only():
+    """Check whether Airtable is unreachable and the session is showing the saved copy of the register"""
+    return bool(st.session_state.get('offline'))
+
+@st.fragment(run_every=risk_store.STREAM_PUBLISH_INTERVAL)
+def show_loading_progress():
+    """Progress of a register that is still streaming in - reruns the page when more of it has arrived"""
+    snapshot = risk_store.peek_snapshot()
+    if snapshot is None:
+        return
+    if snapshot['version'] != st.session_state.get('snapshot_version'):
+        st.rerun()
+    
+    loaded, expected = snapshot.get('loaded_count', 0), snapshot.get('expected_count')
+    if expected:
+        st.progress(min(loaded / expected, 1.0), text=f"Loading risks... {loaded} of about {expected}")
+    else:
+        st.caption(f"Loading risks... {loaded} so far")
+
+@metrics.timed("show_airtable_status")
+def show_airtable_status():
+    """Show register loading progress, offline mode, queued/failed Airtable writes and rate limiting in the sidebar"""
+    if SHOW_PERFORMANCE_PANEL:
+        show_performance_panel()
+    
+    if st.session_state.get('snapshot_loading'):
+        with st.sidebar:
+            show_loading_progress()
+    
+    if is_read_only():
+        saved_at = st.session_state.get('snapshot_saved_at')
+        saved_text = f" saved {pd.Timestamp(saved_at, unit='s').strftime('%Y-%m-%d %H:%M')} UTC" if saved_at else ""
+        st.sidebar.warning(f"Airtable can't be reached - showing the copy of the register{saved_text}. "
+                           "Saving is disabled until the connection is back.")
+        if show_debug:
+            st.sidebar.write(st.session_state.get('offline_error'))
+    elif st.session_state.get('sync_error'):
+        # Saves still work - the outbox sends them once Airtable answers again
+        st.sidebar.caption("The last sync with Airtable failed - showing the data from the sync before. "
+                           "Retrying shortly.")
+        if show_debug:
+            st.sidebar.write(st.session_state.get('sync_error'))
+    
+    limiter_stats = rate_limiter.get_stats()
+    if limiter_stats['queue_depth']:
+        st.sidebar.caption(f"Airtable is busy - {limiter_stats['queue_depth']} request(s) waiting "
+                           f"(last wait {limiter_stats['last_wait']:.1f}s)")
+    if show_debug:
+        st.sidebar.write(limiter_stats)
+    
+    try:
+        stats = outbox.get_stats()
+    except Exception as e:
+        st.sidebar.warning(f"Could not read the save queue: {e}")
+        return
+    
+    if stats.get('pending'):
+        st.sidebar.info(f"{stats['pending']} save(s) waiting to be sent to Airtable")
+    if stats.get('failed'):
+        st.sidebar.error(f"{stats['failed']} save(s) could not be sent to Airtable")
+        if show_debug:
+            for entry_id, table_key, operation, record_id, attempts, last_error in outbox.get_failed():
+                st.sidebar.write(f"#{entry_id} {operation} {record_id or ''}: {last_error}")
+        if st.sidebar.button("Retry failed saves", key="retry_failed_saves"):
+            outbox.retry_failed()
+
+def attach_snapshot(snapshot):
+    """Point this session at a shared register snapshot (read-only - never modify it in place)"""
+    st.session_state['records_df'] = snapshot['records_df']
+    st.session_state['risk_types_dict'] = snapshot['risk_types_dict']
+    st.session_state['snapshot_version'] = snapshot['version']
+    st.session_state['snapshot_loading'] = snapshot.get('loading', False)
+    st.session_state['offline'] = snapshot.get('offline', False)
+    st.session_state['offline_error'] = snapshot.get('offline_error')
+    st.session_state['sync_error'] = snapshot.get('sync_error')
+    st.session_state['snapshot_saved_at'] = snapshot.get('saved_at')
+
+def get_shared_snapshot(risk_register_table, risk_types_table):
+    """Get the process-wide register snapshot, syncing it if the TTL has expired
+
+    In "filtered" load mode this only holds the filter facets of every risk - the pages
+    load the risks they show with load_filtered_risk_data().
+    """
+    if REGISTER_LOAD_MODE == "filtered":
+        return risk_store.get_filtered_snapshot(
+            risk_register_table,
+            risk_types_table,
+            {},
+            ttl=REGISTER_SNAPSHOT_TTL,
+            fields=risk_store.FACET_PROJECTED_FIELDS
+        )
+    return risk_store.get_snapshot(
+        risk_register_table,
+        risk_types_table,
+        ttl=REGISTER_SNAPSHOT_TTL,
+        delta=(REGISTER_SYNC_MODE == "delta"),
+        reconcile_interval=REGISTER_RECONCILE_INTERVAL
+    )
+
+@metrics.timed("load_risk_data")
 def load_risk_data():
     """Load risk data from Airtable and set up session state"""
     # Auto-connect to Airtable on app start
@@ -235,32 +524,41 @@ def load_risk_data():
                 st.session_state['risk_types_table'] = risk_types_table
                 st.session_state['connected'] = True
                 
-                # Cache the risk types for faster lookup
-                risk_types_dict = {}
-                if risk_types_table:
-                    try:
-                        risk_types_records = risk_types_table.all()
-                        for record in risk_types_records:
-                            record_id = record['id']
-                            type_name = record['fields'].get('Risk type', f"Unknown Type: {record_id}")
-                            risk_types_dict[record_id] = type_name
-                    except Exception as e:
-                        st.warning(f"Could not load risk types: {e}")
+                # Let the background outbox flusher write to the Risk Changes table - what
+                # it writes is published to the shared index (see events.py)
+                if risk_changes_table:
+                    outbox.register_table('risk_changes', risk_changes_table)
+                    outbox.start_flusher()
                 
-                st.session_state['risk_types_dict'] = risk_types_dict
+                # Load the Risk Changes History index (so the FH page renders without a request)
+                # in the background while the register and risk types are fetched - the
+                # register doesn't wait for it, only the responses do (see wait_for_changes_index)
+                if risk_changes_table:
+                    st.session_state['changes_future'] = risk_store.submit(
+                        risk_store.get_changes_index,
+                        risk_changes_table,
+                        ttl=RISK_CHANGES_TTL,
+                        reconcile_interval=REGISTER_RECONCILE_INTERVAL
+                    )
                 
-                # Fetch risk register data
+                # Fetch risk register data - shared by all sessions, only fetched when the
+                # process-wide snapshot is missing or older than REGISTER_SNAPSHOT_TTL
                 try:
-                    records = risk_register_table.all()
-                    st.sidebar.write(f"Found {len(records)} records")
-                    
-                    # Convert to DataFrame for easier manipulation
-                    records_df = pd.DataFrame([{**record['fields'], 'record_id': record['id']} for record in records])
+                    snapshot = get_shared_snapshot(risk_register_table, risk_types_table)
+                    if snapshot['risk_types_error']:
+                        st.warning(f"Could not load risk types: {snapshot['risk_types_error']}")
+                        st.info("Risk Type names will be shown as IDs. Check your API token permissions.")
+                    elif risk_types_table:
+                        st.sidebar.success("Connected to Risk Types table successfully")
+                    st.sidebar.write(f"Found {len(snapshot['records_df'])} records")
                     
-                    # Store in session state
-                    st.session_state['records_df'] = records_df
+                    # Store a reference to the shared snapshot in session state
+                    attach_snapshot(snapshot)
                     
-                    st.success("Successfully connected to Airtable!")
+                    if snapshot.get('offline'):
+                        st.warning("Airtable can't be reached - showing the last saved copy of the register (read-only).")
+                    else:
+                        st.success("Successfully connected to Airtable!")
                 except Exception as e:
                     st.error(f"Error retrieving data: {e}")
                     st.session_state['connected'] = False
@@ -268,17 +566,87 @@ def load_risk_data():
             else:
                 st.session_state['connected'] = False
                 st.session_state['records_df'] = None
+    elif st.session_state.get('connected'):
+        # Already connected - pick up the latest shared snapshot (re-fetched once the TTL expires)
+        try:
+            snapshot = get_shared_snapshot(
+                st.session_state['risk_register_table'],
+                st.session_state.get('risk_types_table')
+            )
+            attach_snapshot(snapshot)
+        except Exception as e:
+            st.error(f"Error refreshing data: {e}")
     # Make sure records_df is initialized
     if 'records_df' not in st.session_state:
         st.session_state['records_df'] = None
 
-# Button to reconnect if needed
-if st.sidebar.button("Connect to Airtable"):
-    with st.spinner('Reconnecting to Airtable...'):
+@metrics.timed("load_filtered_risk_data")
+def load_filtered_risk_data(selections):
+    """Register DataFrame to filter for the given selections ({facet: [values]})
+
+    In "filtered" load mode this is a snapshot of just the matching risks, cached per
+    set of selections; otherwise it is the whole register from load_risk_data().
+    Either way filter_risk_positions() gives the rows to show.
+    """
+    if REGISTER_LOAD_MODE != "filtered" or not st.session_state.get('connected'):
+        return st.session_state.get('records_df')
+    try:
+        snapshot = risk_store.get_filtered_snapshot(
+            st.session_state['risk_register_table'],
+            st.session_state.get('risk_types_table'),
+            selections,
+            ttl=REGISTER_SNAPSHOT_TTL
+        )
+    except Exception as e:
+        st.error(f"Error retrieving data: {e}")
+        return None
+    attach_snapshot(snapshot)
+    return snapshot['records_df']
+
+@metrics.timed("refresh_risk_data")
+def refresh_risk_data():
+    """Refresh the shared snapshot from Airtable (delta sync unless REGISTER_SYNC_MODE is "full")"""
+    if not st.session_state.get('connected') or REGISTER_SYNC_MODE != "delta" or REGISTER_LOAD_MODE == "filtered":
+        risk_store.invalidate_snapshot()
+        risk_store.invalidate_filtered_snapshots()
+        risk_store.invalidate_changes_index()
         load_risk_data()
+        return
+    
+    try:
+        # Sync both tables at the same time - the responses wait for the changes index,
+        # the register doesn't (see wait_for_changes_index)
+        if st.session_state.get('risk_changes_table'):
+            st.session_state['changes_future'] = risk_store.submit(
+                risk_store.sync_changes_index,
+                st.session_state['risk_changes_table'],
+                reconcile_interval=REGISTER_RECONCILE_INTERVAL
+            )
+        
+        snapshot = risk_store.sync_snapshot(
+            st.session_state['risk_register_table'],
+            st.session_state.get('risk_types_table'),
+            reconcile_interval=REGISTER_RECONCILE_INTERVAL
+        )
+        attach_snapshot(snapshot)
+        st.sidebar.write(f"Found {len(snapshot['records_df'])} records")
+    except Exception as e:
+        st.error(f"Error refreshing data: {e}")
 
-# Load data on initial run
-load_risk_data()
+# The main page only - the pages import this module for its functions and load the
+# data and show the status themselves
+if __name__ == "__main__":
+    # Time this rerun of the main page (the pages start their own timing)
+    begin_rerun("Home")
+    
+    # Button to reconnect if needed
+    if st.sidebar.button("Connect to Airtable", key="connect_to_airtable"):
+        with st.spinner('Reconnecting to Airtable...'):
+            refresh_risk_data()
+    
+    # Load data on initial run
+    load_risk_data()
+    show_airtable_status()
 
 # Instructions section in expandable area
 with st.expander("Instructions"):
@@ -292,3 +660,6 @@ with st.expander("Instructions"):
        - FH Response: For FH personnel to review ABBYY responses and provide their input
     
     """)
+
+if __name__ == "__main__":
+    end_rerun()
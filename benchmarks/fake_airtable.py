@@ -0,0 +1,335 @@
+import itertools
+import json
+import random
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Local stand-in for the Airtable REST API, used by the benchmark suite.
+#
+# Implements what the app uses: paginated listing (GET and the POST listRecords
+# fallback) with pageSize/offset, fields[] projection and basic filterByFormula,
+# single and batch create/update, plus configurable latency and injected 429s.
+#
+# Like Airtable, records are stored under field names: writes keyed by field ID are
+# translated with the field_ids map given for each table, and empty values are left
+# out of responses.
+
+PAGE_SIZE_MAX = 100
+BATCH_SIZE_MAX = 10
+
+
+def format_time(moment):
+    """Airtable's ISO 8601 timestamp format"""
+    return moment.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+
+def parse_time(value):
+    """Parse an Airtable timestamp (or any ISO 8601 string)"""
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def as_text(value):
+    """String form of a field value as formulas see it (lists are comma-joined)"""
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return ", ".join(as_text(item) for item in value)
+    return str(value)
+
+
+class FormulaError(ValueError):
+    """A filterByFormula the stand-in doesn't understand"""
+
+
+class Formula:
+    """Tiny filterByFormula evaluator
+
+    Supports {Field} references, string/number literals, = and !=, and the functions
+    AND, OR, NOT, IS_AFTER, LAST_MODIFIED_TIME, FIND, ARRAYJOIN, LOWER and SEARCH.
+    """
+
+    TOKEN = re.compile(r"\s*(?:(\{[^}]*\})|('(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\")|(\d+(?:\.\d+)?)|(!=|=|\(|\)|,)|([A-Z_]+))")
+
+    def __init__(self, text):
+        self.tokens = []
+        position = 0
+        text = text.strip()
+        while position < len(text):
+            match = self.TOKEN.match(text, position)
+            if not match or match.end() == position:
+                raise FormulaError(f"Can't parse formula at: {text[position:]!r}")
+            self.tokens.append(match.groups())
+            position = match.end()
+        self.position = 0
+        self.evaluate = self.parse_comparison()
+        if self.position != len(self.tokens):
+            raise FormulaError(f"Unexpected input in formula: {text!r}")
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None,) * 5
+
+    def take(self, symbol=None):
+        token = self.peek()
+        if symbol is not None and token[3] != symbol:
+            raise FormulaError(f"Expected {symbol!r}")
+        self.position += 1
+        return token
+
+    def parse_comparison(self):
+        left = self.parse_operand()
+        operator = self.peek()[3]
+        if operator in ('=', '!='):
+            self.take()
+            right = self.parse_operand()
+            if operator == '=':
+                return lambda record: as_text(left(record)) == as_text(right(record))
+            return lambda record: as_text(left(record)) != as_text(right(record))
+        return left
+
+    def parse_operand(self):
+        field, string, number, symbol, name = self.take()
+        if field:
+            field_name = field[1:-1]
+            return lambda record: record['fields'].get(field_name)
+        if string:
+            value = string[1:-1].replace("\\'", "'").replace('\\"', '"')
+            return lambda record: value
+        if number:
+            value = float(number)
+            return lambda record: value
+        if name:
+            self.take('(')
+            args = []
+            while self.peek()[3] != ')':
+                args.append(self.parse_comparison())
+                if self.peek()[3] == ',':
+                    self.take()
+            self.take(')')
+            return self.function(name, args)
+        raise FormulaError(f"Unexpected token {symbol!r}")
+
+    @staticmethod
+    def function(name, args):
+        if name == 'AND':
+            return lambda record: all(arg(record) for arg in args)
+        if name == 'OR':
+            return lambda record: any(arg(record) for arg in args)
+        if name == 'NOT':
+            return lambda record: not args[0](record)
+        if name == 'LAST_MODIFIED_TIME':
+            return lambda record: record['_modified']
+        if name == 'IS_AFTER':
+            return lambda record: parse_time(as_text(args[0](record))) > parse_time(as_text(args[1](record)))
+        if name == 'ARRAYJOIN':
+            separator = args[1] if len(args) > 1 else (lambda record: ", ")
+            return lambda record: separator(record).join(
+                as_text(item) for item in (args[0](record) or []) if item is not None
+            ) if isinstance(args[0](record), list) else as_text(args[0](record))
+        if name == 'LOWER':
+            return lambda record: as_text(args[0](record)).lower()
+        if name in ('FIND', 'SEARCH'):
+            # 1-based position of the needle, 0 when it isn't found (like Airtable)
+            return lambda record: as_text(args[1](record)).find(as_text(args[0](record))) + 1
+        raise FormulaError(f"Unsupported function {name}")
+
+    def __call__(self, record):
+        return bool(self.evaluate(record))
+
+
+class QuietServer(ThreadingHTTPServer):
+    """HTTP server that doesn't print a traceback when a client drops a kept-alive connection"""
+
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FakeAirtable:
+    """In-memory Airtable base served over HTTP on localhost"""
+
+    def __init__(self, latency=0.0, error_rate=0.0, retry_after=0.05, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.tables = {}
+        self.field_ids = {}
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.stats = {'requests': 0, 'throttled': 0}
+        self.server = None
+
+    def add_table(self, table_id, records, field_ids=None):
+        """Load a table with records ({'id', 'createdTime', 'fields'}) and its {field ID: name} map"""
+        now = datetime.now(timezone.utc)
+        self.tables[table_id] = {record['id']: {**record, '_modified': format_time(now)} for record in records}
+        self.field_ids[table_id] = field_ids or {}
+
+    def start(self):
+        """Start serving on a free port in a background thread; returns the endpoint URL"""
+        fake = self
+
+        class Handler(AirtableHandler):
+            airtable = fake
+
+        self.server = QuietServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, name="fake-airtable", daemon=True).start()
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def field_name(self, table_id, field):
+        return self.field_ids[table_id].get(field, field)
+
+    def public(self, record, fields=None):
+        """Record as the API returns it - no empty values, optionally only some fields"""
+        values = {
+            name: value for name, value in record['fields'].items()
+            if value not in (None, "", []) and (fields is None or name in fields)
+        }
+        return {'id': record['id'], 'createdTime': record['createdTime'], 'fields': values}
+
+    def list_records(self, table_id, options):
+        """One page of a listing - returns the response payload"""
+        page_size = min(int(options.get('pageSize') or PAGE_SIZE_MAX), PAGE_SIZE_MAX)
+        offset = int(options.get('offset') or 0)
+        fields = options.get('fields')
+        if fields is not None:
+            fields = {self.field_name(table_id, field) for field in fields}
+
+        records = list(self.tables[table_id].values())
+        formula = options.get('filterByFormula')
+        if formula:
+            matches = Formula(formula)
+            records = [record for record in records if matches(record)]
+
+        page = records[offset:offset + page_size]
+        payload = {'records': [self.public(record, fields) for record in page]}
+        if offset + page_size < len(records):
+            payload['offset'] = str(offset + page_size)
+        return payload
+
+    def write(self, table_id, record_id, fields):
+        """Create (record_id None) or update a record; returns it as the API would"""
+        now = datetime.now(timezone.utc)
+        named = {self.field_name(table_id, field): value for field, value in fields.items()}
+        table = self.tables[table_id]
+        if record_id is None:
+            record_id = f"recNEW{next(self.ids):011d}"
+            table[record_id] = {'id': record_id, 'createdTime': format_time(now), 'fields': named}
+        elif record_id not in table:
+            raise KeyError(record_id)
+        else:
+            table[record_id]['fields'].update(named)
+        table[record_id]['_modified'] = format_time(now)
+        return self.public(table[record_id])
+
+
+class AirtableHandler(BaseHTTPRequestHandler):
+    """Routes /v0/{base}/{table}[/{record id}|/listRecords] requests to a FakeAirtable"""
+
+    airtable = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length)) if length else {}
+
+    def route(self):
+        """(table id, record id or 'listRecords' or None, query options), or None for unknown paths"""
+        url = urlparse(self.path)
+        parts = url.path.strip('/').split('/')
+        if len(parts) < 3 or parts[0] != 'v0' or parts[2] not in self.airtable.tables:
+            return None
+        query = parse_qs(url.query)
+        options = {key: values[0] for key, values in query.items() if key != 'fields[]'}
+        if 'fields[]' in query:
+            options['fields'] = query['fields[]']
+        return parts[2], parts[3] if len(parts) > 3 else None, options
+
+    def handle_request(self, method):
+        fake = self.airtable
+        # Read the body even when the request is refused, so the kept-alive connection stays usable
+        body = self.read_json() if method in ('POST', 'PATCH') else {}
+        if fake.latency:
+            time.sleep(fake.latency)
+        with fake.lock:
+            fake.stats['requests'] += 1
+            throttled = fake.error_rate and fake.random.random() < fake.error_rate
+            if throttled:
+                fake.stats['throttled'] += 1
+        if throttled:
+            self.send_json(429, {'errors': [{'type': 'RATE_LIMIT_REACHED'}]}, {'Retry-After': str(fake.retry_after)})
+            return
+
+        route = self.route()
+        if route is None:
+            self.send_json(404, {'error': {'type': 'NOT_FOUND'}})
+            return
+        table_id, target, options = route
+        # Like Airtable, refuse batch writes of more than 10 records rather than writing some of them
+        if method in ('POST', 'PATCH') and target is None and len(body.get('records', ())) > BATCH_SIZE_MAX:
+            self.send_json(422, {'error': {
+                'type': 'INVALID_RECORDS',
+                'message': f"You must provide an array of up to {BATCH_SIZE_MAX} record objects",
+            }})
+            return
+
+        try:
+            with fake.lock:
+                if method == 'GET' and target is None:
+                    payload = fake.list_records(table_id, options)
+                elif method == 'POST' and target == 'listRecords':
+                    payload = fake.list_records(table_id, {**options, **body})
+                elif method == 'GET':
+                    payload = fake.public(fake.tables[table_id][target])
+                elif method == 'POST' and target is None and 'records' in body:
+                    payload = {'records': [fake.write(table_id, None, record['fields']) for record in body['records']]}
+                elif method == 'POST' and target is None:
+                    payload = fake.write(table_id, None, body['fields'])
+                elif method == 'PATCH' and target is None:
+                    payload = {'records': [fake.write(table_id, record['id'], record['fields']) for record in body['records']]}
+                elif method == 'PATCH':
+                    payload = fake.write(table_id, target, body['fields'])
+                else:
+                    self.send_json(404, {'error': {'type': 'NOT_FOUND'}})
+                    return
+        except FormulaError as e:
+            self.send_json(422, {'error': {'type': 'INVALID_FILTER_BY_FORMULA', 'message': str(e)}})
+            return
+        except KeyError:
+            self.send_json(404, {'error': {'type': 'MODEL_ID_NOT_FOUND'}})
+            return
+        self.send_json(200, payload)
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def do_PATCH(self):
+        self.handle_request('PATCH')
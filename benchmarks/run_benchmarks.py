@@ -0,0 +1,352 @@
+"""Offline benchmarks for the Risk Management System
+
+Runs the app's data paths against a local stand-in for Airtable (fake_airtable.py)
+seeded with synthetic registers, and writes the timings as JSON:
+
+    python benchmarks/run_benchmarks.py --sizes 1000 10000 50000 --output results.json
+    python benchmarks/run_benchmarks.py --baseline results.json --fail-over 1.25
+
+Each register size runs in its own process, since the app keeps its snapshots and
+connections in module-level state. Timings are in milliseconds. With --baseline,
+medians are compared to the baseline file and the run fails if any metric got slower
+than --fail-over times its baseline.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+
+DEFAULT_SIZES = [1000, 10000, 50000]
+# Seconds to wait for a background load or an outbox flush before giving up
+WAIT_TIMEOUT = 300
+
+
+def summarize(times):
+    """min/median/p95/mean/max (in ms) of a list of timings in seconds"""
+    ordered = sorted(time_taken * 1000 for time_taken in times)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {
+        'min': round(ordered[0], 3),
+        'median': round(statistics.median(ordered), 3),
+        'p95': round(p95, 3),
+        'mean': round(statistics.fmean(ordered), 3),
+        'max': round(ordered[-1], 3),
+        'runs': len(ordered),
+    }
+
+
+def wait_until(condition, interval=0.005):
+    """Poll condition() until it is true"""
+    deadline = time.perf_counter() + WAIT_TIMEOUT
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("Timed out waiting for the app")
+        time.sleep(interval)
+
+
+def write_secrets(directory, endpoint_url, args):
+    """Write a secrets.toml pointing the app at the stand-in; returns its path"""
+    import synthetic
+    settings = {
+        'AIRTABLE_API_KEY': "patBenchmark",
+        'AIRTABLE_BASE_ID': "appBenchmark",
+        'AIRTABLE_TABLE_ID': synthetic.REGISTER_TABLE_ID,
+        'RISK_TYPES_TABLE_ID': synthetic.RISK_TYPES_TABLE_ID,
+        'RISK_CHANGES_TABLE_ID': synthetic.RISK_CHANGES_TABLE_ID,
+        'AIRTABLE_ENDPOINT_URL': endpoint_url,
+        'OUTBOX_PATH': os.path.join(directory, "outbox.sqlite3"),
+        'SNAPSHOT_DIR': "",
+        'REQUESTS_PER_SECOND': args.rps,
+    }
+    path = os.path.join(directory, "secrets.toml")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("[airtable]\n")
+        for key, value in settings.items():
+            f.write(f"{key} = {json.dumps(value)}\n")
+    return path
+
+
+def import_app(secrets_path):
+    """Import app.py outside `streamlit run` with the benchmark secrets"""
+    from streamlit import config
+    config.set_option('secrets.files', [secrets_path])
+    import app
+
+    # Without a script run context Streamlit warns on every call - keep the output readable
+    for name in list(logging.root.manager.loggerDict):
+        if name.startswith('streamlit'):
+            logging.getLogger(name).setLevel(logging.ERROR)
+    return app
+
+
+def run_worker(args):
+    """Benchmark one register size and write the results to args.result_file"""
+    import synthetic
+    from fake_airtable import FakeAirtable
+
+    fake = FakeAirtable(latency=args.latency, error_rate=args.error_rate, seed=args.seed)
+    register_records = synthetic.seed_airtable(fake, args.size, seed=args.seed)
+    endpoint_url = fake.start()
+
+    directory = tempfile.mkdtemp(prefix="risk-benchmark-")
+    app = import_app(write_secrets(directory, endpoint_url, args))
+    import streamlit as st
+    import outbox
+    import risk_store
+
+    rng = random.Random(args.seed)
+    references = [record['fields']['Risk reference'] for record in register_records]
+    results = {}
+
+    def record(metric, times):
+        results[metric] = summarize(times)
+        print(f"  {args.size:>7} {metric:<32} median {results[metric]['median']:>10.3f} ms", file=sys.stderr)
+
+    # load_risk_data from scratch - first render (the first page of a streamed register)
+    # and until the whole register and the Risk Changes index are in
+    first_render, complete = [], []
+    for _ in range(args.load_runs):
+        risk_store.invalidate_snapshot()
+        risk_store.invalidate_changes_index()
+        st.session_state.clear()
+        started = time.perf_counter()
+        app.load_risk_data()
+        first_render.append(time.perf_counter() - started)
+        changes_future = st.session_state.get('changes_future')
+        wait_until(lambda: not risk_store.peek_snapshot()['loading'] and (changes_future is None or changes_future.done()))
+        complete.append(time.perf_counter() - started)
+        if not st.session_state.get('connected'):
+            raise RuntimeError("load_risk_data did not connect to the stand-in")
+    record('load_risk_data_cold_first_render', first_render)
+    record('load_risk_data_cold_complete', complete)
+
+    # A rerun of an already connected session (snapshot still fresh)
+    times = []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        app.load_risk_data()
+        times.append(time.perf_counter() - started)
+    record('load_risk_data_rerun', times)
+
+    records_df = st.session_state['records_df']
+    if len(records_df) != args.size:
+        raise RuntimeError(f"Loaded {len(records_df)} records, expected {args.size}")
+    risk_changes_table = st.session_state['risk_changes_table']
+
+    times = []
+    for _ in range(args.runs):
+        reference = rng.choice(references)
+        started = time.perf_counter()
+        app.get_risk_details(records_df, reference)
+        times.append(time.perf_counter() - started)
+    record('get_risk_details', times)
+
+    times = []
+    for _ in range(args.runs):
+        reference = rng.choice(references)
+        started = time.perf_counter()
+        app.get_risk_display(records_df, reference)
+        times.append(time.perf_counter() - started)
+    record('get_risk_display', times)
+
+    # The ABBYY page's filter section: facet options, matching positions, references
+    times = []
+    for _ in range(args.runs):
+        selections = {
+            'responsible': rng.sample(synthetic.RESPONSIBLE, rng.randint(0, 2)),
+            'risk_level': rng.sample(synthetic.RISK_LEVELS[2:], rng.randint(0, 2)),
+            'ai_system': [rng.choice(synthetic.AI_SYSTEMS)],
+        }
+        started = time.perf_counter()
+        app.get_facet_options(records_df, 'responsible')
+        positions = app.filter_risk_positions(records_df, selections)
+        app.get_risk_references(records_df, positions)
+        times.append(time.perf_counter() - started)
+    record('abbyy_filter_pipeline', times)
+
+    # The search box: one or two words of a risk description, the last one cut to a prefix
+    times = []
+    for _ in range(args.runs):
+        words = rng.choice(register_records)['fields']['Risk description'].split()
+        query = words[:rng.randint(1, 2)]
+        query[-1] = query[-1][:rng.randint(3, max(3, len(query[-1])))]
+        started = time.perf_counter()
+        app.search_risks(records_df, " ".join(query))
+        times.append(time.perf_counter() - started)
+    record('search_risks', times)
+
+    # A "filtered" load (REGISTER_LOAD_MODE) of one AI system's critical risks, uncached
+    times = []
+    for _ in range(args.load_runs):
+        risk_store.invalidate_filtered_snapshots()
+        selections = {'risk_level': ["5. Critical"], 'ai_system': [rng.choice(synthetic.AI_SYSTEMS)]}
+        started = time.perf_counter()
+        risk_store.get_filtered_snapshot(
+            st.session_state['risk_register_table'], st.session_state['risk_types_table'], selections
+        )
+        times.append(time.perf_counter() - started)
+    record('load_filtered_register', times)
+
+    times = []
+    for _ in range(args.runs):
+        reference = rng.choice(references)
+        started = time.perf_counter()
+        app.get_risk_changes_record(risk_changes_table, reference)
+        times.append(time.perf_counter() - started)
+    record('get_risk_changes_record', times)
+
+    def delivered():
+        return not outbox.get_stats().get('pending')
+
+    # ABBYY save - building the accept payload and queueing it, then until the outbox has sent it
+    queued, sent = [], []
+    for _ in range(args.save_runs):
+        position = risk_store.get_ref_index(records_df)[rng.choice(references)]
+        started = time.perf_counter()
+        data = app.build_accept_data(records_df, position, "FH Person 1", "ABBYY Person 1")
+        app.queue_risk_change_create(data)
+        queued.append(time.perf_counter() - started)
+        wait_until(delivered)
+        sent.append(time.perf_counter() - started)
+    record('abbyy_save_queue', queued)
+    record('abbyy_save_delivered', sent)
+
+    # FH save - an update to an existing Risk Changes record
+    queued, sent = [], []
+    change_ids = list(fake.tables[synthetic.RISK_CHANGES_TABLE_ID])
+    for _ in range(args.save_runs):
+        record_id = rng.choice(change_ids)
+        started = time.perf_counter()
+        app.queue_risk_change_update(record_id, {
+            "fldj5ERls7Jsaq21H": "Accept",  # FH Response
+            "fldmpEa117ZHBlJAN": "Benchmark",  # Change Notes
+            "fldfTsmdEsXG2dcAo": "Todo"  # Status
+        })
+        queued.append(time.perf_counter() - started)
+        wait_until(delivered)
+        sent.append(time.perf_counter() - started)
+    record('fh_save_queue', queued)
+    record('fh_save_delivered', sent)
+
+    failed = outbox.get_stats().get('failed', 0)
+    if failed:
+        raise RuntimeError(f"{failed} benchmark save(s) failed")
+
+    fake.stop()
+    with open(args.result_file, 'w', encoding='utf-8') as f:
+        json.dump({'results': results, 'server': dict(fake.stats)}, f)
+
+
+def compare(results, baseline, fail_over, min_ms):
+    """Print median ratios against a baseline; returns the regressed (size, metric) pairs"""
+    regressions = []
+    print(f"\n{'size':>7} {'metric':<32} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for size, metrics in results.items():
+        for metric, summary in metrics.items():
+            base = baseline.get('results', {}).get(size, {}).get(metric)
+            if not base:
+                continue
+            ratio = summary['median'] / base['median'] if base['median'] else float('inf')
+            # Sub-millisecond timings are too noisy to fail a run on
+            regressed = ratio > fail_over and max(summary['median'], base['median']) >= min_ms
+            if regressed:
+                regressions.append((size, metric))
+            flag = "  <-- slower" if regressed else ""
+            print(f"{size:>7} {metric:<32} {base['median']:>10.3f} {summary['median']:>10.3f} {ratio:>7.2f}{flag}")
+    return regressions
+
+
+def run(args):
+    """Run a worker per register size, write the combined JSON and compare it to the baseline"""
+    output = {
+        'meta': {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'latency': args.latency,
+            'error_rate': args.error_rate,
+            'requests_per_second': args.rps,
+            'seed': args.seed,
+            'runs': args.runs,
+            'load_runs': args.load_runs,
+            'save_runs': args.save_runs,
+        },
+        'results': {},
+        'server': {},
+    }
+    for size in args.sizes:
+        with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+            result_file = f.name
+        command = [
+            sys.executable, os.path.abspath(__file__), '--worker',
+            '--size', str(size), '--result-file', result_file,
+            '--latency', str(args.latency), '--error-rate', str(args.error_rate),
+            '--rps', str(args.rps), '--seed', str(args.seed),
+            '--runs', str(args.runs), '--load-runs', str(args.load_runs), '--save-runs', str(args.save_runs),
+        ]
+        print(f"Benchmarking a register of {size} risks...", file=sys.stderr)
+        subprocess.run(command, check=True, cwd=REPO_DIR)
+        with open(result_file, encoding='utf-8') as f:
+            worker_output = json.load(f)
+        os.remove(result_file)
+        output['results'][str(size)] = worker_output['results']
+        output['server'][str(size)] = worker_output['server']
+
+    text = json.dumps(output, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(output['results'], baseline, args.fail_over, args.min_ms)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) slower than {args.fail_over}x the baseline", file=sys.stderr)
+            return 1
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the app against a local Airtable stand-in")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="Register sizes to benchmark")
+    parser.add_argument('--latency', type=float, default=0.01, help="Seconds the stand-in waits before each response")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of requests answered with a 429")
+    parser.add_argument('--rps', type=float, default=1000,
+                        help="App rate limit in requests per second (5 reproduces production pacing)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--runs', type=int, default=200, help="Runs of each in-memory operation")
+    parser.add_argument('--load-runs', type=int, default=3, help="Cold loads per size")
+    parser.add_argument('--save-runs', type=int, default=10, help="Saves of each kind per size")
+    parser.add_argument('--output', help="Write the JSON results here instead of stdout")
+    parser.add_argument('--baseline', help="Earlier JSON results to compare medians against")
+    parser.add_argument('--fail-over', type=float, default=1.25,
+                        help="Exit with 1 if a median is more than this many times its baseline")
+    parser.add_argument('--min-ms', type=float, default=1.0,
+                        help="Don't fail on metrics whose medians are both below this")
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    arguments = parse_args()
+    if arguments.worker:
+        run_worker(arguments)
+    else:
+        sys.exit(run(arguments))
@@ -0,0 +1,137 @@
+import random
+
+import field_schema
+
+# Deterministic synthetic data for the benchmark suite, shaped like the real base:
+# register records keyed by field name (lookups and linked records as lists), a Risk
+# Types table, and a Risk Changes History table with responses to about half of the
+# risks.
+
+REGISTER_TABLE_ID = 'tblBenchRegister'
+RISK_TYPES_TABLE_ID = 'tblBenchRiskTypes'
+RISK_CHANGES_TABLE_ID = 'tblBenchRiskChanges'
+
+CREATED_TIME = '2024-01-01T00:00:00.000Z'
+RISK_TYPE_COUNT = 20
+LEVELS = ["High", "Medium", "Low"]
+RISK_LEVELS = ["1. Very Low", "2. Low", "3. Moderate", "4. High", "5. Critical"]
+PROCESSES = ["Onboarding", "Document capture", "Classification", "Extraction", "Validation", "Export"]
+RESPONSIBLE = ["Product", "Legal", "Security", "Engineering", "Data Science", "Support"]
+AI_SYSTEMS = ["IDP", "Process AI", "Enterprise", "Mobile Capture", "Timeline"]
+CATEGORIES = ["Privacy", "Security", "Fairness", "Transparency", "Robustness"]
+WORDS = ("model data document customer output training drift bias leakage review access "
+         "retention accuracy vendor audit consent label pipeline threshold escalation").split()
+
+# Risk Changes fields the app writes by field ID that aren't read back (see RISK_CHANGE_FIELD_IDS in app.py)
+EXTRA_CHANGE_FIELD_IDS = {
+    'flde0fUGwJlykaRnM': 'Risk Category',
+    'fldYdVmw8pCKyRagq': 'Risk Type',
+    'fldDmecXGLkpnK8lM': 'Impact',
+    'fldcXaPheiACBgbEv': 'Root Causes',
+    'fldqf7xmu3Z2EgTm0': 'Components',
+}
+
+
+def field_ids(schema):
+    """{field ID: canonical name} for a field_schema schema"""
+    return {
+        alias: canonical
+        for canonical, aliases in field_schema.SCHEMAS[schema].values()
+        for alias in aliases if alias.startswith('fld')
+    }
+
+
+def change_field_ids():
+    return {**field_ids('changes'), **EXTRA_CHANGE_FIELD_IDS}
+
+
+def sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def risk_types():
+    """Risk Types table records"""
+    return [
+        {'id': f"recType{i:010d}", 'createdTime': CREATED_TIME,
+         'fields': {'Risk type': f"{CATEGORIES[i % len(CATEGORIES)]} risk {i}"}}
+        for i in range(RISK_TYPE_COUNT)
+    ]
+
+
+def register(size, seed=0):
+    """size Risk Register records"""
+    rng = random.Random(seed)
+    records = []
+    for i in range(size):
+        type_count = rng.choice([1, 1, 1, 2])
+        types = rng.sample(range(RISK_TYPE_COUNT), type_count)
+        score = rng.choice([1, 2, 3]) * rng.choice([1, 2, 3]) * rng.choice([1, 2, 3])
+        records.append({
+            'id': f"recRisk{i:010d}",
+            'createdTime': CREATED_TIME,
+            'fields': {
+                'Risk reference': f"R-{i:06d}",
+                'Process': [rng.choice(PROCESSES)],
+                'Sub Process': [f"Step {rng.randint(1, 12)}"],
+                'Activity': sentence(rng, 4),
+                'Risk types': [f"recType{t:010d}" for t in types],
+                'Risk category (from Risk types)': [CATEGORIES[t % len(CATEGORIES)] for t in types],
+                'Component (Where will the risk occur)': rng.sample(WORDS, 2),
+                'Risk description': sentence(rng, 18),
+                'Rootcause description (from rootcause)': [sentence(rng, 8)],
+                'Impact': sentence(rng, 10),
+                'Severity': rng.choice(LEVELS),
+                'Likelihood': rng.choice(LEVELS),
+                'Detectability': rng.choice(LEVELS),
+                'Overall Risk Score': score,
+                'Overall Risk Level': RISK_LEVELS[min(score // 6, 4)],
+                'Who is responsible?': rng.sample(RESPONSIBLE, rng.choice([1, 1, 2])),
+                'AI, algorithmic or autonomous system reference /name': rng.choice(AI_SYSTEMS),
+                # A field the app doesn't use, like the register's other lookups
+                'Mitigation notes (from mitigations)': [sentence(rng, 12)],
+            },
+        })
+    return records
+
+
+def risk_changes(register_records, seed=0):
+    """Risk Changes History records responding to about half of the register"""
+    rng = random.Random(seed + 1)
+    records = []
+    for record in register_records:
+        if rng.random() >= 0.5:
+            continue
+        fields = record['fields']
+        response = rng.choice(["Accept", "Accept", "Change"])
+        change = {
+            'Original Risk Reference': fields['Risk reference'],
+            'FH Personnel': f"FH Person {rng.randint(1, 3)}",
+            'ABBYY Personnel': f"ABBYY Person {rng.randint(1, 3)}",
+            'Status': "Todo",
+            'Risk Description': fields['Risk description'],
+            'Original Severity Level': fields['Severity'],
+            'Original Likelihood Level': fields['Likelihood'],
+            'Original Detectability Level': fields['Detectability'],
+            'Original Overall Risk Level': fields['Overall Risk Level'],
+            "ABBYY's Response": response,
+        }
+        if response == "Change":
+            change.update({
+                'New Severity Level': rng.choice(LEVELS),
+                'New Likelihood Level': rng.choice(LEVELS),
+                'New Detectability Level': rng.choice(LEVELS),
+                'ABBYY Comment': sentence(rng, 10),
+            })
+        if rng.random() < 0.3:
+            change['FH Response'] = "Accept"
+        records.append({'id': f"recChange{len(records):08d}", 'createdTime': CREATED_TIME, 'fields': change})
+    return records
+
+
+def seed_airtable(fake, size, seed=0):
+    """Load a FakeAirtable with a register of size risks, the risk types and their changes"""
+    register_records = register(size, seed)
+    fake.add_table(REGISTER_TABLE_ID, register_records, field_ids('register'))
+    fake.add_table(RISK_TYPES_TABLE_ID, risk_types())
+    fake.add_table(RISK_CHANGES_TABLE_ID, risk_changes(register_records, seed), change_field_ids())
+    return register_records
@@ -0,0 +1,166 @@
+import glob
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+# On-disk copy of the shared register snapshot and Risk Changes index.
+#
+# After every sync the register is written as Parquet next to a small JSON meta file
+# holding the version stamp, sync watermark and risk types. On a cold start the app
+# loads this copy straight away (and refreshes it in the background), and if
+# Airtable can't be reached it keeps serving it read-only.
+#
+# Object columns that aren't plain strings (lookup/linked-record lists, mixed types)
+# are stored as JSON text and decoded on load.
+
+FORMAT_VERSION = 1
+
+_directory = None
+_lock = threading.Lock()
+_saved_versions = {}
+
+
+def configure(directory):
+    """Set the directory used for snapshot files (an empty value disables persistence)"""
+    global _directory
+    _directory = directory or None
+    if _directory:
+        os.makedirs(_directory, exist_ok=True)
+
+
+def is_enabled():
+    """Check whether snapshot persistence is configured"""
+    return _directory is not None
+
+
+def write_json(path, data):
+    """Write a JSON file atomically (readers never see a half-written file)"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(temp_path, path)
+
+
+def read_json(path):
+    """Read a JSON file, None if it doesn't exist"""
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def encode_frame(records_df):
+    """Prepare a register DataFrame for Parquet - returns (frame, names of JSON-encoded columns)"""
+    encoded = {}
+    json_columns = []
+    for column in records_df.columns:
+        values = records_df[column]
+        if values.dtype == object:
+            present = values.dropna()
+            if not present.map(lambda value: isinstance(value, str)).all():
+                values = values.map(lambda value: value if value is None or value != value else json.dumps(value))
+                json_columns.append(column)
+        encoded[column] = values
+    return pd.DataFrame(encoded, index=records_df.index), json_columns
+
+
+def decode_frame(frame, json_columns):
+    """Undo encode_frame"""
+    for column in json_columns:
+        frame[column] = frame[column].map(lambda value: json.loads(value) if isinstance(value, str) else value)
+    return frame
+
+
+def save_register(snapshot):
+    """Write a register snapshot to disk unless a newer version has already been written"""
+    if not is_enabled():
+        return
+    with _lock:
+        if snapshot['version'] <= _saved_versions.get('register', 0):
+            return
+
+        frame, json_columns = encode_frame(snapshot['records_df'])
+        file_name = f"register-{snapshot['version']}-{int(time.time())}.parquet"
+        path = os.path.join(_directory, file_name)
+        frame.to_parquet(f"{path}.tmp", index=False)
+        os.replace(f"{path}.tmp", path)
+
+        # The meta file is written last and names the Parquet file, so a crash half-way
+        # through leaves the previous, complete snapshot in place
+        write_json(os.path.join(_directory, 'register.json'), {
+            'format_version': FORMAT_VERSION,
+            'version': snapshot['version'],
+            'saved_at': time.time(),
+            'watermark': snapshot['watermark'],
+            'reconciled_at': snapshot['reconciled_at'],
+            'file': file_name,
+            'json_columns': json_columns,
+            'risk_types_dict': snapshot['risk_types_dict'],
+        })
+        for old_path in glob.glob(os.path.join(_directory, 'register-*.parquet')):
+            if os.path.basename(old_path) != file_name:
+                os.remove(old_path)
+        _saved_versions['register'] = snapshot['version']
+
+
+def load_register():
+    """Read the saved register snapshot as (meta, records_df), or None if there is no usable copy"""
+    if not is_enabled():
+        return None
+    try:
+        meta = read_json(os.path.join(_directory, 'register.json'))
+        if not meta or meta.get('format_version') != FORMAT_VERSION:
+            return None
+        frame = pd.read_parquet(os.path.join(_directory, meta['file']))
+        with _lock:
+            _saved_versions['register'] = max(_saved_versions.get('register', 0), meta['version'])
+        return meta, decode_frame(frame, meta['json_columns'])
+    except Exception:
+        # A damaged or outdated file just means a normal fetch from Airtable
+        return None
+
+
+def save_changes(changes_index):
+    """Write the Risk Changes index (as its list of records) to disk
+
+    Saves that haven't reached Airtable yet are written as they were before the save -
+    the outbox keeps them and writes them through again after a restart.
+    """
+    if not is_enabled():
+        return
+    with _lock:
+        if changes_index['version'] <= _saved_versions.get('changes', 0):
+            return
+        records = [record.get('confirmed', record) for record in changes_index['by_id'].values()]
+        write_json(os.path.join(_directory, 'risk_changes.json'), {
+            'format_version': FORMAT_VERSION,
+            'version': changes_index['version'],
+            'saved_at': time.time(),
+            'watermark': changes_index['watermark'],
+            'reconciled_at': changes_index['reconciled_at'],
+            'records': [record for record in records if not record.get('pending')],
+        })
+        _saved_versions['changes'] = changes_index['version']
+
+
+def load_changes():
+    """Read the saved Risk Changes index data, or None if there is no usable copy"""
+    if not is_enabled():
+        return None
+    try:
+        data = read_json(os.path.join(_directory, 'risk_changes.json'))
+        if not data or data.get('format_version') != FORMAT_VERSION:
+            return None
+        with _lock:
+            _saved_versions['changes'] = max(_saved_versions.get('changes', 0), data['version'])
+        return data
+    except Exception:
+        return None
+
+
+def save_in_background(save, data):
+    """Run a save function on a daemon thread so a sync never waits for the disk"""
+    threading.Thread(target=save, args=(data,), name="snapshot-writer", daemon=True).start()
@@ -0,0 +1,35 @@
+import threading
+
+# In-process publish/subscribe bus for records written to Airtable.
+#
+# The outbox publishes under the table's key ('risk_changes'): the saved values as
+# soon as a save is queued (pending=True), then the records Airtable returned once
+# it has been written. The shared caches in risk_store subscribe and
+# apply them in place, so every session sees a save on its next rerun without another
+# request to Airtable.
+
+_lock = threading.Lock()
+_subscribers = {}
+
+
+def subscribe(topic, callback):
+    """Call callback(records, **details) whenever records are published on a topic"""
+    with _lock:
+        callbacks = _subscribers.setdefault(topic, [])
+        if callback not in callbacks:
+            callbacks.append(callback)
+
+
+def publish(topic, records, **details):
+    """Pass written records (and details such as pending=True) to every subscriber of a topic
+
+    A failing subscriber never stops the others (or the publisher) - the cache it keeps
+    catches up with its next sync.
+    """
+    with _lock:
+        callbacks = list(_subscribers.get(topic, []))
+    for callback in callbacks:
+        try:
+            callback(records, **details)
+        except Exception:
+            pass
@@ -0,0 +1,130 @@
+from functools import lru_cache
+
+import pandas as pd
+
+# Canonical field names for the Risk Register and Risk Changes History tables.
+#
+# Airtable returns a field under its name, but depending on how a record was fetched
+# or written it may also come back keyed by field ID, or under an older spelling of
+# the name. Each logical field is resolved to one canonical column once per set of
+# columns, and records are normalized to those names when they are loaded, so the
+# pages can read e.g. record['Process'] directly.
+
+# Logical field -> (canonical name, other names/field IDs Airtable may use for it)
+REGISTER_FIELDS = {
+    'risk_reference': ('Risk reference', ['fldvQEaSVFnK3tmAo', 'Risk Reference']),
+    'process': ('Process', ['fldogjZZsxB3oPcdv']),
+    'sub_process': ('Sub Process', ['fldtE2ABpfY7asfn5']),
+    'activity': ('Activity', ['fldkyb02e604tooNz']),
+    'risk_types': ('Risk types', ['fldNqIWQ5VqVT7itc']),
+    'risk_type_name': ('Risk type', []),
+    'risk_category': ('Risk category (from Risk types)', ['fldARoA6U91O9wKiZ']),
+    'components': ('Component (Where will the risk occur)', ['fldlCW5th0RdZg1in']),
+    'risk_description': ('Risk description', ['fldqKOmtleXVuuhKE']),
+    'root_causes': ('Rootcause description (from rootcause)', ['fld00wYhLLvTGZkPM']),
+    'impact': ('Impact', ['fldc2ec6pUigCtOSb']),
+    'severity': ('Severity', ['fld195IZccUi69V5D']),
+    'likelihood': ('Likelihood', ['fldhdlk8KsdWNqgff']),
+    'detectability': ('Detectability', ['fldfVsQ4b7qc8TAPP']),
+    'overall_risk_score': ('Overall Risk Score', ['fldqLmmgCcAioHTi4']),
+    'overall_risk_level': ('Overall Risk Level', ['fldJtc0r2NsqF5UPV']),
+    'responsible': ('Who is responsible?', ['fld6jqOm7dmjdXKRy', 'Who is responsible']),
+    'ai_system': ('AI, algorithmic or autonomous system reference /name', ['fldB5EPuCN5A5pD4V']),
+}
+
+CHANGE_FIELDS = {
+    'risk_reference': ('Original Risk Reference', ['fldJwiM65ftTV4wA3']),
+    'fh_personnel': ('FH Personnel', ['fldMvXyJc8zCAHJJg']),
+    'abbyy_personnel': ('ABBYY Personnel', ['fld6RKhK7kWfsJost']),
+    'status': ('Status', ['fldfTsmdEsXG2dcAo']),
+    'risk_description': ('Risk Description', ['fldrpv5xlWDVnIE5d']),
+    'original_severity': ('Original Severity Level', ['fldTr9bdRevGV7zyi']),
+    'new_severity': ('New Severity Level', ['fldEYZSgQTr00GHf5']),
+    'original_likelihood': ('Original Likelihood Level', ['fldUZEGlpdaMMGTC9']),
+    'new_likelihood': ('New Likelihood Level', ['fld860nkAw1DUJaro']),
+    'original_detectability': ('Original Detectability Level', ['fldXO1FfoUa89lnsA']),
+    'new_detectability': ('New Detectability Level', ['fld60ppjc9HEM8RPo']),
+    'original_risk_level': ('Original Overall Risk Level', ['fldXsSjjUWPjRftIm']),
+    'new_risk_level': ('New Overall Risk Level', ['fldDJXURZKKyfz8pg']),
+    'risk_score': ('Risk Score', ['fldP1TiJw5FWkrQn0']),
+    'abbyy_response': ("ABBYY's Response", ['fldQ66bxR2keyBdHm']),
+    'abbyy_comment': ('ABBYY Comment', ['fldv1dx6ISiPTrzx4', 'ABBYY Comments']),
+    'fh_response': ('FH Response', ['fldj5ERls7Jsaq21H']),
+    'change_notes': ('Change Notes', ['fldmpEa117ZHBlJAN']),
+}
+
+SCHEMAS = {'register': REGISTER_FIELDS, 'changes': CHANGE_FIELDS}
+
+
+def column(field, schema='register'):
+    """Canonical column name of a logical field"""
+    return SCHEMAS[schema][field][0]
+
+
+def columns(schema='register'):
+    """All canonical column names of a schema"""
+    return [canonical for canonical, _ in SCHEMAS[schema].values()]
+
+
+def field_id(field, schema='register'):
+    """Airtable field ID of a logical field (None if it is only known by name)"""
+    return next((alias for alias in SCHEMAS[schema][field][1] if alias.startswith('fld')), None)
+
+
+@lru_cache(maxsize=64)
+def compile_schema(schema, columns):
+    """Resolve each canonical column to the source columns that hold it, in priority order
+
+    columns is a tuple of the column names present; names are matched without stray
+    spaces. Only fields with at least one source are included. The result is cached,
+    so a snapshot with the same columns is only resolved once.
+    """
+    columns_by_name = {}
+    for name in columns:
+        columns_by_name.setdefault(str(name).strip(), []).append(name)
+
+    plan = {}
+    for canonical, aliases in SCHEMAS[schema].values():
+        sources = [source for name in [canonical] + aliases for source in columns_by_name.get(name, [])]
+        if sources:
+            plan[canonical] = sources
+    return plan
+
+
+def normalize_frame(records_df, schema='register'):
+    """Rename/merge a DataFrame's columns to the canonical names
+
+    Where a field is present under several names, the first non-missing value wins.
+    Columns outside the schema are kept as they are. Returns records_df unchanged if it
+    is already normalized.
+    """
+    plan = compile_schema(schema, tuple(records_df.columns))
+    if all(sources == [canonical] for canonical, sources in plan.items()):
+        return records_df
+
+    source_of = {source: canonical for canonical, sources in plan.items() for source in sources}
+    normalized = {}
+    for name in records_df.columns:
+        canonical = source_of.get(name)
+        if canonical is None:
+            normalized[name] = records_df[name]
+        elif canonical not in normalized:
+            values = records_df[plan[canonical][0]]
+            for source in plan[canonical][1:]:
+                values = values.where(values.notna(), records_df[source])
+            normalized[canonical] = values.rename(canonical)
+    return pd.DataFrame(normalized, index=records_df.index)
+
+
+def normalize_fields(fields, schema='changes'):
+    """Return a record's fields dict keyed by canonical names (first non-missing value wins)"""
+    plan = compile_schema(schema, tuple(fields))
+    if all(sources == [canonical] for canonical, sources in plan.items()):
+        return fields
+
+    normalized = {name: value for name, value in fields.items()
+                  if not any(name in sources for sources in plan.values())}
+    for canonical, sources in plan.items():
+        values = [fields[source] for source in sources if fields[source] is not None]
+        normalized[canonical] = values[0] if values else None
+    return normalized
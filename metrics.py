@@ -0,0 +1,289 @@
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from urllib.parse import urlparse
+
+# Process-wide performance metrics.
+#
+# Stages of a page are timed with span() (or the @timed decorator); each span goes
+# into a latency histogram and, on the thread running a Streamlit rerun, into that
+# rerun's trace so the sidebar can show where the last rerun spent its time. The
+# rate limiter reports every Airtable request here, counted by table, operation and
+# status with a latency histogram per table and operation.
+#
+# If an export path is configured, a background thread writes the metrics there
+# every EXPORT_INTERVAL seconds - as a Prometheus text file (for node_exporter's
+# textfile collector) or as JSON lines, which also get one line per finished rerun.
+
+# Histogram bucket upper bounds in seconds (Prometheus' defaults)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+EXPORT_INTERVAL = 15
+PREFIX = "risk_app"
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_table_names = {}
+_local = threading.local()
+_export_path = None
+_export_format = "prometheus"
+_exporter = None
+
+
+def configure(path=None, export_format=None, interval=None):
+    """Set where metrics are exported ("prometheus" or "jsonl"); an empty path turns export off"""
+    global _export_path, _export_format, EXPORT_INTERVAL
+    _export_path = path or None
+    if export_format:
+        if export_format not in ("prometheus", "jsonl"):
+            raise ValueError(f"Unknown metrics format: {export_format}")
+        _export_format = export_format
+    if interval:
+        EXPORT_INTERVAL = float(interval)
+
+
+def name_table(table_id, name):
+    """Label requests to a table ID with a readable name"""
+    _table_names[table_id] = name
+
+
+def labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def increment(name, amount=1, **labels):
+    """Add to a counter"""
+    key = (name, labels_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name, seconds, **labels):
+    """Record a duration in a histogram"""
+    key = (name, labels_key(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {'buckets': [0] * (len(BUCKETS) + 1), 'sum': 0.0, 'count': 0}
+        histogram['buckets'][bisect.bisect_left(BUCKETS, seconds)] += 1
+        histogram['sum'] += seconds
+        histogram['count'] += 1
+
+
+# --- Spans and rerun traces ---
+
+def start_trace(page):
+    """Start timing a rerun of a page on the current thread; returns the trace to hand to finish_trace()"""
+    trace = {'page': page, 'started_at': time.time(), 'started': time.perf_counter(), 'ended': None, 'spans': []}
+    _local.trace = trace
+    _local.depth = 0
+    return trace
+
+
+def finish_trace(trace):
+    """Record a finished rerun (it lasts until the end of its last span)"""
+    if trace is None or trace.get('seconds') is not None:
+        return trace
+    if getattr(_local, 'trace', None) is trace:
+        _local.trace = None
+    trace['seconds'] = (trace['ended'] or trace['started']) - trace['started']
+    observe('rerun_seconds', trace['seconds'], page=trace['page'])
+    if _export_path and _export_format == "jsonl":
+        write_lines([{
+            'type': 'rerun',
+            'time': trace['started_at'],
+            'page': trace['page'],
+            'seconds': round(trace['seconds'], 6),
+            'spans': [{'name': name, 'depth': depth, 'seconds': round(seconds, 6)}
+                      for name, depth, seconds in trace['spans']],
+        }])
+    return trace
+
+
+@contextmanager
+def span(name):
+    """Time a block - recorded in the span histogram and the current rerun's trace"""
+    trace = getattr(_local, 'trace', None)
+    depth = getattr(_local, 'depth', 0)
+    if trace is not None:
+        # Reserve the slot now so nested spans are listed after their parent
+        position = len(trace['spans'])
+        trace['spans'].append((name, depth, 0.0))
+        _local.depth = depth + 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        ended = time.perf_counter()
+        observe('span_seconds', ended - started, span=name)
+        if trace is not None:
+            trace['spans'][position] = (name, depth, ended - started)
+            trace['ended'] = ended
+            _local.depth = depth
+
+
+def timed(name):
+    """Decorator form of span()"""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# --- Airtable requests ---
+
+def request_labels(method, url):
+    """(table, operation) labels for an Airtable REST call"""
+    parts = urlparse(url).path.strip('/').split('/')
+    table_id = parts[2] if len(parts) > 2 else ''
+    target = parts[3] if len(parts) > 3 else None
+    if target == 'listRecords' or (method == 'GET' and target is None):
+        operation = 'list'
+    else:
+        operation = {'GET': 'get', 'POST': 'create', 'PATCH': 'update', 'PUT': 'replace', 'DELETE': 'delete'}.get(method, method.lower())
+    return _table_names.get(table_id, table_id), operation
+
+
+def record_request(method, url, status, seconds):
+    """Count an Airtable request (status is the HTTP status, or 'error' if it didn't complete)"""
+    table, operation = request_labels(method, url)
+    increment('airtable_requests_total', table=table, operation=operation, status=str(status))
+    observe('airtable_request_seconds', seconds, table=table, operation=operation)
+    if status == 429:
+        increment('airtable_throttled_total', table=table)
+
+
+# --- Reading and exporting ---
+
+def snapshot():
+    """Copy of all counters and histograms as {'counters': [...], 'histograms': [...]}"""
+    with _lock:
+        counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                    for (name, labels), value in sorted(_counters.items())]
+        histograms = [{'name': name, 'labels': dict(labels), 'buckets': list(histogram['buckets']),
+                       'sum': histogram['sum'], 'count': histogram['count']}
+                      for (name, labels), histogram in sorted(_histograms.items())]
+    return {'counters': counters, 'histograms': histograms}
+
+
+def quantile(histogram, q):
+    """Estimate a quantile from a histogram (upper bound of the bucket it falls in, None past the last bucket)"""
+    if not histogram['count']:
+        return None
+    rank = q * histogram['count']
+    seen = 0
+    for bound, count in zip(BUCKETS, histogram['buckets']):
+        seen += count
+        if seen >= rank:
+            return bound
+    return None
+
+
+def request_summary():
+    """Airtable requests per table and operation: requests, throttled, errors, avg_ms and p95_ms"""
+    data = snapshot()
+    summary = {}
+    for counter in data['counters']:
+        if counter['name'] != 'airtable_requests_total':
+            continue
+        labels = counter['labels']
+        row = summary.setdefault((labels['table'], labels['operation']), {
+            'table': labels['table'], 'operation': labels['operation'],
+            'requests': 0, 'throttled': 0, 'errors': 0, 'avg_ms': None, 'p95_ms': None,
+        })
+        row['requests'] += counter['value']
+        if labels['status'] == '429':
+            row['throttled'] += counter['value']
+        elif labels['status'] == 'error' or labels['status'].startswith('5'):
+            row['errors'] += counter['value']
+    for histogram in data['histograms']:
+        row = summary.get((histogram['labels'].get('table'), histogram['labels'].get('operation')))
+        if histogram['name'] == 'airtable_request_seconds' and row is not None and histogram['count']:
+            row['avg_ms'] = round(histogram['sum'] / histogram['count'] * 1000, 1)
+            p95 = quantile(histogram, 0.95)
+            row['p95_ms'] = p95 * 1000 if p95 is not None else None
+    return [summary[key] for key in sorted(summary)]
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    text = ",".join(f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                    for key, value in labels.items())
+    return "{" + text + "}"
+
+
+def prometheus_text():
+    """All metrics in the Prometheus text exposition format"""
+    data = snapshot()
+    lines = []
+    declared = set()
+    for counter in data['counters']:
+        name = f"{PREFIX}_{counter['name']}"
+        if name not in declared:
+            lines.append(f"# TYPE {name} counter")
+            declared.add(name)
+        lines.append(f"{name}{format_labels(counter['labels'])} {counter['value']}")
+    for histogram in data['histograms']:
+        name = f"{PREFIX}_{histogram['name']}"
+        if name not in declared:
+            lines.append(f"# TYPE {name} histogram")
+            declared.add(name)
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), histogram['buckets']):
+            cumulative += count
+            lines.append(f"{name}_bucket{format_labels({**histogram['labels'], 'le': bound})} {cumulative}")
+        lines.append(f"{name}_sum{format_labels(histogram['labels'])} {histogram['sum']:.6f}")
+        lines.append(f"{name}_count{format_labels(histogram['labels'])} {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def write_lines(entries):
+    """Append JSON lines to the export file"""
+    with _lock:
+        with open(_export_path, 'a', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+
+
+def export():
+    """Write the current metrics to the export file"""
+    if not _export_path:
+        return
+    if _export_format == "jsonl":
+        write_lines([{'type': 'metrics', 'time': time.time(), 'buckets': list(BUCKETS), **snapshot()}])
+    else:
+        # Written atomically so the collector never reads a half-written file
+        temp_path = f"{_export_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(prometheus_text())
+        os.replace(temp_path, _export_path)
+
+
+def run_exporter():
+    """Exporter thread body - export every EXPORT_INTERVAL seconds"""
+    while True:
+        time.sleep(EXPORT_INTERVAL)
+        try:
+            export()
+        except Exception:
+            # A full disk or a moved file shouldn't stop the app - try again next time
+            pass
+
+
+def start_exporter():
+    """Start the exporter thread once per process (does nothing if export isn't configured)"""
+    global _exporter
+    if not _export_path:
+        return
+    with _lock:
+        if _exporter is None or not _exporter.is_alive():
+            _exporter = threading.Thread(target=run_exporter, name="metrics-exporter", daemon=True)
+            _exporter.start()
@@ -0,0 +1,376 @@
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+
+import events
+
+# Durable outbox for writes to Airtable.
+#
+# Saves are written to a local SQLite file and acknowledged straight away; a
+# background flusher drains the file with batch_create/batch_update calls of up to
+# 10 records (Airtable's per-request limit). A save made while Airtable is down or
+# rate limiting us stays in the file and is retried with backoff, and survives a
+# server restart. A batch Airtable refuses outright (a 422 for one bad value) is split
+# until only the bad saves are left to fail.
+#
+# Saves are written through to the shared caches via the events bus: the queued values
+# are published straight away as pending records (a new record gets a provisional
+# "pending-<entry ID>" record ID until Airtable assigns one), and the records Airtable
+# returns replace them once they have been written. An update to a pending record is
+# held back until its create has been sent.
+#
+# Delivery is at-least-once: if a batch request times out after Airtable has already
+# applied it, the retry can repeat it.
+
+BATCH_SIZE = 10
+MAX_ATTEMPTS = 10
+MAX_BACKOFF = 300
+FLUSH_INTERVAL = 5
+# Delivered entries are kept this long (in seconds) for troubleshooting, then pruned
+SENT_RETENTION = 24 * 60 * 60
+
+# Record IDs of creates that haven't been sent yet start with this
+PENDING_PREFIX = 'pending-'
+
+_path = 'outbox.sqlite3'
+_tables = {}
+_flush_lock = threading.Lock()
+_flusher_lock = threading.Lock()
+_wake = threading.Event()
+_flusher = None
+
+
+def configure(path):
+    """Set the SQLite file used for the outbox and make sure its table exists"""
+    global _path
+    _path = path
+    with connect() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                table_key TEXT NOT NULL,
+                operation TEXT NOT NULL,
+                record_id TEXT,
+                fields TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                sent_at REAL
+            )
+        """)
+
+
+@contextmanager
+def connect():
+    """Open a connection to the outbox file (one per call - connections aren't shared between threads)"""
+    conn = sqlite3.connect(_path, timeout=30)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def register_table(table_key, table):
+    """Register the pyairtable Table the flusher should use for a table key"""
+    _tables[table_key] = table
+
+
+def pending_record_id(entry_id):
+    """Provisional record ID of a create that hasn't been sent yet"""
+    return f"{PENDING_PREFIX}{entry_id}"
+
+
+def provisional_records(operation, entries):
+    """Queued (entry_id, record_id, fields) writes as records to show until Airtable confirms them"""
+    created_time = time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime())
+    return [
+        {
+            'id': pending_record_id(entry_id) if operation == 'create' else record_id,
+            'createdTime': created_time,
+            'fields': fields,
+            'operation': operation,
+            'outbox_entry': entry_id,
+        }
+        for entry_id, record_id, fields in entries
+    ]
+
+
+def publish_pending():
+    """Publish every queued write as pending (e.g. saves left in the outbox by a restart)"""
+    with connect() as conn:
+        queued = conn.execute(
+            "SELECT id, table_key, operation, record_id, fields FROM outbox WHERE status = 'pending' ORDER BY id"
+        ).fetchall()
+    publish_entries(queued)
+
+
+def publish_entries(entries):
+    """Publish (entry_id, table_key, operation, record_id, fields) outbox rows as pending records"""
+    # Creates go first, so updates to records that are still pending have something to apply to
+    for table_key, operation in sorted({(table_key, operation) for _, table_key, operation, _, _ in entries}):
+        events.publish(table_key, provisional_records(operation, [
+            (entry_id, record_id, json.loads(fields))
+            for entry_id, entry_table_key, entry_operation, record_id, fields in entries
+            if (entry_table_key, entry_operation) == (table_key, operation)
+        ]), pending=True)
+
+
+def enqueue(table_key, operation, fields, record_id=None):
+    """Store a 'create' or 'update' in the outbox and wake the flusher; returns the outbox entry ID"""
+    return enqueue_many(table_key, operation, [(record_id, fields)])[0]
+
+
+def enqueue_many(table_key, operation, entries):
+    """Store several (record_id, fields) writes in one transaction and wake the flusher
+
+    Returns the outbox entry IDs in the same order.
+    """
+    entry_ids = []
+    with connect() as conn:
+        for record_id, fields in entries:
+            cursor = conn.execute(
+                "INSERT INTO outbox (table_key, operation, record_id, fields, created_at) VALUES (?, ?, ?, ?, ?)",
+                (table_key, operation, record_id, json.dumps(fields), time.time())
+            )
+            entry_ids.append(cursor.lastrowid)
+    events.publish(table_key, provisional_records(operation, [
+        (entry_id, record_id, fields) for entry_id, (record_id, fields) in zip(entry_ids, entries)
+    ]), pending=True)
+    start_flusher()
+    _wake.set()
+    return entry_ids
+
+
+def enqueue_create(table_key, fields):
+    """Queue a record to be created"""
+    return enqueue(table_key, 'create', fields)
+
+
+def enqueue_update(table_key, record_id, fields):
+    """Queue an update to an existing record"""
+    return enqueue(table_key, 'update', fields, record_id)
+
+
+def is_retryable(error):
+    """Rate limits, server errors and connection problems are retried; other 4xx errors are not"""
+    response = getattr(error, 'response', None)
+    if isinstance(error, requests.HTTPError) and response is not None:
+        return response.status_code == 429 or response.status_code >= 500
+    return True
+
+
+def due_entries(conn, table_key, operation):
+    """Pending entries of one kind that are due for an attempt, oldest first"""
+    return conn.execute(
+        "SELECT id, record_id, fields, attempts FROM outbox "
+        "WHERE table_key = ? AND operation = ? AND status = 'pending' AND next_attempt_at <= ? ORDER BY id",
+        (table_key, operation, time.time())
+    ).fetchall()
+
+
+def mark_sent(conn, entry_ids, record_ids):
+    """Mark entries as delivered, remembering the Airtable record ID each one produced"""
+    conn.executemany(
+        "UPDATE outbox SET status = 'sent', sent_at = ?, record_id = ?, last_error = NULL WHERE id = ?",
+        [(time.time(), record_id, entry_id) for entry_id, record_id in zip(entry_ids, record_ids)]
+    )
+
+
+def mark_failed(conn, entries, error):
+    """Schedule a retry with exponential backoff, or give up on non-retryable errors / too many attempts
+
+    Returns the IDs of the entries that were given up on.
+    """
+    retryable = is_retryable(error)
+    given_up = []
+    for entry_id, attempts in entries:
+        attempts += 1
+        if retryable and attempts < MAX_ATTEMPTS:
+            conn.execute(
+                "UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (attempts, time.time() + min(MAX_BACKOFF, 2 ** attempts), str(error), entry_id)
+            )
+        else:
+            conn.execute(
+                "UPDATE outbox SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?",
+                (attempts, str(error), entry_id)
+            )
+            given_up.append(entry_id)
+    return given_up
+
+
+def resolve_record_id(conn, record_id):
+    """Airtable record ID for an update's target - (record_id, None) normally
+
+    For a provisional "pending-<entry ID>" target, returns (the created record's ID, None)
+    once the create has been sent, (None, None) while it hasn't, and (None, error) if
+    the create was given up on.
+    """
+    if not record_id.startswith(PENDING_PREFIX):
+        return record_id, None
+    row = conn.execute(
+        "SELECT status, record_id FROM outbox WHERE id = ?", (int(record_id[len(PENDING_PREFIX):]),)
+    ).fetchone()
+    if row is None or row[0] == 'failed':
+        return None, f"The record to update ({record_id}) could not be created"
+    return (row[1], None) if row[0] == 'sent' else (None, None)
+
+
+def send_creates(conn, table_key, table, chunk):
+    """Create one batch of entries
+
+    A non-retryable error (a 422 for one bad field value, say) fails the whole request,
+    so the batch is split in half and each half sent again until only the bad entries
+    are left to be given up on.
+    """
+    try:
+        created = table.batch_create([json.loads(fields) for _, _, fields, _ in chunk])
+    except Exception as e:
+        if len(chunk) > 1 and not is_retryable(e):
+            middle = len(chunk) // 2
+            send_creates(conn, table_key, table, chunk[:middle])
+            send_creates(conn, table_key, table, chunk[middle:])
+            return
+        given_up = mark_failed(conn, [(entry_id, attempts) for entry_id, _, _, attempts in chunk], e)
+        conn.commit()
+        if given_up:
+            # Saves that will never arrive are taken out of the shared caches again
+            events.publish(table_key, [], entry_ids=given_up,
+                           replaced_ids=[pending_record_id(entry_id) for entry_id in given_up])
+        return
+    mark_sent(conn, [entry_id for entry_id, _, _, _ in chunk], [record['id'] for record in created])
+    conn.commit()
+    # The records Airtable created take the place of the pending ones (in the same order) in the shared caches
+    entry_ids = [entry_id for entry_id, _, _, _ in chunk]
+    events.publish(table_key, created, entry_ids=entry_ids,
+                   replaced_ids=[pending_record_id(entry_id) for entry_id in entry_ids])
+
+
+def flush_creates(conn, table_key, table):
+    """Send pending creates for one table in batches of BATCH_SIZE"""
+    entries = due_entries(conn, table_key, 'create')
+    for start in range(0, len(entries), BATCH_SIZE):
+        send_creates(conn, table_key, table, entries[start:start + BATCH_SIZE])
+
+
+def send_updates(conn, table_key, table, chunk):
+    """Update one batch of records ([(record_id, {'fields', 'entries'})]), split like send_creates()"""
+    entries = [entry for _, update in chunk for entry in update['entries']]
+    try:
+        updated = table.batch_update([
+            {'id': record_id, 'fields': update['fields']} for record_id, update in chunk
+        ])
+    except Exception as e:
+        if len(chunk) > 1 and not is_retryable(e):
+            middle = len(chunk) // 2
+            send_updates(conn, table_key, table, chunk[:middle])
+            send_updates(conn, table_key, table, chunk[middle:])
+            return
+        given_up = set(mark_failed(conn, entries, e))
+        conn.commit()
+        if given_up:
+            events.publish(table_key, [], entry_ids=sorted(given_up), reverted_ids=[
+                record_id for record_id, update in chunk
+                if any(entry_id in given_up for entry_id, _ in update['entries'])
+            ])
+        return
+    mark_sent(
+        conn,
+        [entry_id for entry_id, _ in entries],
+        [record_id for record_id, update in chunk for _ in update['entries']]
+    )
+    conn.commit()
+    events.publish(table_key, updated, entry_ids=[entry_id for entry_id, _ in entries])
+
+
+def flush_updates(conn, table_key, table):
+    """Send pending updates for one table in batches of BATCH_SIZE
+
+    Several queued updates to the same record are merged into one, later values winning.
+    """
+    merged = {}
+    for entry_id, record_id, fields, attempts in due_entries(conn, table_key, 'update'):
+        target_id, error = resolve_record_id(conn, record_id)
+        if error:
+            # Give up straight away - the update can never be sent
+            mark_failed(conn, [(entry_id, MAX_ATTEMPTS)], error)
+            events.publish(table_key, [], entry_ids=[entry_id], reverted_ids=[record_id])
+            continue
+        if target_id is None:
+            # The record is still waiting to be created - try again on the next pass
+            continue
+        update = merged.setdefault(target_id, {'fields': {}, 'entries': []})
+        update['fields'].update(json.loads(fields))
+        update['entries'].append((entry_id, attempts))
+
+    updates = list(merged.items())
+    for start in range(0, len(updates), BATCH_SIZE):
+        send_updates(conn, table_key, table, updates[start:start + BATCH_SIZE])
+
+
+def flush():
+    """Deliver everything that is due; safe to call from any thread"""
+    with _flush_lock:
+        with connect() as conn:
+            for table_key, table in list(_tables.items()):
+                flush_creates(conn, table_key, table)
+                flush_updates(conn, table_key, table)
+            conn.execute("DELETE FROM outbox WHERE status = 'sent' AND sent_at < ?", (time.time() - SENT_RETENTION,))
+
+
+def run_flusher():
+    """Flusher thread loop - flush when woken by enqueue() or every FLUSH_INTERVAL seconds"""
+    while True:
+        _wake.wait(FLUSH_INTERVAL)
+        _wake.clear()
+        try:
+            flush()
+        except Exception:
+            # Leave the entries in place - they are retried on the next pass
+            pass
+
+
+def start_flusher():
+    """Start the process-wide flusher thread if it isn't running yet"""
+    global _flusher
+    with _flusher_lock:
+        if _flusher is None or not _flusher.is_alive():
+            # Saves left over from before a restart show up as pending until they are sent
+            if _flusher is None:
+                publish_pending()
+            _flusher = threading.Thread(target=run_flusher, name="airtable-outbox", daemon=True)
+            _flusher.start()
+
+
+def get_stats():
+    """Count outbox entries by status, e.g. {'pending': 2, 'failed': 1}"""
+    with connect() as conn:
+        return dict(conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+
+
+def get_failed():
+    """Entries that were given up on, newest first"""
+    with connect() as conn:
+        return conn.execute(
+            "SELECT id, table_key, operation, record_id, attempts, last_error FROM outbox "
+            "WHERE status = 'failed' ORDER BY id DESC"
+        ).fetchall()
+
+
+def retry_failed():
+    """Put failed entries back in the queue (and back into the shared caches as pending)"""
+    with connect() as conn:
+        failed = conn.execute(
+            "SELECT id, table_key, operation, record_id, fields FROM outbox WHERE status = 'failed' ORDER BY id"
+        ).fetchall()
+        conn.execute("UPDATE outbox SET status = 'pending', attempts = 0, next_attempt_at = 0 WHERE status = 'failed'")
+    publish_entries(failed)
+    _wake.set()
@@ -1,14 +1,14 @@
 import streamlit as st
-import pandas as pd
-import requests
 import sys
-import os
 from pathlib import Path
 
 # Add the app directory to the Python path to import common functions
 sys.path.append(str(Path(__file__).parent.parent))
 import app
 
+# Time this rerun - stages are shown in the sidebar's performance panel if it's enabled
+app.begin_rerun("ABBYY Response")
+
 # Page title
 st.title("ABBYY Response")
 st.subheader("Review and respond to risks")
@@ -16,8 +16,15 @@ st.subheader("Review and respond to risks")
 # Check if connected
 if not st.session_state.get('connected', False):
     st.info("Please connect to Airtable using the sidebar button to begin.")
+    app.end_rerun()
     st.stop()
 
+# Pick up the latest shared register snapshot
+app.load_risk_data()
+
+# Show queued/failed saves
+app.show_airtable_status()
+
 # Get tables from session state
 risk_register_table = st.session_state.get('risk_register_table')
 risk_changes_table = st.session_state.get('risk_changes_table')
@@ -26,6 +33,241 @@ records_df = st.session_state.get('records_df')
 # Debug information
 st.write(f"Records found: {len(records_df) if records_df is not None else 'None'}")
 
+# Runs as a fragment - changing the levels or the response reruns only this panel,
+# not the filters, the risk lookup and the details above it
+@st.fragment
+def show_risk_assessment(filtered_record, risk_change_values):
+    """Risk assessment, ABBYY response and save button for a risk
+
+    risk_change_values holds the Risk Changes values that don't depend on this panel
+    (reference, personnel and the risk's details), keyed like build_risk_change_data().
+    """
+    record_id = filtered_record.get('record_id')
+    
+    # Risk Assessment section
+    st.write("### Risk Assessment")
+
+    col1, col2, col3, col4 = st.columns(4)
+
+    # Update options to match the actual format in the data
+    severity_options = ["1. High", "2. Medium", "3. Low"]
+    likelihood_options = ["1. High", "2. Medium", "3. Low"]
+    detectability_options = ["1. High", "2. Medium", "3. Low"]
+
+    # Get actual values only - no defaults (None when the field isn't set)
+    severity_level = filtered_record.get('Severity')
+    likelihood_level = filtered_record.get('Likelihood')
+    detectability_level = filtered_record.get('Detectability')
+    overall_risk_level = filtered_record.get('Overall Risk Score')
+
+    # Store original values in session state for this risk
+    risk_id_key = f"risk_id_{record_id}"
+    if risk_id_key not in st.session_state or st.session_state[risk_id_key] != record_id:
+        # First time loading this specific risk, store original values
+        st.session_state[risk_id_key] = record_id
+        st.session_state['original_severity'] = severity_level
+        st.session_state['original_likelihood'] = likelihood_level
+        st.session_state['original_detectability'] = detectability_level
+        st.session_state['original_risk_level'] = overall_risk_level
+        
+        # Initialize flags to track if user has changed values
+        st.session_state['user_changed_values'] = False
+
+    # Initialize ABBYY response
+    if 'abbyy_response' not in st.session_state:
+        st.session_state['abbyy_response'] = "Accept"
+
+    # ABBYY's Response selection
+    abbyy_response_options = ["Accept", "Change"]
+    abbyy_response = st.radio(
+        "ABBYY's Response", 
+        options=abbyy_response_options,
+        key="abbyy_resp",
+        horizontal=True
+    )
+
+    # Store selection in session state
+    st.session_state['abbyy_response'] = abbyy_response
+
+    # Add comment box if Change is selected
+    abbyy_comment = ""
+    if abbyy_response == "Change":
+        abbyy_comment = st.text_area(
+            "ABBYY Change Comments", 
+            value="", 
+            height=100,
+            key="abbyy_comment",
+            help="Please provide your reasoning for the proposed changes"
+        )
+
+    # Show editable fields only if "Change" is selected
+    is_editable = (abbyy_response == "Change")
+
+    # Function to track changes and update risk score
+    def on_value_change():
+        # Mark that user has changed values
+        st.session_state['user_changed_values'] = True
+        
+        # Get current dropdown values directly from session state
+        severity = st.session_state.get('severity_abbyy')
+        likelihood = st.session_state.get('likelihood_abbyy')
+        detectability = st.session_state.get('detectability_abbyy')
+        
+        # Only calculate if all values are available
+        new_level, overall_score = app.calculate_risk_level(severity, likelihood, detectability)
+        if new_level:
+            # Store results in session state
+            st.session_state['new_risk_level'] = new_level
+            st.session_state['risk_score'] = overall_score
+
+    with col1:
+        # Severity
+        severity_index = severity_options.index(severity_level) if severity_level in severity_options else 0
+        severity_display = st.selectbox(
+            "Severity Level", 
+            options=severity_options, 
+            index=severity_index,
+            key="severity_abbyy",
+            disabled=not is_editable,
+            on_change=on_value_change if is_editable else None
+        )
+
+    with col2:
+        # Likelihood
+        likelihood_index = likelihood_options.index(likelihood_level) if likelihood_level in likelihood_options else 0
+        likelihood_display = st.selectbox(
+            "Likelihood Level", 
+            options=likelihood_options, 
+            index=likelihood_index,
+            key="likelihood_abbyy",
+            disabled=not is_editable,
+            on_change=on_value_change if is_editable else None
+        )
+
+    with col3:
+        # Detectability
+        detectability_index = detectability_options.index(detectability_level) if detectability_level in detectability_options else 0
+        detectability_display = st.selectbox(
+            "Detectability Level", 
+            options=detectability_options, 
+            index=detectability_index,
+            key="detectability_abbyy",
+            disabled=not is_editable,
+            on_change=on_value_change if is_editable else None
+        )
+
+    with col4:
+        # Display risk score
+        if is_editable:
+            # Check if the user has changed any values
+            if st.session_state.get('user_changed_values', False):
+                # User has made changes, show the new calculated risk score
+                new_level = st.session_state.get('new_risk_level')
+                overall_score = st.session_state.get('risk_score')
+                
+                if new_level and overall_score:
+                    risk_display = f"{new_level} (Score: {overall_score})"
+                else:
+                    # Calculate right here from the current dropdown values
+                    severity = st.session_state.get('severity_abbyy')
+                    likelihood = st.session_state.get('likelihood_abbyy')
+                    detectability = st.session_state.get('detectability_abbyy')
+
+                    new_level, overall_score = app.calculate_risk_level(severity, likelihood, detectability)
+                    
+                    if new_level:
+                        st.session_state['new_risk_level'] = new_level
+                        st.session_state['risk_score'] = overall_score
+                        risk_display = f"{new_level} (Score: {overall_score})"
+                    else:
+                        risk_display = "Incomplete data"
+            else:
+                # No changes yet, so show the original risk score
+                original_risk_level = st.session_state.get('original_risk_level', "")
+                
+                # Format for display - same formatting function as in non-editable mode
+                risk_display = ""
+                if original_risk_level:
+                    risk_display = app.format_risk_level(original_risk_level)
+                else:
+                    risk_display = "No original risk score found"
+            
+            # No key - a keyed widget keeps its first value, so the score would never update
+            st.text_input("Overall Risk Score", 
+                        value=risk_display, 
+                        disabled=True)
+        else:
+            # Show original risk score when not in edit mode
+            original_risk_level = st.session_state.get('original_risk_level', "")
+            
+            # Format for display
+            risk_level_display = ""
+            if original_risk_level:
+                risk_level_display = app.format_risk_level(original_risk_level)
+            
+            st.text_input("Overall Risk Score", 
+                        value=risk_level_display, 
+                        disabled=True)
+    
+    # Save button
+    if st.button("Save ABBYY Response", disabled=app.is_read_only()):
+        try:
+            # Check if risk_changes_table is available
+            if not risk_changes_table:
+                st.error(f"Cannot access '{app.RISK_CHANGES_TABLE_NAME}' table. Please check permissions.")
+                st.info("Make sure your API key has access to the table with ID: " + app.RISK_CHANGES_TABLE_ID)
+                st.stop()
+            
+            # Only save if there's a change or user explicitly wants to save
+            has_changes = (
+                abbyy_response == "Change" and (
+                    severity_display != st.session_state['original_severity'] or
+                    likelihood_display != st.session_state['original_likelihood'] or
+                    detectability_display != st.session_state['original_detectability']
+                )
+            )
+            
+            if abbyy_response == "Accept" or has_changes:
+                # Get just the risk level name (without the score part)
+                new_risk_level = st.session_state.get('new_risk_level', "")
+                
+                # Format the original risk level to show just the level name
+                original_risk_display = ""
+                original_risk_level = st.session_state.get('original_risk_level', "")
+                
+                if original_risk_level:
+                    # If it's a numeric score, convert to level name (text levels are used directly)
+                    original_risk_display = app.format_risk_level(original_risk_level, with_score=False)
+                
+                # Map the values onto the Risk Changes field IDs (JSON-safe, no NaN values)
+                sanitized_data = app.build_risk_change_data({
+                    **risk_change_values,
+                    'original_severity': st.session_state.get('original_severity', severity_level),
+                    'new_severity': severity_display if abbyy_response == "Change" else "",
+                    'original_likelihood': st.session_state.get('original_likelihood', likelihood_level),
+                    'new_likelihood': likelihood_display if abbyy_response == "Change" else "",
+                    'original_detectability': st.session_state.get('original_detectability', detectability_level),
+                    'new_detectability': detectability_display if abbyy_response == "Change" else "",
+                    'original_risk_level': original_risk_display,
+                    'new_risk_level': new_risk_level if abbyy_response == "Change" else "",
+                    'abbyy_response': abbyy_response,
+                    'abbyy_comment': abbyy_comment,
+                })
+                
+                try:
+                    # Queue the record for the Risk Changes table - the outbox sends it in the background
+                    app.queue_risk_change_create(sanitized_data)
+                    st.success("✅ ABBYY response saved successfully! It will be sent to Airtable in the background.")
+                    
+                except Exception as e:
+                    st.error(f"Error saving response: {e}")
+                    
+            else:
+                st.info("No changes detected. Nothing was saved.")
+                
+        except Exception as e:
+            st.error(f"Unexpected error: {e}")
+
 # Create lists for dropdowns
 if records_df is not None and not records_df.empty:
     # Add filter section before risk selection
@@ -33,38 +275,8 @@ if records_df is not None and not records_df.empty:
     filter_col1, filter_col2, filter_col3 = st.columns(3)  # Changed to 3 columns for the new filter
     
     with filter_col1:
-        # Get unique "Who is responsible?" values
-        responsible_options = []
-        if 'fld6jqOm7dmjdXKRy' in records_df.columns:
-            # Extract values from the array field
-            all_responsible = []
-            for resp in records_df['fld6jqOm7dmjdXKRy'].dropna():
-                if isinstance(resp, list):
-                    all_responsible.extend(resp)
-                elif isinstance(resp, str):
-                    # Handle string format like "[\"Product\"]"
-                    cleaned = resp.replace('[', '').replace(']', '').replace('"', '').replace("'", "")
-                    items = [item.strip() for item in cleaned.split(',')]
-                    all_responsible.extend(items)
-            
-            # Get unique values
-            responsible_options = sorted(list(set([r for r in all_responsible if r])))
-        
-        if not responsible_options:
-            # Try alternative field names
-            for field in ['Who is responsible?', 'Who is responsible']:
-                if field in records_df.columns:
-                    all_responsible = []
-                    for resp in records_df[field].dropna():
-                        if isinstance(resp, list):
-                            all_responsible.extend(resp)
-                        elif isinstance(resp, str):
-                            cleaned = resp.replace('[', '').replace(']', '').replace('"', '').replace("'", "")
-                            items = [item.strip() for item in cleaned.split(',')]
-                            all_responsible.extend(items)
-                    
-                    responsible_options = sorted(list(set([r for r in all_responsible if r])))
-                    break
+        # Unique "Who is responsible?" values, parsed once per snapshot by the facet index
+        responsible_options = app.get_facet_options(records_df, 'responsible')
         
         # Create multiselect dropdown for responsible party instead of single-select
         selected_responsible = st.multiselect(
@@ -93,111 +305,37 @@ if records_df is not None and not records_df.empty:
             key="filter_ai_system"
         )
     
-    # Risk references - use whatever field has data
-    risk_references = []
-    filtered_records = records_df.copy()
+    # Free-text search over descriptions, root causes, impacts, process and components
+    search_query = st.text_input(
+        "Search risks",
+        key="filter_search",
+        placeholder="e.g. data retention (words can be partial)"
+    )
     
-    # Apply filter for Who is responsible (if any selected)
-    if selected_responsible:
-        # Find the appropriate column for Who is responsible
-        responsible_column = None
-        for column in ['fld6jqOm7dmjdXKRy', 'Who is responsible?', 'Who is responsible']:
-            if column in filtered_records.columns:
-                responsible_column = column
-                break
-        
-        if responsible_column:
-            try:
-                # Filter records where any of the selected responsible parties are present
-                filtered_records_list = []
-                
-                for _, row in filtered_records.iterrows():
-                    if responsible_column in row:
-                        value = row[responsible_column]
-                        # Handle different data formats
-                        if isinstance(value, list):
-                            if any(resp in value for resp in selected_responsible):
-                                filtered_records_list.append(row)
-                        elif isinstance(value, str):
-                            str_value = value.replace('[', '').replace(']', '').replace('"', '').replace("'", "")
-                            if any(resp in str_value for resp in selected_responsible):
-                                filtered_records_list.append(row)
-                
-                if filtered_records_list:
-                    filtered_records = pd.DataFrame(filtered_records_list)
-                else:
-                    # If no records found with this approach, try a broader match
-                    mask = pd.Series(False, index=filtered_records.index)
-                    for resp in selected_responsible:
-                        mask = mask | filtered_records[responsible_column].astype(str).str.contains(resp, na=False)
-                    filtered_records = filtered_records[mask]
-            except Exception as e:
-                st.warning(f"Error filtering by responsible party: {e}")
-    
-    # Apply filter for risk levels (if any selected)
-    if selected_risk_levels:
-        # Find the appropriate column for risk level
-        risk_level_column = None
-        for column in ['fldJtc0r2NsqF5UPV', 'Overall Risk Level']:
-            if column in filtered_records.columns:
-                risk_level_column = column
-                break
-        
-        if risk_level_column:
-            try:
-                # Try direct matching first
-                risk_level_mask = filtered_records[risk_level_column].isin(selected_risk_levels)
-                if risk_level_mask.any():
-                    filtered_records = filtered_records[risk_level_mask]
-                else:
-                    # If no direct matches, try string contains
-                    level_mask = pd.Series(False, index=filtered_records.index)
-                    for level in selected_risk_levels:
-                        level_mask = level_mask | filtered_records[risk_level_column].astype(str).str.contains(level, na=False)
-                    filtered_records = filtered_records[level_mask]
-            except Exception as e:
-                st.warning(f"Error filtering by risk level: {e}")
+    # Collect the active filters - each one is a set lookup in the facet index
+    filter_selections = {
+        'responsible': selected_responsible,
+        'risk_level': selected_risk_levels,
+    }
     
     # Apply filter for AI system reference (if not "All")
     if selected_ai_system != "All":
-        # Find the appropriate column for AI system reference
-        ai_system_column = None
-        
-        # Look for the column with more flexible matching (handle trailing spaces)
-        for column in filtered_records.columns:
-            if column.strip() == 'AI, algorithmic or autonomous system reference /name' or column == 'fldB5EPuCN5A5pD4V':
-                ai_system_column = column
-                break
-        
-        if ai_system_column:
-            try:
-                # Filter by exact match for AI system
-                ai_system_mask = filtered_records[ai_system_column] == selected_ai_system
-                
-                # If no matches, try case-insensitive contains
-                if not ai_system_mask.any():
-                    ai_system_mask = filtered_records[ai_system_column].astype(str).str.contains(
-                        selected_ai_system, case=False, na=False
-                    )
-                
-                # Apply the filter
-                filtered_records = filtered_records[ai_system_mask]
-            except Exception as e:
-                st.warning(f"Error filtering by AI system: {e}")
+        if app.has_facet(records_df, 'ai_system'):
+            filter_selections['ai_system'] = [selected_ai_system]
         else:
             st.warning("AI system column not found. Please check column names in your Airtable.")
     
-    # Try common fields for risk references from filtered records
-    for field in ['fldvQEaSVFnK3tmAo', 'Risk reference', 'Risk Reference']:
-        if field in filtered_records.columns:
-            risk_refs = filtered_records[field].dropna().tolist()
-            if risk_refs:
-                risk_references = [str(ref) for ref in risk_refs if ref is not None]
-                break
+    # In "filtered" load mode only the matching risks are fetched (see app.REGISTER_LOAD_MODE)
+    records_df = app.load_filtered_risk_data(filter_selections)
+    if records_df is None:
+        app.end_rerun()
+        st.stop()
     
-    if not risk_references:
-        # Fallback to record IDs if no references found
-        risk_references = filtered_records['record_id'].tolist()
+    # Intersect the matching row positions and get their risk references
+    filtered_positions = app.filter_risk_positions(records_df, filter_selections)
+    # Narrow them to the search matches, best match first
+    filtered_positions = app.search_risks(records_df, search_query, filtered_positions)
+    risk_references = app.get_risk_references(records_df, filtered_positions)
     
     # Display count of filtered risks
     st.info(f"Found {len(risk_references)} risk(s) matching your filter criteria.")
@@ -206,6 +344,62 @@ if records_df is not None and not records_df.empty:
     fh_personnel = ["FH Person 1", "FH Person 2", "FH Person 3"]
     abbyy_personnel = ["ABBYY Person 1", "ABBYY Person 2", "ABBYY Person 3"]
     
+    # Review mode - bulk mode accepts many risks unchanged in one go
+    review_mode = st.radio(
+        "Review Mode",
+        options=["Single risk", "Bulk accept"],
+        horizontal=True,
+        key="review_mode_abbyy"
+    )
+    
+    if review_mode == "Bulk accept":
+        st.write("### Bulk Accept")
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            bulk_fh_personnel = st.selectbox("FH Personnel", options=fh_personnel, key="fh_personnel_bulk")
+        
+        with col2:
+            bulk_abbyy_personnel = st.selectbox("ABBYY Personnel", options=abbyy_personnel, key="abbyy_personnel_bulk")
+        
+        select_all = st.checkbox("Select all filtered risks", key="bulk_select_all")
+        
+        # One row per filtered risk, indexed by row position, with a checkbox to pick the ones to accept
+        bulk_df = app.build_bulk_review_table(records_df, filtered_positions, selected=select_all)
+        
+        # Tie the editor to the filter result so ticks never carry over onto different risks
+        edited_df = st.data_editor(
+            bulk_df,
+            column_config={"Accept": st.column_config.CheckboxColumn("Accept")},
+            disabled=[column for column in bulk_df.columns if column != "Accept"],
+            hide_index=True,
+            key=f"bulk_accept_{hash(tuple(filtered_positions))}_{select_all}"
+        )
+        selected_positions = edited_df.index[edited_df['Accept']].tolist()
+        
+        if st.button(f"Accept {len(selected_positions)} selected risk(s)", disabled=not selected_positions or app.is_read_only()):
+            try:
+                # Check if risk_changes_table is available
+                if not risk_changes_table:
+                    st.error(f"Cannot access '{app.RISK_CHANGES_TABLE_NAME}' table. Please check permissions.")
+                    app.end_rerun()
+                    st.stop()
+                
+                # Build every Risk Changes record in one pass and queue them together -
+                # the outbox sends them as batch creates of 10
+                bulk_data = [
+                    app.build_accept_data(records_df, position, bulk_fh_personnel, bulk_abbyy_personnel)
+                    for position in selected_positions
+                ]
+                app.queue_risk_change_creates(bulk_data)
+                st.success(f"✅ Accepted {len(bulk_data)} risk(s)! The responses will be sent to Airtable in the background.")
+            except Exception as e:
+                st.error(f"Error saving responses: {e}")
+        
+        app.end_rerun()
+        st.stop()
+    
     # Display form for selecting risk
     st.write("### Risk Selection")
     
@@ -232,9 +426,11 @@ if records_df is not None and not records_df.empty:
             # Extract record ID
             record_id = filtered_record.get('record_id')
             
-            # Get risk type display
-            risk_types_dict = st.session_state.get('risk_types_dict', {})
-            risk_type_display, risk_type_ids = app.get_risk_type_display(filtered_record, risk_types_dict)
+            # Display strings of the detail fields, precomputed for the whole snapshot
+            detail_strings = app.get_risk_display(records_df, selected_risk_reference)
+            
+            # Risk Type names and linked IDs, resolved for the whole snapshot when it was built
+            risk_type_display, risk_type_ids = detail_strings['risk_type'], detail_strings['risk_type_ids']
             
             # Display risk details (uneditable)
             st.write("### Risk Details")
@@ -243,29 +439,17 @@ if records_df is not None and not records_df.empty:
             
             with col1:
                 # Process
-                process = ""
-                if 'Process' in filtered_record:
-                    process = app.clean_display_value(filtered_record['Process'])
-                elif 'fldogjZZsxB3oPcdv' in filtered_record:
-                    process = app.clean_display_value(filtered_record['fldogjZZsxB3oPcdv'])
+                process = detail_strings['Process']
                 
                 st.text_input("Process", value=process, disabled=True, key="process_abbyy")
                 
                 # Sub Process
-                sub_process = ""
-                if 'Sub Process' in filtered_record:
-                    sub_process = app.clean_display_value(filtered_record['Sub Process'])
-                elif 'fldtE2ABpfY7asfn5' in filtered_record:
-                    sub_process = app.clean_display_value(filtered_record['fldtE2ABpfY7asfn5'])
+                sub_process = detail_strings['Sub Process']
                 
                 st.text_input("Sub Process", value=sub_process, disabled=True, key="sub_process_abbyy")
                 
                 # Activity
-                activity = ""
-                if 'Activity' in filtered_record:
-                    activity = app.clean_display_value(filtered_record['Activity'])
-                elif 'fldkyb02e604tooNz' in filtered_record:
-                    activity = app.clean_display_value(filtered_record['fldkyb02e604tooNz'])
+                activity = detail_strings['Activity']
                 
                 st.text_input("Activity", value=activity, disabled=True, key="activity_abbyy")
                 
@@ -273,423 +457,46 @@ if records_df is not None and not records_df.empty:
                 st.text_input("Risk Type", value=risk_type_display, disabled=True, key="risk_type_abbyy")
                 
                 # Risk Category
-                risk_category = ""
-                if 'Risk category (from Risk types)' in filtered_record:
-                    risk_category = app.clean_display_value(filtered_record['Risk category (from Risk types)'])
-                elif 'fldARoA6U91O9wKiZ' in filtered_record:
-                    risk_category = app.clean_display_value(filtered_record['fldARoA6U91O9wKiZ'])
+                risk_category = detail_strings['Risk category (from Risk types)']
                 
                 st.text_input("Risk Category", value=risk_category, disabled=True, key="risk_category_abbyy")
                 
                 # Components
-                components = ""
-                if 'Component (Where will the risk occur)' in filtered_record:
-                    components = app.clean_display_value(filtered_record['Component (Where will the risk occur)'])
-                elif 'fldlCW5th0RdZg1in' in filtered_record:
-                    components = app.clean_display_value(filtered_record['fldlCW5th0RdZg1in'])
+                components = detail_strings['Component (Where will the risk occur)']
                 
                 st.text_area("Components", value=components, disabled=True, key="components_abbyy")
             
             with col2:
                 # Risk Description
-                risk_description = ""
-                if 'Risk description' in filtered_record:
-                    risk_description = app.clean_display_value(filtered_record['Risk description'])
-                elif 'fldqKOmtleXVuuhKE' in filtered_record:
-                    risk_description = app.clean_display_value(filtered_record['fldqKOmtleXVuuhKE'])
+                risk_description = detail_strings['Risk description']
                 
                 st.text_area("Risk Description", value=risk_description, disabled=True, key="risk_description_abbyy")
                 
                 # Root Causes
-                root_causes = ""
-                if 'Rootcause description (from rootcause)' in filtered_record:
-                    root_causes = app.clean_display_value(filtered_record['Rootcause description (from rootcause)'])
-                elif 'fld00wYhLLvTGZkPM' in filtered_record:
-                    root_causes = app.clean_display_value(filtered_record['fld00wYhLLvTGZkPM'])
+                root_causes = detail_strings['Rootcause description (from rootcause)']
                 
                 st.text_area("Root Causes", value=root_causes, disabled=True, key="root_causes_abbyy")
                 
                 # Impact
-                impact = ""
-                if 'Impact' in filtered_record:
-                    impact = app.clean_display_value(filtered_record['Impact'])
-                elif 'fldc2ec6pUigCtOSb' in filtered_record:
-                    impact = app.clean_display_value(filtered_record['fldc2ec6pUigCtOSb'])
+                impact = detail_strings['Impact']
                 
                 st.text_area("Impact", value=impact, disabled=True, key="impact_abbyy")
             
-            # Risk Assessment section
-            st.write("### Risk Assessment")
-
-            col1, col2, col3, col4 = st.columns(4)
-
-            # Update options to match the actual format in the data
-            severity_options = ["1. High", "2. Medium", "3. Low"]
-            likelihood_options = ["1. High", "2. Medium", "3. Low"]
-            detectability_options = ["1. High", "2. Medium", "3. Low"]
-
-            # Initialize variables with None - no defaults
-            severity_level = None
-            likelihood_level = None
-            detectability_level = None
-
-            # Get actual values only - no defaults
-            # Severity
-            if 'Severity' in filtered_record:
-                severity_level = filtered_record['Severity']
-            elif 'fld195IZccUi69V5D' in filtered_record:
-                severity_level = filtered_record['fld195IZccUi69V5D']
-
-            # Likelihood
-            if 'Likelihood' in filtered_record:
-                likelihood_level = filtered_record['Likelihood']
-            elif 'fldhdlk8KsdWNqgff' in filtered_record:
-                likelihood_level = filtered_record['fldhdlk8KsdWNqgff']
-
-            # Detectability
-            if 'Detectability' in filtered_record:
-                detectability_level = filtered_record['Detectability']
-            elif 'fldfVsQ4b7qc8TAPP' in filtered_record:
-                detectability_level = filtered_record['fldfVsQ4b7qc8TAPP']
-
-            # Overall Risk Level
-            overall_risk_level = None
-            if 'Overall Risk Score' in filtered_record:
-                overall_risk_level = filtered_record['Overall Risk Score']
-            elif 'fldqLmmgCcAioHTi4' in filtered_record:
-                overall_risk_level = filtered_record['fldqLmmgCcAioHTi4']
-
-            # Store original values in session state for this risk
-            risk_id_key = f"risk_id_{record_id}"
-            if risk_id_key not in st.session_state or st.session_state[risk_id_key] != record_id:
-                # First time loading this specific risk, store original values
-                st.session_state[risk_id_key] = record_id
-                st.session_state['original_severity'] = severity_level
-                st.session_state['original_likelihood'] = likelihood_level
-                st.session_state['original_detectability'] = detectability_level
-                st.session_state['original_risk_level'] = overall_risk_level
-                
-                # Initialize flags to track if user has changed values
-                st.session_state['user_changed_values'] = False
-
-            # Initialize ABBYY response
-            if 'abbyy_response' not in st.session_state:
-                st.session_state['abbyy_response'] = "Accept"
-
-            # ABBYY's Response selection
-            abbyy_response_options = ["Accept", "Change"]
-            abbyy_response = st.radio(
-                "ABBYY's Response", 
-                options=abbyy_response_options,
-                key="abbyy_resp",
-                horizontal=True
-            )
-
-            # Store selection in session state
-            st.session_state['abbyy_response'] = abbyy_response
-
-            # Add comment box if Change is selected
-            abbyy_comment = ""
-            if abbyy_response == "Change":
-                abbyy_comment = st.text_area(
-                    "ABBYY Change Comments", 
-                    value="", 
-                    height=100,
-                    key="abbyy_comment",
-                    help="Please provide your reasoning for the proposed changes"
-                )
-
-            # Show editable fields only if "Change" is selected
-            is_editable = (abbyy_response == "Change")
-
-            # Function to track changes and update risk score
-            def on_value_change():
-                # Mark that user has changed values
-                st.session_state['user_changed_values'] = True
-                
-                # Get current dropdown values directly from session state
-                severity = st.session_state.get('severity_abbyy')
-                likelihood = st.session_state.get('likelihood_abbyy')
-                detectability = st.session_state.get('detectability_abbyy')
-                
-                # Only calculate if all values are available
-                if severity and likelihood and detectability:
-                    # Custom calculation per the specified formula
-                    # For Severity
-                    severity_value = 3 if severity == "1. High" else (2 if severity == "2. Medium" else 1)
-                    
-                    # For Likelihood
-                    likelihood_value = 3 if likelihood == "1. High" else (2 if likelihood == "2. Medium" else 1)
-                    
-                    # For Detectability (note inverse order!)
-                    detectability_value = 3 if detectability == "3. Low" else (2 if detectability == "2. Medium" else 1)
-                    
-                    # Calculate overall score
-                    overall_score = severity_value * likelihood_value * detectability_value
-                    
-                    # Determine risk level based on score
-                    if overall_score >= 27:
-                        new_level = "5. Critical"
-                    elif overall_score >= 18:
-                        new_level = "4. High"
-                    elif overall_score >= 8:
-                        new_level = "3. Moderate"
-                    elif overall_score >= 4:
-                        new_level = "2. Low"
-                    else:
-                        new_level = "1. Very Low"
-                    
-                    # Store results in session state
-                    st.session_state['new_risk_level'] = new_level
-                    st.session_state['risk_score'] = overall_score
-                    
-                    # Force a rerun to update the display
-                    st.rerun()
-
-            with col1:
-                # Severity
-                severity_index = severity_options.index(severity_level) if severity_level in severity_options else 0
-                severity_display = st.selectbox(
-                    "Severity Level", 
-                    options=severity_options, 
-                    index=severity_index,
-                    key="severity_abbyy",
-                    disabled=not is_editable,
-                    on_change=on_value_change if is_editable else None
-                )
-
-            with col2:
-                # Likelihood
-                likelihood_index = likelihood_options.index(likelihood_level) if likelihood_level in likelihood_options else 0
-                likelihood_display = st.selectbox(
-                    "Likelihood Level", 
-                    options=likelihood_options, 
-                    index=likelihood_index,
-                    key="likelihood_abbyy",
-                    disabled=not is_editable,
-                    on_change=on_value_change if is_editable else None
-                )
-
-            with col3:
-                # Detectability
-                detectability_index = detectability_options.index(detectability_level) if detectability_level in detectability_options else 0
-                detectability_display = st.selectbox(
-                    "Detectability Level", 
-                    options=detectability_options, 
-                    index=detectability_index,
-                    key="detectability_abbyy",
-                    disabled=not is_editable,
-                    on_change=on_value_change if is_editable else None
-                )
-
-            with col4:
-                # Display risk score
-                if is_editable:
-                    # Check if the user has changed any values
-                    if st.session_state.get('user_changed_values', False):
-                        # User has made changes, show the new calculated risk score
-                        new_level = st.session_state.get('new_risk_level')
-                        overall_score = st.session_state.get('risk_score')
-                        
-                        if new_level and overall_score:
-                            risk_display = f"{new_level} (Score: {overall_score})"
-                        else:
-                            # Calculate right here instead of using app.calculate_risk_level
-                            severity = st.session_state.get('severity_abbyy')
-                            likelihood = st.session_state.get('likelihood_abbyy')
-                            detectability = st.session_state.get('detectability_abbyy')
-                            
-                            if severity and likelihood and detectability:
-                                # For Severity
-                                severity_value = 3 if severity == "1. High" else (2 if severity == "2. Medium" else 1)
-                                
-                                # For Likelihood
-                                likelihood_value = 3 if likelihood == "1. High" else (2 if likelihood == "2. Medium" else 1)
-                                
-                                # For Detectability (note inverse order!)
-                                detectability_value = 3 if detectability == "3. Low" else (2 if detectability == "2. Medium" else 1)
-                                
-                                # Calculate overall score
-                                overall_score = severity_value * likelihood_value * detectability_value
-                                
-                                # Determine risk level based on score
-                                if overall_score >= 27:
-                                    new_level = "5. Critical"
-                                elif overall_score >= 18:
-                                    new_level = "4. High"
-                                elif overall_score >= 8:
-                                    new_level = "3. Moderate"
-                                elif overall_score >= 4:
-                                    new_level = "2. Low"
-                                else:
-                                    new_level = "1. Very Low"
-                                
-                                st.session_state['new_risk_level'] = new_level
-                                st.session_state['risk_score'] = overall_score
-                                risk_display = f"{new_level} (Score: {overall_score})"
-                            else:
-                                risk_display = "Incomplete data"
-                    else:
-                        # No changes yet, so show the original risk score
-                        original_risk_level = st.session_state.get('original_risk_level', "")
-                        
-                        # Format for display - same formatting function as in non-editable mode
-                        risk_display = ""
-                        if original_risk_level:
-                            try:
-                                if isinstance(original_risk_level, (int, float)) or (isinstance(original_risk_level, str) and original_risk_level.replace('.', '', 1).isdigit()):
-                                    score = float(original_risk_level)
-                                    if score >= 27:
-                                        risk_display = "5. Critical (Score: {})".format(score)
-                                    elif score >= 18:
-                                        risk_display = "4. High (Score: {})".format(score)
-                                    elif score >= 8:
-                                        risk_display = "3. Moderate (Score: {})".format(score)
-                                    elif score >= 4:
-                                        risk_display = "2. Low (Score: {})".format(score)
-                                    else:
-                                        risk_display = "1. Very Low (Score: {})".format(score)
-                                else:
-                                    risk_display = str(original_risk_level)
-                            except:
-                                risk_display = str(original_risk_level)
-                        else:
-                            risk_display = "No original risk score found"
-                    
-                    st.text_input("Overall Risk Score", 
-                                value=risk_display, 
-                                disabled=True,
-                                key="risk_score_abbyy")
-                else:
-                    # Show original risk score when not in edit mode
-                    original_risk_level = st.session_state.get('original_risk_level', "")
-                    
-                    # Format for display
-                    risk_level_display = ""
-                    if original_risk_level:
-                        try:
-                            if isinstance(original_risk_level, (int, float)) or (isinstance(original_risk_level, str) and original_risk_level.replace('.', '', 1).isdigit()):
-                                score = float(original_risk_level)
-                                if score >= 27:
-                                    risk_level_display = "5. Critical (Score: {})".format(score)
-                                elif score >= 18:
-                                    risk_level_display = "4. High (Score: {})".format(score)
-                                elif score >= 8:
-                                    risk_level_display = "3. Moderate (Score: {})".format(score)
-                                elif score >= 4:
-                                    risk_level_display = "2. Low (Score: {})".format(score)
-                                else:
-                                    risk_level_display = "1. Very Low (Score: {})".format(score)
-                            else:
-                                risk_level_display = str(original_risk_level)
-                        except:
-                            risk_level_display = str(original_risk_level)
-                    
-                    st.text_input("Overall Risk Score", 
-                                value=risk_level_display, 
-                                disabled=True,
-                                key="original_risk_score_abbyy")
+            # Handle linked record fields properly - save the Risk Type record IDs if
+            # available, else fall back to the display text
+            risk_type_value = risk_type_ids if risk_type_ids else (str(risk_type_display) if risk_type_display else "")
             
-            # Save button
-            if st.button("Save ABBYY Response"):
-                try:
-                    # Check if risk_changes_table is available
-                    if not risk_changes_table:
-                        st.error(f"Cannot access '{app.RISK_CHANGES_TABLE_NAME}' table. Please check permissions.")
-                        st.info("Make sure your API key has access to the table with ID: " + app.RISK_CHANGES_TABLE_ID)
-                        st.stop()
-                    
-                    # Only save if there's a change or user explicitly wants to save
-                    has_changes = (
-                        abbyy_response == "Change" and (
-                            severity_display != st.session_state['original_severity'] or
-                            likelihood_display != st.session_state['original_likelihood'] or
-                            detectability_display != st.session_state['original_detectability']
-                        )
-                    )
-                    
-                    if abbyy_response == "Accept" or has_changes:
-                        # Get just the risk level name (without the score part)
-                        new_risk_level = st.session_state.get('new_risk_level', "")
-                        
-                        # Format the original risk level to show just the level name
-                        original_risk_display = ""
-                        original_risk_level = st.session_state.get('original_risk_level', "")
-                        
-                        if original_risk_level:
-                            try:
-                                # If it's a numeric score, convert to level name
-                                if isinstance(original_risk_level, (int, float)) or (isinstance(original_risk_level, str) and original_risk_level.replace('.', '', 1).isdigit()):
-                                    score = float(original_risk_level)
-                                    if score >= 27:
-                                        original_risk_display = "5. Critical"
-                                    elif score >= 18:
-                                        original_risk_display = "4. High"
-                                    elif score >= 8:
-                                        original_risk_display = "3. Moderate"
-                                    elif score >= 4:
-                                        original_risk_display = "2. Low"
-                                    else:
-                                        original_risk_display = "1. Very Low"
-                                else:
-                                    # If it's already a text format, use it directly
-                                    original_risk_display = str(original_risk_level)
-                            except:
-                                original_risk_display = str(original_risk_level)
-                        
-                        # Handle linked record fields properly - get record IDs instead of display values
-                        # For Risk Type, use the record IDs if available
-                        risk_type_value = ""
-                        if risk_type_ids:
-                            # If we have record IDs, use them as an array
-                            risk_type_value = risk_type_ids
-                        else:
-                            # Fallback to display text if no IDs available
-                            risk_type_value = str(risk_type_display) if risk_type_display else ""
-                        
-                        # Create data dictionary using field IDs directly
-                        data = {
-                            "fldJwiM65ftTV4wA3": str(selected_risk_reference) if selected_risk_reference else "",  # Original Risk Reference - TEXT FIELD, use string
-                            "fldMvXyJc8zCAHJJg": str(selected_fh_personnel) if selected_fh_personnel else "",  # FH Personnel
-                            "fld6RKhK7kWfsJost": str(selected_abbyy_personnel) if selected_abbyy_personnel else "",  # ABBYY Personnel
-                            "fldfTsmdEsXG2dcAo": "Todo",  # Status
-                            "flde0fUGwJlykaRnM": str(risk_category) if risk_category else "",  # Risk Category - text field
-                            "fldYdVmw8pCKyRagq": risk_type_value,  # Risk Type - handle as linked record if IDs available
-                            "fldrpv5xlWDVnIE5d": str(risk_description) if risk_description else "",  # Risk Description
-                            "fldDmecXGLkpnK8lM": str(impact) if impact else "",  # Impact
-                            "fldcXaPheiACBgbEv": str(root_causes) if root_causes else "",  # Root Causes
-                            "fldqf7xmu3Z2EgTm0": str(components) if components else "",  # Components
-                            "fldTr9bdRevGV7zyi": str(st.session_state.get('original_severity', severity_level)),  # Original Severity Level
-                            "fldEYZSgQTr00GHf5": str(severity_display) if abbyy_response == "Change" else "",  # New Severity Level
-                            "fldUZEGlpdaMMGTC9": str(st.session_state.get('original_likelihood', likelihood_level)),  # Original Likelihood Level
-                            "fld860nkAw1DUJaro": str(likelihood_display) if abbyy_response == "Change" else "",  # New Likelihood Level
-                            "fldXO1FfoUa89lnsA": str(st.session_state.get('original_detectability', detectability_level)),  # Original Detectability Level
-                            "fld60ppjc9HEM8RPo": str(detectability_display) if abbyy_response == "Change" else "",  # New Detectability Level
-                            "fldXsSjjUWPjRftIm": original_risk_display,  # Original Overall Risk Level
-                            "fldDJXURZKKyfz8pg": new_risk_level if abbyy_response == "Change" else "",  # New Overall Risk Level
-                            "fldQ66bxR2keyBdHm": str(abbyy_response),  # ABBYY's Response
-                            "fldv1dx6ISiPTrzx4": str(abbyy_comment) if abbyy_comment else "",  # ABBYY Comments
-                        }
-                        
-                        # Ensure all values are JSON-safe (no NaN values)
-                        sanitized_data = {k: app.json_safe_value(v) for k, v in data.items()}
-                        
-                        try:
-                            # Create a record in the Risk Changes table
-                            result = risk_changes_table.create(sanitized_data)
-                            st.success("✅ ABBYY response saved successfully!")
-                            
-                            # Store the created record ID in session state for FH page to reference
-                            st.session_state[f"risk_changes_id_{record_id}"] = result['id']
-                            
-                        except Exception as e:
-                            st.error(f"Error saving response: {e}")
-                            
-                    else:
-                        st.info("No changes detected. Nothing was saved.")
-                        
-                except Exception as e:
-                    st.error(f"Unexpected error: {e}")
+            show_risk_assessment(filtered_record, {
+                'risk_reference': selected_risk_reference,
+                'fh_personnel': selected_fh_personnel,
+                'abbyy_personnel': selected_abbyy_personnel,
+                'risk_category': risk_category,
+                'risk_type': risk_type_value,
+                'risk_description': risk_description,
+                'impact': impact,
+                'root_causes': root_causes,
+                'components': components,
+            })
     else:
         st.info("Please select a valid Risk Reference to load the risk details.")
 else:
@@ -700,4 +507,6 @@ else:
         st.session_state.pop('records_df', None)
         st.session_state.pop('connected', None)
         app.load_risk_data()
-        st.rerun() 
\ No newline at end of file
+        st.rerun()
+
+app.end_rerun()
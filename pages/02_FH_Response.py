@@ -1,14 +1,15 @@
 import streamlit as st
 import pandas as pd
-import requests
 import sys
-import os
 from pathlib import Path
 
 # Add the app directory to the Python path to import common functions
 sys.path.append(str(Path(__file__).parent.parent))
 import app
 
+# Time this rerun - stages are shown in the sidebar's performance panel if it's enabled
+app.begin_rerun("FH Response")
+
 # Page title
 st.title("FH Response")
 st.subheader("Review ABBYY responses and provide feedback")
@@ -16,37 +17,108 @@ st.subheader("Review ABBYY responses and provide feedback")
 # Check if connected
 if not st.session_state.get('connected', False):
     st.info("Please connect to Airtable using the sidebar button to begin.")
+    app.end_rerun()
     st.stop()
 
+# Pick up the latest shared register snapshot
+app.load_risk_data()
+
+# Show queued/failed saves
+app.show_airtable_status()
+
 # Get tables from session state
 risk_register_table = st.session_state.get('risk_register_table')
 risk_changes_table = st.session_state.get('risk_changes_table')
-records_df = st.session_state.get('records_df')
+# The FH page has no filters - in "filtered" load mode this fetches every risk, but only
+# the fields the pages show
+records_df = app.load_filtered_risk_data({})
 
 # Create lists for dropdowns
 if records_df is not None and not records_df.empty:
-    # Risk references - use whatever field has data
-    risk_references = []
-    
-    # Try common fields for risk references
-    for field in ['fldvQEaSVFnK3tmAo', 'Risk reference', 'Risk Reference']:
-        if field in records_df.columns:
-            risk_refs = records_df[field].dropna().tolist()
-            if risk_refs:
-                risk_references = [str(ref) for ref in risk_refs if ref is not None]
-                break
-    
-    if not risk_references:
-        # Fallback to record IDs if no references found
-        risk_references = records_df['record_id'].tolist()
+    # Risk references - use whatever field has data (falls back to record IDs)
+    risk_references = app.get_risk_references(records_df)
     
     # Create mock data for FH and ABBYY Personnel (replace this with actual data retrieval)
     fh_personnel = ["FH Person 1", "FH Person 2", "FH Person 3"]
     abbyy_personnel = ["ABBYY Person 1", "ABBYY Person 2", "ABBYY Person 3"]
     
+    # Review mode - bulk mode signs off every risk ABBYY accepted in one go
+    review_mode = st.radio(
+        "Review Mode",
+        options=["Single risk", "Bulk sign-off"],
+        horizontal=True,
+        key="review_mode_fh"
+    )
+    
+    if review_mode == "Bulk sign-off":
+        st.write("### Bulk FH Sign-off")
+        
+        # Check if risk_changes_table is available
+        if not risk_changes_table:
+            st.error(f"Cannot access '{app.RISK_CHANGES_TABLE_NAME}' table. Please check permissions.")
+            app.end_rerun()
+            st.stop()
+        
+        # Risks ABBYY accepted that are still waiting for an FH response (sign-offs
+        # still being sent to Airtable already count as responses)
+        signoff_queue = app.get_fh_signoff_queue(risk_changes_table)
+        st.info(f"{len(signoff_queue)} accepted risk(s) waiting for FH sign-off.")
+        
+        if not signoff_queue:
+            app.end_rerun()
+            st.stop()
+        
+        select_all = st.checkbox("Select all", key="fh_bulk_select_all")
+        
+        # Notes entered here are used for every selected row that has no notes of its own
+        bulk_notes = st.text_area("Change Notes for all selected risks", key="fh_bulk_notes",
+                                  help="Used for selected risks without their own Change Notes")
+        
+        signoff_df = app.build_fh_signoff_table(signoff_queue, selected=select_all)
+        edited_df = st.data_editor(
+            signoff_df,
+            column_config={
+                "Sign Off": st.column_config.CheckboxColumn("Sign Off"),
+                "Change Notes": st.column_config.TextColumn("Change Notes"),
+            },
+            disabled=[column for column in signoff_df.columns if column not in ("Sign Off", "Change Notes")],
+            hide_index=True,
+            key=f"fh_signoff_{hash(tuple(signoff_df.index))}_{select_all}"
+        )
+        selected_rows = edited_df[edited_df['Sign Off']]
+        
+        if st.button(f"Sign off {len(selected_rows)} selected risk(s)", disabled=selected_rows.empty or app.is_read_only()):
+            try:
+                # Queue one update per risk - the outbox sends them as batch updates of 10
+                updates = [
+                    (record_id, {
+                        "fldj5ERls7Jsaq21H": "Accept",  # FH Response
+                        "fldmpEa117ZHBlJAN": row['Change Notes'] or bulk_notes,  # Change Notes
+                        "fldfTsmdEsXG2dcAo": "Todo"  # Status
+                    })
+                    for record_id, row in selected_rows.iterrows()
+                ]
+                app.queue_risk_change_updates(updates)
+                st.success(f"Signed off {len(updates)} risk(s)! The responses will be sent to Airtable in the background.")
+            except Exception as e:
+                st.error(f"Error saving FH responses: {e}")
+        
+        app.end_rerun()
+        st.stop()
+    
     # Display form for selecting risk
     st.write("### Risk Selection")
     
+    # Free-text search narrows the risk references, best match first
+    search_query = st.text_input(
+        "Search risks",
+        key="search_fh",
+        placeholder="e.g. data retention (words can be partial)"
+    )
+    if search_query.strip():
+        risk_references = app.get_risk_references(records_df, app.search_risks(records_df, search_query))
+        st.caption(f"{len(risk_references)} risk(s) match your search.")
+    
     # Three dropdowns for selection
     col1, col2, col3 = st.columns(3)
     
@@ -66,26 +138,28 @@ if records_df is not None and not records_df.empty:
         # Extract record ID
         record_id = filtered_record.get('record_id')
         
-        # Get risk type display
-        risk_types_dict = st.session_state.get('risk_types_dict', {})
-        risk_type_display, risk_type_ids = app.get_risk_type_display(filtered_record, risk_types_dict)
+        # Display strings of the detail fields, precomputed for the whole snapshot
+        detail_strings = app.get_risk_display(records_df, selected_risk_reference)
+        
+        # Risk Type names and linked IDs, resolved for the whole snapshot when it was built
+        risk_type_display, risk_type_ids = detail_strings['risk_type'], detail_strings['risk_type_ids']
         
         # Get ABBYY response from risk changes table
         risk_changes_record = app.get_risk_changes_record(risk_changes_table, selected_risk_reference)
         
         if not risk_changes_record:
             st.warning("No ABBYY response found for this risk reference. Please have ABBYY submit their response first.")
+            app.end_rerun()
             st.stop()
         
+        if risk_changes_record.get('pending'):
+            st.caption("This response is still being sent to Airtable.")
+        
         # Extract fields from risk changes record
         abbyy_record_fields = risk_changes_record.get('fields', {})
         
         # Get ABBYY's response
-        abbyy_response = ""
-        if 'ABBYY\'s Response' in abbyy_record_fields:
-            abbyy_response = abbyy_record_fields['ABBYY\'s Response']
-        elif 'fldQ66bxR2keyBdHm' in abbyy_record_fields:
-            abbyy_response = abbyy_record_fields['fldQ66bxR2keyBdHm']
+        abbyy_response = abbyy_record_fields.get("ABBYY's Response") or ""
         
         # Display risk details (uneditable)
         st.write("### Risk Details")
@@ -97,48 +171,28 @@ if records_df is not None and not records_df.empty:
             st.text_input("Risk Type", value=risk_type_display, disabled=True, key="risk_type_fh")
             
             # Risk Category
-            risk_category = ""
-            if 'Risk category (from Risk types)' in filtered_record:
-                risk_category = app.clean_display_value(filtered_record['Risk category (from Risk types)'])
-            elif 'fldARoA6U91O9wKiZ' in filtered_record:
-                risk_category = app.clean_display_value(filtered_record['fldARoA6U91O9wKiZ'])
+            risk_category = detail_strings['Risk category (from Risk types)']
             
             st.text_input("Risk Category", value=risk_category, disabled=True, key="risk_category_fh")
             
             # Components
-            components = ""
-            if 'Component (Where will the risk occur)' in filtered_record:
-                components = app.clean_display_value(filtered_record['Component (Where will the risk occur)'])
-            elif 'fldlCW5th0RdZg1in' in filtered_record:
-                components = app.clean_display_value(filtered_record['fldlCW5th0RdZg1in'])
+            components = detail_strings['Component (Where will the risk occur)']
             
             st.text_area("Components", value=components, disabled=True, key="components_fh")
         
         with col2:
             # Risk Description
-            risk_description = ""
-            if 'Risk description' in filtered_record:
-                risk_description = app.clean_display_value(filtered_record['Risk description'])
-            elif 'fldqKOmtleXVuuhKE' in filtered_record:
-                risk_description = app.clean_display_value(filtered_record['fldqKOmtleXVuuhKE'])
+            risk_description = detail_strings['Risk description']
             
             st.text_area("Risk Description", value=risk_description, disabled=True, key="risk_description_fh")
             
             # Root Causes
-            root_causes = ""
-            if 'Rootcause description (from rootcause)' in filtered_record:
-                root_causes = app.clean_display_value(filtered_record['Rootcause description (from rootcause)'])
-            elif 'fld00wYhLLvTGZkPM' in filtered_record:
-                root_causes = app.clean_display_value(filtered_record['fld00wYhLLvTGZkPM'])
+            root_causes = detail_strings['Rootcause description (from rootcause)']
             
             st.text_area("Root Causes", value=root_causes, disabled=True, key="root_causes_fh")
             
             # Impact
-            impact = ""
-            if 'Impact' in filtered_record:
-                impact = app.clean_display_value(filtered_record['Impact'])
-            elif 'fldc2ec6pUigCtOSb' in filtered_record:
-                impact = app.clean_display_value(filtered_record['fldc2ec6pUigCtOSb'])
+            impact = detail_strings['Impact']
             
             st.text_area("Impact", value=impact, disabled=True, key="impact_fh")
         
@@ -149,11 +203,7 @@ if records_df is not None and not records_df.empty:
         st.info(f"ABBYY's Response: **{abbyy_response}**")
         
         # Get ABBYY's comments
-        abbyy_comments = ""
-        if 'ABBYY Comment' in abbyy_record_fields:
-            abbyy_comments = abbyy_record_fields['ABBYY Comment']
-        elif 'fldv1dx6ISiPTrzx4' in abbyy_record_fields:
-            abbyy_comments = abbyy_record_fields['fldv1dx6ISiPTrzx4']
+        abbyy_comments = abbyy_record_fields.get('ABBYY Comment') or ""
         
         # Display ABBYY's comments if they exist
         if abbyy_comments:
@@ -165,60 +215,24 @@ if records_df is not None and not records_df.empty:
             st.write("#### Changes Made By ABBYY")
             
             # Get original and new values
-            original_severity = ""
-            if 'Original Severity Level' in abbyy_record_fields:
-                original_severity = abbyy_record_fields['Original Severity Level']
-            elif 'fldTr9bdRevGV7zyi' in abbyy_record_fields:
-                original_severity = abbyy_record_fields['fldTr9bdRevGV7zyi']
+            original_severity = abbyy_record_fields.get('Original Severity Level') or ""
             
-            new_severity = ""
-            if 'New Severity Level' in abbyy_record_fields:
-                new_severity = abbyy_record_fields['New Severity Level']
-            elif 'fldEYZSgQTr00GHf5' in abbyy_record_fields:
-                new_severity = abbyy_record_fields['fldEYZSgQTr00GHf5']
+            new_severity = abbyy_record_fields.get('New Severity Level') or ""
             
-            original_likelihood = ""
-            if 'Original Likelihood Level' in abbyy_record_fields:
-                original_likelihood = abbyy_record_fields['Original Likelihood Level']
-            elif 'fldUZEGlpdaMMGTC9' in abbyy_record_fields:
-                original_likelihood = abbyy_record_fields['fldUZEGlpdaMMGTC9']
+            original_likelihood = abbyy_record_fields.get('Original Likelihood Level') or ""
             
-            new_likelihood = ""
-            if 'New Likelihood Level' in abbyy_record_fields:
-                new_likelihood = abbyy_record_fields['New Likelihood Level']
-            elif 'fld860nkAw1DUJaro' in abbyy_record_fields:
-                new_likelihood = abbyy_record_fields['fld860nkAw1DUJaro']
+            new_likelihood = abbyy_record_fields.get('New Likelihood Level') or ""
             
-            original_detectability = ""
-            if 'Original Detectability Level' in abbyy_record_fields:
-                original_detectability = abbyy_record_fields['Original Detectability Level']
-            elif 'fldXO1FfoUa89lnsA' in abbyy_record_fields:
-                original_detectability = abbyy_record_fields['fldXO1FfoUa89lnsA']
+            original_detectability = abbyy_record_fields.get('Original Detectability Level') or ""
             
-            new_detectability = ""
-            if 'New Detectability Level' in abbyy_record_fields:
-                new_detectability = abbyy_record_fields['New Detectability Level']
-            elif 'fld60ppjc9HEM8RPo' in abbyy_record_fields:
-                new_detectability = abbyy_record_fields['fld60ppjc9HEM8RPo']
+            new_detectability = abbyy_record_fields.get('New Detectability Level') or ""
             
-            original_risk_level = ""
-            if 'Original Overall Risk Level' in abbyy_record_fields:
-                original_risk_level = abbyy_record_fields['Original Overall Risk Level']
-            elif 'fldXsSjjUWPjRftIm' in abbyy_record_fields:
-                original_risk_level = abbyy_record_fields['fldXsSjjUWPjRftIm']
+            original_risk_level = abbyy_record_fields.get('Original Overall Risk Level') or ""
             
-            new_risk_level = ""
-            if 'New Overall Risk Level' in abbyy_record_fields:
-                new_risk_level = abbyy_record_fields['New Overall Risk Level']
-            elif 'fldDJXURZKKyfz8pg' in abbyy_record_fields:
-                new_risk_level = abbyy_record_fields['fldDJXURZKKyfz8pg']
+            new_risk_level = abbyy_record_fields.get('New Overall Risk Level') or ""
             
             # Get risk score if available
-            risk_score = ""
-            if 'Risk Score' in abbyy_record_fields:
-                risk_score = abbyy_record_fields['Risk Score']
-            elif 'fldP1TiJw5FWkrQn0' in abbyy_record_fields:
-                risk_score = abbyy_record_fields['fldP1TiJw5FWkrQn0']
+            risk_score = abbyy_record_fields.get('Risk Score') or ""
             
             # Display the changes in a table
             changes_data = {
@@ -257,11 +271,12 @@ if records_df is not None and not records_df.empty:
                                    help="Add any additional notes about this risk assessment")
         
         # Save button
-        if st.button("Save FH Response"):
+        if st.button("Save FH Response", disabled=app.is_read_only()):
             try:
                 # Check if risk_changes_table is available
                 if not risk_changes_table:
                     st.error(f"Cannot access '{app.RISK_CHANGES_TABLE_NAME}' table. Please check permissions.")
+                    app.end_rerun()
                     st.stop()
                 
                 # Get the record ID from the risk changes record
@@ -274,52 +289,16 @@ if records_df is not None and not records_df.empty:
                     "fldfTsmdEsXG2dcAo": "Todo"  # Status
                 }
                 
-                try:
-                    # Update the existing record in the Risk Changes table
-                    result = risk_changes_table.update(record_id_to_update, update_data)
-                    st.success("FH response saved successfully!")
-                except Exception as field_id_error:
-                    st.error(f"Error updating with field IDs: {field_id_error}")
-                    st.info("Trying alternative method with field names...")
-                    
-                    # Try with field names instead
-                    try:
-                        update_data_by_name = {
-                            "FH Response": fh_response,
-                            "Change Notes": change_notes,
-                            "Status": "Todo"
-                        }
-                        
-                        result = risk_changes_table.update(record_id_to_update, update_data_by_name)
-                        st.success("FH response saved successfully with field names!")
-                    except Exception as name_error:
-                        st.error(f"Error updating with field names: {name_error}")
-                        
-                        # Try direct API call as last resort
-                        try:
-                            api_response = requests.patch(
-                                f"https://api.airtable.com/v0/{app.BASE_ID}/{app.RISK_CHANGES_TABLE_ID}/{record_id_to_update}",
-                                headers={
-                                    "Authorization": f"Bearer {app.AIRTABLE_API_KEY}",
-                                    "Content-Type": "application/json"
-                                },
-                                json={
-                                    "fields": update_data
-                                }
-                            )
-                            
-                            if api_response.status_code in [200, 201]:
-                                st.success("Successfully saved using direct API call!")
-                            else:
-                                st.error(f"API error: {api_response.status_code}")
-                                if app.show_debug:
-                                    st.write(api_response.json())
-                        except Exception as api_error:
-                            st.error(f"Direct API call failed: {api_error}")
+                # Queue the update for the Risk Changes table - the outbox sends it in the
+                # background and retries it if Airtable is unavailable or rate limiting
+                app.queue_risk_change_update(record_id_to_update, update_data)
+                st.success("FH response saved successfully! It will be sent to Airtable in the background.")
             except Exception as e:
                 st.error(f"Error saving FH response: {e}")
                 st.info("Please check your Airtable configuration.")
     else:
         st.info("Please select a valid Risk Reference to load the risk details.")
 else:
-    st.warning("No records found in Risk Register table.") 
\ No newline at end of file
+    st.warning("No records found in Risk Register table.")
+
+app.end_rerun()
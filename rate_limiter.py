@@ -0,0 +1,154 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+# Process-wide rate limiting for Airtable requests.
+#
+# Airtable allows 5 requests per second per base and answers with 429 (and a 30 second
+# penalty) when that is exceeded. Every session shares one token bucket per base, so
+# requests queue up briefly instead of failing. A 429 pauses the whole bucket for the
+# Retry-After time (or a jittered exponential backoff when there is no header).
+
+REQUESTS_PER_SECOND = 5.0
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+
+_lock = threading.Lock()
+_buckets = {}
+_stats = {
+    'queue_depth': 0,
+    'requests': 0,
+    'throttled': 0,
+    'retries': 0,
+    'total_wait': 0.0,
+    'max_wait': 0.0,
+    'last_wait': 0.0,
+}
+
+
+def configure(requests_per_second=None, max_retries=None):
+    """Change the request rate per base and the number of 429 retries"""
+    global REQUESTS_PER_SECOND, MAX_RETRIES
+    if requests_per_second:
+        REQUESTS_PER_SECOND = float(requests_per_second)
+    if max_retries is not None:
+        MAX_RETRIES = int(max_retries)
+
+
+def get_bucket(base_id, now):
+    """Token bucket for a base, refilled for the time since it was last used (call with _lock held)"""
+    bucket = _buckets.setdefault(base_id, {'tokens': REQUESTS_PER_SECOND, 'updated': now, 'paused_until': 0.0})
+    bucket['tokens'] = min(REQUESTS_PER_SECOND, bucket['tokens'] + (now - bucket['updated']) * REQUESTS_PER_SECOND)
+    bucket['updated'] = now
+    return bucket
+
+
+def acquire(base_id):
+    """Block until a request to base_id is allowed; returns the seconds spent waiting"""
+    started = time.monotonic()
+    with _lock:
+        _stats['queue_depth'] += 1
+    try:
+        while True:
+            with _lock:
+                now = time.monotonic()
+                bucket = get_bucket(base_id, now)
+                if now >= bucket['paused_until'] and bucket['tokens'] >= 1:
+                    bucket['tokens'] -= 1
+                    break
+                delay = max(bucket['paused_until'] - now, (1 - bucket['tokens']) / REQUESTS_PER_SECOND)
+            time.sleep(delay)
+    finally:
+        waited = time.monotonic() - started
+        with _lock:
+            _stats['queue_depth'] -= 1
+            _stats['requests'] += 1
+            _stats['total_wait'] += waited
+            _stats['max_wait'] = max(_stats['max_wait'], waited)
+            _stats['last_wait'] = waited
+    return waited
+
+
+def pause(base_id, seconds):
+    """Hold every request to base_id for the given number of seconds"""
+    with _lock:
+        bucket = get_bucket(base_id, time.monotonic())
+        bucket['paused_until'] = max(bucket['paused_until'], time.monotonic() + seconds)
+        bucket['tokens'] = 0
+
+
+def retry_delay(response, attempt):
+    """Seconds to wait before retrying a 429 - Retry-After if given, else jittered exponential backoff"""
+    retry_after = response.headers.get('Retry-After')
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+def base_id_for(url):
+    """Airtable base ID from a request URL (/v0/{base_id}/{table}/...)"""
+    parts = urlparse(url).path.strip('/').split('/')
+    return parts[1] if len(parts) > 1 else ''
+
+
+def get_stats():
+    """Limiter counters: queue_depth (requests waiting now), requests, throttled (429s), retries and wait times"""
+    with _lock:
+        stats = dict(_stats)
+    stats['avg_wait'] = stats['total_wait'] / stats['requests'] if stats['requests'] else 0.0
+    return stats
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """Transport adapter that sends every request through the shared limiter and retries 429s"""
+
+    def send(self, request, **kwargs):
+        base_id = base_id_for(request.url)
+        attempt = 0
+        while True:
+            acquire(base_id)
+            started = time.perf_counter()
+            try:
+                response = super().send(request, **kwargs)
+            except Exception:
+                metrics.record_request(request.method, request.url, 'error', time.perf_counter() - started)
+                raise
+            metrics.record_request(request.method, request.url, response.status_code, time.perf_counter() - started)
+            if response.status_code != 429:
+                return response
+
+            with _lock:
+                _stats['throttled'] += 1
+            if attempt >= MAX_RETRIES:
+                return response
+
+            pause(base_id, retry_delay(response, attempt))
+            response.close()
+            attempt += 1
+            with _lock:
+                _stats['retries'] += 1
+
+
+def install(session, pool_size=10):
+    """Route all Airtable traffic of a requests Session through the shared limiter
+
+    pool_size is the number of keep-alive connections kept open for reuse.
+    """
+    adapter = RateLimitedAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    # Plain HTTP is only used by local stand-ins for Airtable (see benchmarks/)
+    session.mount("http://", adapter)
+    return session
@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+
+# Risk scoring shared by the ABBYY form, app.calculate_risk_level and
+# app.format_risk_level.
+#
+# Overall score = severity x likelihood x detectability, each valued 1-3, and the
+# score maps onto the five Overall Risk Levels used in Airtable.
+
+SEVERITY_VALUES = {'High': 3, 'Medium': 2, 'Low': 1}
+LIKELIHOOD_VALUES = {'High': 3, 'Medium': 2, 'Low': 1}
+# Detectability is inverted - a risk that is hard to detect scores higher
+DETECTABILITY_VALUES = {'High': 1, 'Medium': 2, 'Low': 3}
+
+# Lowest score of each level above "1. Very Low"
+LEVEL_THRESHOLDS = np.array([4, 8, 18, 27])
+RISK_LEVELS = np.array(["1. Very Low", "2. Low", "3. Moderate", "4. High", "5. Critical"], dtype=object)
+
+
+def strip_level_prefix(label):
+    """Turn option labels like "1. High" into the bare level name ("High")"""
+    label = str(label).strip()
+    number, dot, name = label.partition('. ')
+    return name if dot and number.isdigit() else label
+
+
+def level_values(labels, values):
+    """Vectorized label -> 1-3 value lookup (NaN where the label is missing)
+
+    Each distinct label is looked up once and the result is broadcast back over the
+    column with numpy, so scoring the whole register is a handful of array operations.
+    Unrecognised labels count as 1, like the original if/else chains.
+    """
+    labels = pd.Series(labels, dtype=object)
+    try:
+        codes, uniques = pd.factorize(labels)
+    except TypeError:
+        # Lookup fields can come back as lists, which aren't hashable
+        codes, uniques = pd.factorize(labels.where(labels.isna(), labels.astype(str)))
+
+    # The extra trailing NaN is picked up by factorize's -1 code for missing labels
+    lookup = np.array([values.get(strip_level_prefix(label), 1) for label in uniques] + [np.nan], dtype=float)
+    return lookup[codes]
+
+
+def score_to_level(scores):
+    """Vectorized score -> Overall Risk Level (None where the score is missing)"""
+    scores = np.asarray(scores, dtype=float)
+    levels = RISK_LEVELS[np.searchsorted(LEVEL_THRESHOLDS, np.nan_to_num(scores), side='right')]
+    levels[np.isnan(scores)] = None
+    return levels
+
+
+def score_risks(severity, likelihood, detectability):
+    """Score whole columns of severity/likelihood/detectability labels in one pass
+
+    Returns (scores, levels) arrays; rows with any missing label get NaN/None.
+    """
+    scores = (
+        level_values(severity, SEVERITY_VALUES)
+        * level_values(likelihood, LIKELIHOOD_VALUES)
+        * level_values(detectability, DETECTABILITY_VALUES)
+    )
+    return scores, score_to_level(scores)
+
+
+def score_risk(severity, likelihood, detectability):
+    """Score a single risk from the form - returns (level, score) or (None, None) if a value is missing"""
+    if not (severity and likelihood and detectability):
+        return None, None
+    scores, levels = score_risks([severity], [likelihood], [detectability])
+    return levels[0], int(scores[0])
+
+
+def parse_score(value):
+    """Return a numeric Overall Risk Score as a float, or None if the value isn't a number"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return None if value != value else float(value)
+    if isinstance(value, str) and value.replace('.', '', 1).isdigit():
+        return float(value)
+    return None
+
+
+def format_risk_level(value, with_score=True):
+    """Format a stored Overall Risk Score/Level for display
+
+    Numeric scores become their level name (optionally followed by the score);
+    text values are shown as they are.
+    """
+    if value is None or (isinstance(value, float) and value != value) or value == "":
+        return ""
+    score = parse_score(value)
+    if score is None:
+        return str(value)
+    level = score_to_level([score])[0]
+    return f"{level} (Score: {score})" if with_score else level
@@ -0,0 +1,1369 @@
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+import disk_snapshot
+import events
+import field_schema
+import search_index
+
+# Process-wide Risk Register snapshot shared by every browser session.
+# Streamlit re-executes app.py as __main__ on each rerun, so anything that has to
+# outlive a rerun (and be shared between sessions) lives in this regular module.
+#
+# A snapshot is a plain dict that is never modified once published: refreshes build
+# a new dict and swap it in, so sessions can safely keep a reference to the old one.
+
+# Tables are fetched concurrently on this pool (only leaf fetches are submitted to it,
+# so a task never waits for another task on the same pool)
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="airtable-load")
+
+_lock = threading.Lock()
+_snapshot = None
+_version = 0
+# Incremented whenever a streaming load starts or the snapshot is dropped, so an
+# abandoned load never publishes over a newer snapshot
+_stream_generation = 0
+# Size of the last complete register, used as the expected total while streaming
+_expected_count = None
+# The on-disk copy is only used for the first load of the process and when Airtable
+# can't be reached - a later invalidate_snapshot() always re-fetches from Airtable
+_cold_start = True
+
+# Field requested by the ID-only reconciliation pass - Risk reference, so the
+# response stays tiny (Airtable always returns the record id alongside it)
+RECONCILE_FIELD = 'fldvQEaSVFnK3tmAo'
+
+# Full loads fetch the register in pages of this many records (Airtable's maximum)
+PAGE_SIZE = 100
+
+# While the register streams in, a bigger partial snapshot is published at most this
+# often (in seconds) - each one rebuilds the DataFrame and its lookup indexes
+STREAM_PUBLISH_INTERVAL = 2.0
+
+# After a failed sync a snapshot with live data keeps being served (saves stay enabled)
+# and the sync is tried again this many seconds later
+SYNC_RETRY_INTERVAL = 30
+
+# Delta syncs ask for records modified a little before the previous sync started,
+# so edits made while that sync was running (or small clock skew) aren't missed.
+# Merging is keyed by record_id, so seeing a record twice is harmless.
+WATERMARK_OVERLAP = timedelta(seconds=60)
+
+# Column holding the risk reference (records_df is normalized to canonical column names)
+REFERENCE_FIELD = field_schema.column('risk_reference')
+
+# Filter facets on the ABBYY page: facet name -> (column, whether plain strings hold
+# comma-separated values like "Product, Legal")
+FACET_FIELDS = {
+    'responsible': (field_schema.column('responsible'), True),
+    'risk_level': (field_schema.column('overall_risk_level'), False),
+    'ai_system': (field_schema.column('ai_system'), False),
+}
+
+# Columns kept in the register DataFrame - everything else Airtable returns (long lookup
+# arrays and fields no page shows) is dropped when the frame is built
+REGISTER_COLUMNS = field_schema.columns() + ['record_id']
+
+# Low-cardinality columns stored as pandas categoricals
+CATEGORY_FIELDS = [
+    field_schema.column(field)
+    for field in ['severity', 'likelihood', 'detectability', 'overall_risk_level', 'responsible', 'ai_system']
+]
+
+# Columns shown as text on the pages - their display strings are computed once per
+# snapshot (see build_display_strings)
+DISPLAY_FIELDS = [
+    field_schema.column(field)
+    for field in ['process', 'sub_process', 'activity', 'risk_category', 'components', 'risk_description',
+                  'root_causes', 'impact', 'overall_risk_level']
+]
+
+# Derived indexes per register DataFrame: {id(records_df): {index name: index}}.
+# Entries are dropped when their DataFrame is garbage collected.
+_frame_indexes = {}
+
+
+def share_value(value, shared):
+    """Interned version of a cell value - equal strings and string lists share one object
+
+    Safe because snapshots are never modified in place.
+    """
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, list) and all(isinstance(item, str) for item in value):
+        key = tuple(value)
+        if key not in shared:
+            shared[key] = [sys.intern(item) for item in value]
+        return shared[key]
+    return value
+
+
+def to_category(values):
+    """Store a column as a categorical (multi-select lists become "A, B" strings first)"""
+    values = values.map(lambda value: ", ".join(map(str, value)) if isinstance(value, list) else value)
+    try:
+        return values.astype('category')
+    except TypeError:
+        # Values that can't be categories (e.g. linked record objects) stay as they are
+        return values
+
+
+def compact_records_df(records_df):
+    """Keep only the REGISTER_COLUMNS, as categoricals or interned values
+
+    Repeated labels (levels, responsible parties, AI systems, lookup lists) are stored
+    once per snapshot instead of once per row.
+    """
+    shared = {}
+    compact = {}
+    for column in REGISTER_COLUMNS:
+        if column not in records_df.columns:
+            continue
+        values = records_df[column]
+        if column in CATEGORY_FIELDS:
+            if not isinstance(values.dtype, pd.CategoricalDtype):
+                values = to_category(values)
+        elif values.dtype == object and column != 'record_id':
+            values = values.map(lambda value: share_value(value, shared))
+        compact[column] = values
+    return pd.DataFrame(compact, index=records_df.index)
+
+
+def build_records_df(records):
+    """Convert Airtable records into the compact register DataFrame, with canonical column names"""
+    if not records:
+        # Keep the record_id column so merges and indexes work on an empty register
+        return pd.DataFrame(columns=['record_id'])
+    return compact_records_df(field_schema.normalize_frame(
+        pd.DataFrame([{**record['fields'], 'record_id': record['id']} for record in records])
+    ))
+
+
+def get_frame_index(records_df, name, builder):
+    """Return a derived index for records_df, building it with builder(records_df) on first use"""
+    frame_key = id(records_df)
+    indexes = _frame_indexes.get(frame_key)
+    if indexes is None:
+        indexes = _frame_indexes[frame_key] = {}
+        weakref.finalize(records_df, _frame_indexes.pop, frame_key, None)
+    if name not in indexes:
+        indexes[name] = builder(records_df)
+    return indexes[name]
+
+
+def build_ref_index(records_df):
+    """Map risk references and record IDs (as strings) to row positions
+
+    The first row wins when a value repeats, matching the old column scan.
+    """
+    ref_index = {}
+    for field in [REFERENCE_FIELD, 'record_id']:
+        if field in records_df.columns:
+            for position, value in enumerate(records_df[field].tolist()):
+                if value is not None and not (isinstance(value, float) and value != value):
+                    ref_index.setdefault(str(value), position)
+    return ref_index
+
+
+def get_ref_index(records_df):
+    """Return the risk reference index for records_df (built once per snapshot)"""
+    return get_frame_index(records_df, 'ref_index', build_ref_index)
+
+
+def is_missing(value):
+    """Check for None/NaN cell values"""
+    return value is None or (isinstance(value, float) and value != value)
+
+
+def normalize_facet_values(value, split=False):
+    """Turn a cell into a list of clean facet values (handles lists and strings like '["Product"]')"""
+    if isinstance(value, list):
+        items = value
+    elif isinstance(value, str):
+        if split or value.startswith('['):
+            cleaned = value.replace('[', '').replace(']', '').replace('"', '').replace("'", "")
+            items = cleaned.split(',')
+        else:
+            items = [value]
+    elif is_missing(value):
+        items = []
+    else:
+        items = [value]
+    return [str(item).strip() for item in items if item is not None and str(item).strip()]
+
+
+def build_facet_index(records_df):
+    """Index each filter facet as {facet: {'column': name, 'values': {value: set of row positions}}}"""
+    facet_index = {}
+    for facet, (column, split) in FACET_FIELDS.items():
+        if column not in records_df.columns:
+            continue
+        values = {}
+        for position, cell in enumerate(records_df[column].tolist()):
+            for item in normalize_facet_values(cell, split):
+                values.setdefault(item, set()).add(position)
+        facet_index[facet] = {'column': column, 'values': values}
+    return facet_index
+
+
+def get_facet_index(records_df):
+    """Return the filter facet index for records_df (built once per snapshot)"""
+    return get_frame_index(records_df, 'facet_index', build_facet_index)
+
+
+def match_facet(facet_values, selected_values):
+    """Row positions whose facet holds any of the selected values
+
+    Falls back to case-insensitive substring matches on the facet values when
+    nothing matches exactly, like the old str.contains filters did.
+    """
+    positions = set()
+    for value in selected_values:
+        positions |= facet_values.get(value, set())
+
+    if not positions:
+        for facet_value, rows in facet_values.items():
+            if any(value.lower() in facet_value.lower() for value in selected_values):
+                positions |= rows
+    return positions
+
+
+def filter_positions(records_df, selections):
+    """Sorted row positions matching every selected facet ({facet: [values]}; empty facets are ignored)"""
+    facet_index = get_facet_index(records_df)
+    matched = None
+    for facet, selected_values in selections.items():
+        if not selected_values or facet not in facet_index:
+            continue
+        positions = match_facet(facet_index[facet]['values'], selected_values)
+        matched = positions if matched is None else matched & positions
+
+    if matched is None:
+        return list(range(len(records_df)))
+    return sorted(matched)
+
+
+def get_risk_references(records_df, positions=None):
+    """Risk references (as strings) for the given row positions, falling back to record IDs"""
+    if REFERENCE_FIELD in records_df.columns:
+        column = records_df[REFERENCE_FIELD] if positions is None else records_df[REFERENCE_FIELD].iloc[positions]
+        risk_refs = column.dropna().tolist()
+        if risk_refs:
+            return [str(ref) for ref in risk_refs]
+
+    column = records_df['record_id'] if positions is None else records_df['record_id'].iloc[positions]
+    return column.tolist()
+
+
+def join_display_items(value):
+    """Join a list the way app.clean_display_value() does (the result is cleaned afterwards)"""
+    return ", ".join(
+        join_display_items(item) if isinstance(item, list) else str(item) for item in value if item is not None
+    )
+
+
+def display_strings(values):
+    """Cleaned display strings of a column as an object array - "" for missing cells
+
+    Gives the same strings as app.clean_display_value() on each cell: lists are joined
+    with ", ", then brackets and single quotes are removed in one vectorized replace.
+    Categoricals are cleaned once per category.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        categories = display_strings(pd.Series(values.cat.categories, dtype=object))
+        codes = values.cat.codes.to_numpy()
+        return np.where(codes >= 0, categories[codes], "").astype(object)
+
+    # Lists are interned per snapshot (see share_value), so each distinct one is joined once
+    joined = {}
+    text = pd.Series([
+        value if type(value) is str
+        else "" if is_missing(value)
+        else joined.setdefault(id(value), join_display_items(value)) if isinstance(value, list)
+        else str(value)
+        for value in values.tolist()
+    ], dtype="string")
+    return text.str.replace(r"[\[\]']", "", regex=True).to_numpy(dtype=object)
+
+
+def build_display_strings(records_df):
+    """Display strings of the DISPLAY_FIELDS as {column: object array aligned with records_df}"""
+    return {
+        column: display_strings(records_df[column])
+        for column in DISPLAY_FIELDS if column in records_df.columns
+    }
+
+
+def get_display_strings(records_df):
+    """Return the display strings for records_df (built once per snapshot)"""
+    return get_frame_index(records_df, 'display_strings', build_display_strings)
+
+
+def get_display_record(records_df, position, risk_types_dict=None):
+    """{column: display string} of one row - "" for columns the register doesn't have
+
+    With risk_types_dict, the row's resolved Risk Type is included as 'risk_type' (its
+    name) and 'risk_type_ids' (its linked record IDs).
+    """
+    display = get_display_strings(records_df)
+    record = {column: display[column][position] if column in display else "" for column in DISPLAY_FIELDS}
+    if risk_types_dict is not None:
+        risk_types = get_risk_types(records_df, risk_types_dict)
+        record['risk_type'] = risk_types['display'][position]
+        record['risk_type_ids'] = risk_types['ids'][position]
+    return record
+
+
+def risk_type_ids(value):
+    """Linked Risk Types record IDs of a 'Risk types' cell (linked record dicts, ID strings or one ID)"""
+    if isinstance(value, list) and value:
+        if isinstance(value[0], dict) and 'id' in value[0]:
+            return [item['id'] for item in value]
+        if isinstance(value[0], str):
+            return value
+    elif isinstance(value, str):
+        return [value]
+    return []
+
+
+def build_risk_types(records_df, risk_types_dict):
+    """Resolve every risk's Risk Type in one pass
+
+    Returns {'risk_types_dict': the dict used, 'display': names, 'ids': linked ID lists},
+    the last two as object arrays aligned with records_df. The linked IDs are joined
+    against risk_types_dict (unknown ones show as "Type ID: ..."); risks without them
+    fall back to the risk category, "Risk type", the AI system, and finally "Type IDs: ..."
+    or "Unknown Risk Type". Repeated ID lists (interned, see share_value) are resolved once.
+    """
+    def cells(field):
+        column = field_schema.column(field)
+        if column not in records_df.columns:
+            return [None] * len(records_df)
+        return records_df[column].astype(object).tolist()
+
+    names = {}
+    displays, id_lists = [], []
+    for linked, category, type_name, ai_system in zip(
+        cells('risk_types'), cells('risk_category'), cells('risk_type_name'), cells('ai_system')
+    ):
+        ids = [] if is_missing(linked) else risk_type_ids(linked)
+        display = ""
+        if ids and risk_types_dict:
+            key = tuple(ids)
+            if key not in names:
+                names[key] = ", ".join(risk_types_dict.get(type_id, f"Type ID: {type_id}") for type_id in ids)
+            display = names[key]
+        if not display and not is_missing(category):
+            if isinstance(category, list):
+                display = ", ".join(str(item) for item in category if item is not None)
+            else:
+                display = str(category) if category else ""
+        if not display and not is_missing(type_name):
+            display = type_name
+        if not display and not is_missing(ai_system):
+            display = ai_system
+        if not display:
+            display = f"Type IDs: {', '.join(ids)}" if ids else "Unknown Risk Type"
+        displays.append(display)
+        id_lists.append(ids)
+
+    display_array = np.empty(len(displays), dtype=object)
+    display_array[:] = displays
+    ids_array = np.empty(len(id_lists), dtype=object)
+    ids_array[:] = id_lists
+    return {'risk_types_dict': risk_types_dict, 'display': display_array, 'ids': ids_array}
+
+
+def get_risk_types(records_df, risk_types_dict):
+    """Return the resolved Risk Types for records_df (built once per snapshot and Risk Types dict)"""
+    risk_types = get_frame_index(records_df, 'risk_types', lambda df: build_risk_types(df, risk_types_dict))
+    if risk_types['risk_types_dict'] is not risk_types_dict:
+        risk_types = _frame_indexes[id(records_df)]['risk_types'] = build_risk_types(records_df, risk_types_dict)
+    return risk_types
+
+
+def build_search_index(records_df):
+    """Full-text search index over the display strings of records_df (see search_index.py)"""
+    return search_index.build(records_df['record_id'].tolist(), get_display_strings(records_df))
+
+
+def get_search_index(records_df):
+    """Return the search index for records_df (built once per snapshot, then updated as records change)"""
+    return get_frame_index(records_df, 'search_index', build_search_index)
+
+
+def get_search_positions(records_df):
+    """Row position of every search index document in records_df (-1 for deleted ones)"""
+    return get_frame_index(
+        records_df, 'search_positions',
+        lambda df: pd.Index(df['record_id']).get_indexer(get_search_index(df)['record_ids'])
+    )
+
+
+def search_positions(records_df, query, limit=None):
+    """Row positions of the risks matching a search query, best first (only the top limit if given)"""
+    return get_search_positions(records_df)[search_index.rank(get_search_index(records_df), query, limit)]
+
+
+def carry_over_display_strings(records_df, merged_df, changed_ids):
+    """Give a merged DataFrame the display strings, Risk Types and search index of records_df
+
+    Only changed rows are worked out again. Indexes that were never built for
+    records_df are left to be built on first use.
+    """
+    old_indexes = _frame_indexes.get(id(records_df), {})
+    if 'display_strings' not in old_indexes and 'risk_types' not in old_indexes:
+        return
+    old_positions = pd.Index(records_df['record_id']).get_indexer(merged_df['record_id'])
+    changed = (old_positions < 0) | merged_df['record_id'].isin(changed_ids).to_numpy()
+    changed_df = merged_df[changed]
+    kept = np.where(changed, 0, old_positions)
+
+    def carry_over(old_values, new_values):
+        values = old_values[kept] if len(records_df) else np.empty(len(merged_df), dtype=object)
+        values[changed] = new_values
+        return values
+
+    old_display = old_indexes.get('display_strings')
+    if old_display is not None:
+        empty = np.full(len(records_df), "", dtype=object)
+        display = {
+            column: carry_over(old_display.get(column, empty), display_strings(changed_df[column]))
+            for column in DISPLAY_FIELDS if column in merged_df.columns
+        }
+        get_frame_index(merged_df, 'display_strings', lambda _: display)
+
+        old_search_index = old_indexes.get('search_index')
+        if old_search_index is not None:
+            # The old texts of changed and deleted rows say which postings they have to leave
+            old_rows = records_df['record_id'].isin(changed_ids).to_numpy()
+            merged_ids = set(merged_df['record_id'])
+            new_index = search_index.update(
+                old_search_index,
+                records_df['record_id'][old_rows].tolist(),
+                {column: values[old_rows] for column, values in old_display.items()},
+                changed_df['record_id'].tolist(),
+                {column: values[changed] for column, values in display.items()},
+                deleted_ids=[record_id for record_id in records_df['record_id'][old_rows] if record_id not in merged_ids]
+            )
+            get_frame_index(merged_df, 'search_index', lambda _: new_index)
+
+    old_risk_types = old_indexes.get('risk_types')
+    if old_risk_types is not None:
+        changed_risk_types = build_risk_types(changed_df, old_risk_types['risk_types_dict'])
+        risk_types = {
+            'risk_types_dict': old_risk_types['risk_types_dict'],
+            'display': carry_over(old_risk_types['display'], changed_risk_types['display']),
+            'ids': carry_over(old_risk_types['ids'], changed_risk_types['ids']),
+        }
+        get_frame_index(merged_df, 'risk_types', lambda _: risk_types)
+
+
+def build_indexes(records_df, risk_types_dict=None):
+    """Build the per-snapshot indexes up front so the first render doesn't pay for them"""
+    get_ref_index(records_df)
+    get_facet_index(records_df)
+    get_display_strings(records_df)
+    get_search_positions(records_df)
+    if risk_types_dict is not None:
+        get_risk_types(records_df, risk_types_dict)
+    return records_df
+
+
+def build_partial_indexes(records_df):
+    """Build only the indexes a snapshot still streaming in needs for its first renders
+
+    A partial snapshot is replaced every few seconds, so the rest are left to be built
+    on first use.
+    """
+    get_ref_index(records_df)
+    get_facet_index(records_df)
+    return records_df
+
+
+def merge_records_df(records_df, records, deleted_ids=()):
+    """Merge changed Airtable records into a register DataFrame by record_id
+
+    Changed rows replace their old version in place, new rows are appended and
+    deleted_ids are dropped. Returns a new DataFrame; records_df is left untouched.
+    """
+    changed_df = build_records_df(records)
+    replaced_ids = set(deleted_ids)
+    if not changed_df.empty:
+        replaced_ids.update(changed_df['record_id'])
+
+    merged = pd.concat(
+        [records_df[~records_df['record_id'].isin(replaced_ids)], changed_df],
+        ignore_index=True
+    )
+
+    # Keep the original row order so selectbox options don't jump around between syncs
+    order = {record_id: position for position, record_id in enumerate(records_df['record_id'])}
+    merged = merged.sort_values(
+        'record_id',
+        key=lambda ids: ids.map(order).fillna(len(order)),
+        kind='stable',
+        ignore_index=True
+    )
+    # Concatenating categoricals with different categories falls back to object columns
+    merged = compact_records_df(merged)
+    # Unchanged rows keep their display strings
+    carry_over_display_strings(records_df, merged, replaced_ids)
+    return merged
+
+
+def format_watermark(moment):
+    """Format a datetime as the ISO 8601 UTC string Airtable formulas expect"""
+    return moment.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+
+def modified_since_formula(watermark):
+    """Build a filterByFormula selecting records modified after the watermark"""
+    return f"IS_AFTER(LAST_MODIFIED_TIME(), '{watermark}')"
+
+
+def fetch_risk_types_dict(risk_types_table):
+    """Fetch the Risk Types table as a {record_id: type name} dictionary"""
+    risk_types_dict = {}
+    for record in risk_types_table.all():
+        record_id = record['id']
+        risk_types_dict[record_id] = record['fields'].get('Risk type', f"Unknown Type: {record_id}")
+    return risk_types_dict
+
+
+def submit(function, *args, **kwargs):
+    """Run a table fetch on the shared load pool, returning its Future"""
+    return _executor.submit(function, *args, **kwargs)
+
+
+def build_snapshot_frame(records, risk_types_dict, loading=False):
+    """Register DataFrame for a snapshot, with every index built - or only the cheap ones while loading"""
+    if loading:
+        return build_partial_indexes(build_records_df(records))
+    return build_indexes(build_records_df(records), risk_types_dict)
+
+
+def new_snapshot(records, risk_types_dict, risk_types_error, sync_started, loading=False, records_df=None):
+    """Build a snapshot from a full list of register records (records_df if it was built already)"""
+    global _version
+    if records_df is None:
+        records_df = build_snapshot_frame(records, risk_types_dict, loading)
+    _version += 1
+    return {
+        'version': _version,
+        'loaded_at': time.time(),
+        'reconciled_at': time.time(),
+        'watermark': format_watermark(sync_started - WATERMARK_OVERLAP),
+        'records_df': records_df,
+        'risk_types_dict': risk_types_dict,
+        'risk_types_error': risk_types_error,
+        'offline': False,
+        'loading': loading,
+        'loaded_count': len(records),
+        'expected_count': _expected_count if loading else len(records),
+    }
+
+
+def fetch_risk_types_result(types_future):
+    """(risk_types_dict, error) from a risk types fetch - risk types are optional, so errors are returned"""
+    if types_future is None:
+        return {}, None
+    try:
+        return types_future.result(), None
+    except Exception as e:
+        return {}, str(e)
+
+
+def fetch_snapshot(risk_register_table, risk_types_table):
+    """Fetch the register and risk types from Airtable (concurrently) and build a new snapshot"""
+    types_future = submit(fetch_risk_types_dict, risk_types_table) if risk_types_table else None
+
+    sync_started = datetime.now(timezone.utc)
+    records = risk_register_table.all()
+
+    return new_snapshot(records, *fetch_risk_types_result(types_future), sync_started)
+
+
+def stream_snapshot(risk_register_table, risk_types_table):
+    """Start a full fetch page by page and return a snapshot of the first page
+
+    If there are more pages, a background thread fetches them and publishes a growing
+    snapshot (flagged 'loading') every STREAM_PUBLISH_INTERVAL seconds, then the complete
+    one. Call with _lock held and publish the returned snapshot before releasing it.
+    """
+    global _stream_generation
+    _stream_generation += 1
+    generation = _stream_generation
+
+    types_future = submit(fetch_risk_types_dict, risk_types_table) if risk_types_table else None
+    sync_started = datetime.now(timezone.utc)
+    pages = risk_register_table.iterate(page_size=PAGE_SIZE)
+    records = list(next(pages, []))
+    risk_types_dict, risk_types_error = fetch_risk_types_result(types_future)
+
+    # A short first page is the whole register
+    if len(records) < PAGE_SIZE:
+        return new_snapshot(records, risk_types_dict, risk_types_error, sync_started)
+
+    def publish_if_current(snapshot):
+        if generation == _stream_generation:
+            publish_snapshot(snapshot)
+
+    def fetch_remaining_pages():
+        published_at = time.monotonic()
+        try:
+            for page in pages:
+                records.extend(page)
+                if time.monotonic() - published_at >= STREAM_PUBLISH_INTERVAL:
+                    # The frame is built before taking the lock, which is only held to swap it in
+                    records_df = build_snapshot_frame(records, risk_types_dict, loading=True)
+                    with _lock:
+                        publish_if_current(new_snapshot(
+                            records, risk_types_dict, risk_types_error, sync_started, loading=True, records_df=records_df
+                        ))
+                    published_at = time.monotonic()
+            records_df = build_snapshot_frame(records, risk_types_dict)
+            with _lock:
+                publish_if_current(new_snapshot(
+                    records, risk_types_dict, risk_types_error, sync_started, records_df=records_df
+                ))
+        except Exception as e:
+            with _lock:
+                if generation == _stream_generation:
+                    # Prefer the complete copy on disk; otherwise keep what arrived, flagged so
+                    # the next sync is a full fetch (a delta from this watermark would miss pages)
+                    saved = load_disk_snapshot()
+                    if saved is None:
+                        saved = {**_snapshot, 'loading': False, 'incomplete': True}
+                    publish_snapshot(mark_sync_failed(saved, e))
+
+    threading.Thread(target=fetch_remaining_pages, name="register-stream", daemon=True).start()
+    return new_snapshot(list(records), risk_types_dict, risk_types_error, sync_started, loading=True)
+
+
+def delta_sync_snapshot(snapshot, risk_register_table, reconcile_interval=None, risk_types_table=None):
+    """Build a new snapshot from an existing one by fetching only records modified since its watermark
+
+    Deletions don't show up in a modified-since query, so every reconcile_interval
+    seconds an ID-only pass lists the whole table and drops rows that no longer exist.
+    The (small) Risk Types table is fetched again alongside, so added or renamed types
+    show up without a full reload.
+    """
+    global _version
+
+    types_future = submit(fetch_risk_types_dict, risk_types_table) if risk_types_table else None
+    sync_started = datetime.now(timezone.utc)
+    changed_records = risk_register_table.all(formula=modified_since_formula(snapshot['watermark']))
+
+    deleted_ids = set()
+    reconciled_at = snapshot['reconciled_at']
+    if reconcile_interval and time.time() - reconciled_at > reconcile_interval:
+        live_ids = {record['id'] for record in risk_register_table.all(fields=[RECONCILE_FIELD])}
+        deleted_ids = set(snapshot['records_df']['record_id']) - live_ids
+        reconciled_at = time.time()
+
+    # Risk types are optional - if they can't be fetched this time the ones we have are kept
+    risk_types_dict, risk_types_error = fetch_risk_types_result(types_future)
+    if types_future is None or risk_types_error:
+        risk_types_dict = snapshot['risk_types_dict']
+    risk_types_changed = risk_types_dict != snapshot['risk_types_dict']
+
+    new_snapshot = {
+        **snapshot,
+        'loaded_at': time.time(),
+        'reconciled_at': reconciled_at,
+        'watermark': format_watermark(sync_started - WATERMARK_OVERLAP),
+        'offline': False,
+        'from_disk': False,
+        'sync_error': None,
+        'retry_at': None,
+    }
+    if types_future is not None and not risk_types_error:
+        new_snapshot['risk_types_error'] = None
+    if changed_records or deleted_ids or risk_types_changed:
+        _version += 1
+        new_snapshot['version'] = _version
+        new_snapshot['risk_types_dict'] = risk_types_dict
+        # A new frame even if only the Risk Types changed - sessions still holding the old
+        # dict keep the old frame and its resolved types
+        new_snapshot['records_df'] = build_indexes(
+            merge_records_df(snapshot['records_df'], changed_records, deleted_ids), risk_types_dict
+        )
+    return new_snapshot
+
+
+def is_expired(snapshot, ttl):
+    """Check whether a snapshot is older than ttl seconds (a ttl of 0 or None never expires)
+
+    After a failed sync it is due again at its retry_at time instead.
+    """
+    if not ttl:
+        return False
+    if snapshot.get('retry_at') is not None:
+        return time.time() >= snapshot['retry_at']
+    return time.time() - snapshot['loaded_at'] > ttl
+
+
+def load_disk_snapshot():
+    """Build a snapshot from the copy saved on disk (None if there isn't one)"""
+    global _version
+    saved = disk_snapshot.load_register()
+    if saved is None:
+        return None
+    meta, records_df = saved
+    # Keep version numbers increasing across restarts
+    _version = max(_version, meta['version'])
+    return {
+        'version': meta['version'],
+        'loaded_at': time.time(),
+        'reconciled_at': meta['reconciled_at'],
+        'watermark': meta['watermark'],
+        'records_df': build_indexes(compact_records_df(field_schema.normalize_frame(records_df)), meta['risk_types_dict']),
+        'risk_types_dict': meta['risk_types_dict'],
+        'risk_types_error': None,
+        'offline': False,
+        'from_disk': True,
+        'saved_at': meta['saved_at'],
+    }
+
+
+def mark_offline(snapshot, error):
+    """Keep serving a snapshot after a failed sync, flagged read-only
+
+    loaded_at is reset so an unreachable Airtable is retried once per TTL rather than on
+    every rerun.
+    """
+    return {**snapshot, 'loaded_at': time.time(), 'offline': True, 'offline_error': str(error)}
+
+
+def mark_sync_failed(snapshot, error):
+    """Keep serving a snapshot after a failed sync
+
+    A snapshot that was synced with Airtable in this process stays writable - the
+    outbox holds saves until Airtable is back - and the sync is retried after
+    SYNC_RETRY_INTERVAL seconds. Only the copy from disk that was never synced (or
+    one already offline) is flagged read-only with mark_offline().
+    """
+    if snapshot.get('from_disk') or snapshot.get('offline'):
+        return mark_offline(snapshot, error)
+    return {**snapshot, 'sync_error': str(error), 'retry_at': time.time() + SYNC_RETRY_INTERVAL}
+
+
+def publish_snapshot(snapshot):
+    """Make a snapshot the shared one and save it to disk in the background (call with _lock held)
+
+    Partial snapshots (still streaming in, or cut short by an error) are not saved.
+    """
+    global _snapshot, _expected_count
+    changed = _snapshot is None or snapshot['version'] != _snapshot['version']
+    _snapshot = snapshot
+    if snapshot.get('loading') or snapshot.get('incomplete'):
+        return snapshot
+    _expected_count = len(snapshot['records_df'])
+    if changed and not snapshot.get('offline'):
+        disk_snapshot.save_in_background(disk_snapshot.save_register, snapshot)
+    return snapshot
+
+
+def fetch_or_load_snapshot(risk_register_table, risk_types_table):
+    """Stream in a new snapshot, falling back to the on-disk copy (read-only) if Airtable can't be reached"""
+    try:
+        return stream_snapshot(risk_register_table, risk_types_table)
+    except Exception as e:
+        saved = load_disk_snapshot()
+        if saved is None:
+            raise
+        return mark_offline(saved, e)
+
+
+def sync_in_background(risk_register_table, risk_types_table, reconcile_interval=None):
+    """Delta-sync the snapshot loaded from disk on a background thread"""
+    def run():
+        with _lock:
+            try:
+                publish_snapshot(delta_sync_snapshot(
+                    _snapshot, risk_register_table, reconcile_interval, risk_types_table
+                ))
+            except Exception as e:
+                publish_snapshot(mark_sync_failed(_snapshot, e))
+
+    threading.Thread(target=run, name="register-sync", daemon=True).start()
+
+
+def get_snapshot(risk_register_table, risk_types_table, ttl=None, delta=True, reconcile_interval=None):
+    """Return the shared snapshot, fetching it from Airtable if missing or expired
+
+    An expired snapshot is brought up to date with a delta sync when delta is True,
+    otherwise the whole register is fetched again. The first call in a process returns
+    the copy saved on disk (if any) straight away and syncs it in the background;
+    without one the register is streamed in (see stream_snapshot). If a sync fails the
+    current snapshot is kept and flagged offline.
+    """
+    global _cold_start
+    # Fresh snapshots (and ones still streaming in) are returned without waiting for a
+    # sync another session is running
+    snapshot = _snapshot
+    if snapshot is not None and (snapshot.get('loading') or not is_expired(snapshot, ttl)):
+        return snapshot
+
+    # Holding the lock while fetching means concurrent sessions wait for a single
+    # fetch instead of each pulling the whole register themselves
+    with _lock:
+        if _snapshot is None:
+            saved = load_disk_snapshot() if _cold_start else None
+            _cold_start = False
+            if saved is not None:
+                publish_snapshot(saved)
+                sync_in_background(risk_register_table, risk_types_table, reconcile_interval)
+            else:
+                publish_snapshot(fetch_or_load_snapshot(risk_register_table, risk_types_table))
+        elif is_expired(_snapshot, ttl) and not _snapshot.get('loading'):
+            try:
+                if delta and not _snapshot.get('incomplete'):
+                    publish_snapshot(delta_sync_snapshot(
+                        _snapshot, risk_register_table, reconcile_interval, risk_types_table
+                    ))
+                else:
+                    publish_snapshot(fetch_snapshot(risk_register_table, risk_types_table))
+            except Exception as e:
+                publish_snapshot(mark_sync_failed(_snapshot, e))
+        return _snapshot
+
+
+def sync_snapshot(risk_register_table, risk_types_table, reconcile_interval=None):
+    """Bring the shared snapshot up to date now with a delta sync (full fetch if nothing is loaded yet)
+
+    Unlike get_snapshot() a failed sync is raised, so the caller can report it.
+    """
+    global _cold_start
+    with _lock:
+        _cold_start = False
+        if _snapshot is None:
+            publish_snapshot(fetch_or_load_snapshot(risk_register_table, risk_types_table))
+        elif not _snapshot.get('loading'):
+            try:
+                if _snapshot.get('incomplete'):
+                    publish_snapshot(fetch_snapshot(risk_register_table, risk_types_table))
+                else:
+                    publish_snapshot(delta_sync_snapshot(
+                        _snapshot, risk_register_table, reconcile_interval, risk_types_table
+                    ))
+            except Exception as e:
+                publish_snapshot(mark_sync_failed(_snapshot, e))
+                raise
+        return _snapshot
+
+
+def peek_snapshot():
+    """Return the current shared snapshot without fetching (None if nothing is loaded)"""
+    return _snapshot
+
+
+def invalidate_snapshot():
+    """Drop the shared snapshot so the next get_snapshot() re-fetches it from Airtable"""
+    global _snapshot, _cold_start, _stream_generation
+    with _lock:
+        _snapshot = None
+        _cold_start = False
+        _stream_generation += 1
+
+
+# Filtered loads (REGISTER_LOAD_MODE = "filtered" in app.py): instead of the whole
+# register, each set of filter selections gets its own snapshot holding only the
+# matching risks and only the fields the pages show. Airtable does the filtering
+# (filterByFormula) and the snapshots are cached per filter signature.
+_filtered_lock = threading.Lock()
+_filtered_snapshots = OrderedDict()
+# Risk Types are fetched once for all filtered snapshots: (dict, error, loaded_at)
+_filtered_risk_types = None
+# Airtable field names seen for each canonical column ({canonical: [names]}) - a formula
+# has to use the real name, which may differ from the canonical one (e.g. stray spaces)
+_filtered_source_columns = {}
+
+# How many filtered snapshots are kept - the least recently used one is dropped first
+FILTERED_CACHE_SIZE = 16
+
+# Fields requested for a filtered load - every register field the pages show that has
+# a known field ID (field IDs keep working when a field is renamed in Airtable)
+PROJECTED_FIELDS = [
+    field_id for field_id in map(field_schema.field_id, field_schema.REGISTER_FIELDS) if field_id
+]
+
+# Fields needed to offer the filter options before any filter is chosen
+FACET_PROJECTED_FIELDS = [field_schema.field_id(field) for field in ['responsible', 'overall_risk_level', 'ai_system']]
+
+
+def selections_signature(selections):
+    """Hashable form of filter selections ({facet: [values]}) - empty facets are left out"""
+    return tuple(sorted(
+        (facet, tuple(sorted(set(values)))) for facet, values in selections.items() if values
+    ))
+
+
+def formula_string(value):
+    """Quote a value as an Airtable formula string literal"""
+    return "'" + str(value).replace('\\', '\\\\').replace("'", "\\'") + "'"
+
+
+def selections_formula(selections, source_columns=None):
+    """filterByFormula for filter selections (None when nothing is selected)
+
+    A facet matches when its field contains any selected value, ignoring case. That
+    finds everything match_facet() can match (exact values or, failing those, substring
+    matches), so filter_positions() on the result gives the same rows as on the whole
+    register. Fields are referenced by the names in source_columns ({canonical: [Airtable
+    names]}, as compile_schema() resolves them), falling back to the canonical name.
+    """
+    source_columns = source_columns or {}
+    conditions = []
+    for facet, values in selections_signature(selections):
+        if facet not in FACET_FIELDS:
+            continue
+        column = FACET_FIELDS[facet][0]
+        # Field IDs can't be used in a formula - only names
+        names = [name for name in source_columns.get(column, []) if not name.startswith('fld')] or [column]
+        matches = [
+            f"FIND({formula_string(value.lower())}, LOWER({{{name}}}))" for value in values for name in names
+        ]
+        conditions.append(matches[0] if len(matches) == 1 else f"OR({', '.join(matches)})")
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else f"AND({', '.join(conditions)})"
+
+
+def get_filtered_risk_types(risk_types_table, ttl=None):
+    """(risk_types_dict, error) for filtered snapshots - fetched again once older than ttl"""
+    global _filtered_risk_types
+    if risk_types_table is None:
+        return {}, None
+    if _filtered_risk_types is None or is_expired({'loaded_at': _filtered_risk_types[2]}, ttl):
+        try:
+            _filtered_risk_types = (fetch_risk_types_dict(risk_types_table), None, time.time())
+        except Exception as e:
+            if _filtered_risk_types is None:
+                return {}, str(e)
+    return _filtered_risk_types[0], _filtered_risk_types[1]
+
+
+def fetch_filtered_snapshot(risk_register_table, risk_types_table, selections, fields, ttl=None):
+    """Fetch only the register records matching selections, with only the given fields"""
+    global _version
+    types_future = submit(get_filtered_risk_types, risk_types_table, ttl)
+    records = risk_register_table.all(formula=selections_formula(selections, _filtered_source_columns), fields=fields)
+    risk_types_dict, risk_types_error = types_future.result()
+    # Remember the field names Airtable used (the unfiltered facet load comes first)
+    names = set().union(*(record['fields'] for record in records)) if records else set()
+    _filtered_source_columns.update(field_schema.compile_schema('register', tuple(sorted(names))))
+    _version += 1
+    return {
+        'version': _version,
+        'loaded_at': time.time(),
+        'records_df': build_indexes(build_records_df(records), risk_types_dict),
+        'risk_types_dict': risk_types_dict,
+        'risk_types_error': risk_types_error,
+        'offline': False,
+        'filtered': True,
+    }
+
+
+def get_filtered_snapshot(risk_register_table, risk_types_table, selections, ttl=None, fields=None):
+    """Return the snapshot for a set of filter selections, fetching it if missing or expired
+
+    fields defaults to PROJECTED_FIELDS. If a re-fetch fails the cached snapshot is kept
+    and flagged offline; without one the error is raised.
+    """
+    fields = list(fields or PROJECTED_FIELDS)
+    key = (selections_signature(selections), tuple(fields))
+    snapshot = _filtered_snapshots.get(key)
+    if snapshot is not None and not is_expired(snapshot, ttl):
+        return snapshot
+
+    # Like get_snapshot(), sessions asking for the same filters wait for one fetch
+    with _filtered_lock:
+        snapshot = _filtered_snapshots.get(key)
+        if snapshot is None or is_expired(snapshot, ttl):
+            try:
+                snapshot = fetch_filtered_snapshot(risk_register_table, risk_types_table, selections, fields, ttl)
+            except Exception as e:
+                if snapshot is None:
+                    raise
+                snapshot = mark_sync_failed(snapshot, e)
+            _filtered_snapshots[key] = snapshot
+        _filtered_snapshots.move_to_end(key)
+        while len(_filtered_snapshots) > FILTERED_CACHE_SIZE:
+            _filtered_snapshots.popitem(last=False)
+        return snapshot
+
+
+def invalidate_filtered_snapshots():
+    """Drop every filtered snapshot so they are fetched again"""
+    global _filtered_risk_types
+    with _filtered_lock:
+        _filtered_snapshots.clear()
+        _filtered_risk_types = None
+
+
+# Risk Changes History index, shared the same way as the register snapshot.
+# Responses are grouped by Original Risk Reference and kept sorted by created time,
+# so "latest response for a risk" is the last item of a list.
+
+# _changes_sync_lock is held across Airtable requests so only one fetch runs at a time;
+# _changes_lock guards the index itself and is only ever held briefly, so a save written
+# through from the outbox never waits for a fetch.
+_changes_sync_lock = threading.Lock()
+_changes_lock = threading.Lock()
+_changes_index = None
+_changes_version = 0
+_changes_cold_start = True
+# Saves queued in the outbox that Airtable hasn't confirmed yet, by outbox entry ID
+_pending_changes = {}
+# (records, replaced_ids) of the saves Airtable confirmed while a fetch was running (None
+# when none is) - the fetch may have missed them, so they are applied again on top of its
+# result, dropping the provisional records they replaced
+_confirmed_during_fetch = None
+
+# Original Risk Reference - the field requested by the changes table's ID-only reconciliation
+CHANGES_RECONCILE_FIELD = 'fldJwiM65ftTV4wA3'
+CHANGE_REFERENCE_FIELD = field_schema.column('risk_reference', 'changes')
+
+
+def change_reference(record):
+    """Original Risk Reference of a Risk Changes record (as a string, None if not set)"""
+    reference = record.get('fields', {}).get(CHANGE_REFERENCE_FIELD)
+    return None if is_missing(reference) or reference == "" else str(reference)
+
+
+def change_sort_key(record):
+    """Sort key ordering Risk Changes records oldest first"""
+    return record.get('createdTime', ''), record['id']
+
+
+def normalize_change(record):
+    """Risk Changes record with its fields keyed by canonical names"""
+    fields = record.get('fields', {})
+    normalized = field_schema.normalize_fields(fields, 'changes')
+    return record if normalized is fields else {**record, 'fields': normalized}
+
+
+def index_changes(by_id, by_reference, records, deleted_ids=()):
+    """Apply changed/deleted Risk Changes records to an index, returning new dicts
+
+    Records are normalized to canonical field names. Only the reference lists touched by
+    the change are rebuilt; the inputs are not modified.
+    """
+    by_id = dict(by_id)
+    by_reference = dict(by_reference)
+    touched = set()
+
+    for record_id in deleted_ids:
+        old_record = by_id.pop(record_id, None)
+        if old_record is not None:
+            touched.add(change_reference(old_record))
+
+    for record in map(normalize_change, records):
+        old_record = by_id.get(record['id'])
+        if old_record is not None:
+            touched.add(change_reference(old_record))
+        by_id[record['id']] = record
+        touched.add(change_reference(record))
+
+    touched.discard(None)
+    for reference in touched:
+        by_reference.pop(reference, None)
+    for record in by_id.values():
+        reference = change_reference(record)
+        if reference in touched:
+            by_reference.setdefault(reference, []).append(record)
+    for reference in touched:
+        if reference in by_reference:
+            by_reference[reference].sort(key=change_sort_key)
+
+    return by_id, by_reference
+
+
+def next_changes_version():
+    """Version stamp for a changed Risk Changes index (used to skip redundant disk writes)"""
+    global _changes_version
+    _changes_version += 1
+    return _changes_version
+
+
+def fetch_changes_index(risk_changes_table):
+    """Fetch the whole Risk Changes History table and index it by Original Risk Reference"""
+    sync_started = datetime.now(timezone.utc)
+    by_id, by_reference = index_changes({}, {}, risk_changes_table.all())
+    return {
+        'version': next_changes_version(),
+        'loaded_at': time.time(),
+        'reconciled_at': time.time(),
+        'watermark': format_watermark(sync_started - WATERMARK_OVERLAP),
+        'by_id': by_id,
+        'by_reference': by_reference,
+        'offline': False,
+    }
+
+
+def delta_sync_changes_index(changes_index, risk_changes_table, reconcile_interval=None):
+    """Bring a changes index up to date by fetching only records modified since its watermark"""
+    sync_started = datetime.now(timezone.utc)
+    changed_records = risk_changes_table.all(formula=modified_since_formula(changes_index['watermark']))
+
+    deleted_ids = set()
+    reconciled_at = changes_index['reconciled_at']
+    if reconcile_interval and time.time() - reconciled_at > reconcile_interval:
+        live_ids = {record['id'] for record in risk_changes_table.all(fields=[CHANGES_RECONCILE_FIELD])}
+        deleted_ids = set(changes_index['by_id']) - live_ids
+        reconciled_at = time.time()
+
+    version = changes_index['version']
+    by_id, by_reference = changes_index['by_id'], changes_index['by_reference']
+    if changed_records or deleted_ids:
+        version = next_changes_version()
+        by_id, by_reference = index_changes(by_id, by_reference, changed_records, deleted_ids)
+
+    return {
+        'version': version,
+        'loaded_at': time.time(),
+        'reconciled_at': reconciled_at,
+        'watermark': format_watermark(sync_started - WATERMARK_OVERLAP),
+        'by_id': by_id,
+        'by_reference': by_reference,
+        'offline': False,
+    }
+
+
+def load_disk_changes_index():
+    """Build a changes index from the copy saved on disk (None if there isn't one)"""
+    global _changes_version
+    saved = disk_snapshot.load_changes()
+    if saved is None:
+        return None
+    _changes_version = max(_changes_version, saved['version'])
+    by_id, by_reference = index_changes({}, {}, saved['records'])
+    return {
+        'version': saved['version'],
+        'loaded_at': time.time(),
+        'reconciled_at': saved['reconciled_at'],
+        'watermark': saved['watermark'],
+        'by_id': by_id,
+        'by_reference': by_reference,
+        'offline': False,
+        'from_disk': True,
+        'saved_at': saved['saved_at'],
+    }
+
+
+def publish_changes_index(changes_index):
+    """Make a changes index the shared one and save it to disk in the background (call with _changes_lock held)"""
+    global _changes_index
+    changed = _changes_index is None or changes_index['version'] != _changes_index['version']
+    if _pending_changes:
+        # Saves still on their way to Airtable stay visible over the fetched records
+        by_id, by_reference = with_pending_changes(changes_index['by_id'], changes_index['by_reference'])
+        changes_index = {**changes_index, 'by_id': by_id, 'by_reference': by_reference}
+    _changes_index = changes_index
+    if changed and not changes_index.get('offline'):
+        disk_snapshot.save_in_background(disk_snapshot.save_changes, changes_index)
+    return changes_index
+
+
+def fetch_or_load_changes_index(risk_changes_table):
+    """Fetch the changes index, falling back to the on-disk copy (read-only) if Airtable can't be reached"""
+    try:
+        return fetch_changes_index(risk_changes_table)
+    except Exception as e:
+        saved = load_disk_changes_index()
+        if saved is None:
+            raise
+        return mark_offline(saved, e)
+
+
+def refresh_changes_index(fetch):
+    """Replace the shared changes index with fetch(current index), fetching without holding _changes_lock
+
+    Call with _changes_sync_lock held. Saves confirmed while the fetch ran are applied
+    again on top of its result before it is published.
+    """
+    global _confirmed_during_fetch
+    with _changes_lock:
+        base = _changes_index
+        _confirmed_during_fetch = []
+    try:
+        changes_index = fetch(base)
+    finally:
+        with _changes_lock:
+            confirmed, _confirmed_during_fetch = _confirmed_during_fetch, None
+    with _changes_lock:
+        if confirmed:
+            by_id, by_reference = changes_index['by_id'], changes_index['by_reference']
+            for records, replaced_ids in confirmed:
+                by_id, by_reference = index_changes(by_id, by_reference, records, replaced_ids)
+            changes_index = {**changes_index, 'by_id': by_id, 'by_reference': by_reference}
+        return publish_changes_index(changes_index)
+
+
+def mark_changes_sync_failed(error):
+    """Keep serving the shared changes index after a failed sync (see mark_sync_failed())"""
+    with _changes_lock:
+        publish_changes_index(mark_sync_failed(_changes_index, error))
+
+
+def sync_changes_in_background(risk_changes_table, reconcile_interval=None):
+    """Delta-sync the changes index loaded from disk on a background thread"""
+    def run():
+        with _changes_sync_lock:
+            try:
+                refresh_changes_index(lambda base: delta_sync_changes_index(base, risk_changes_table, reconcile_interval))
+            except Exception as e:
+                mark_changes_sync_failed(e)
+
+    threading.Thread(target=run, name="risk-changes-sync", daemon=True).start()
+
+
+def get_changes_index(risk_changes_table, ttl=None, reconcile_interval=None):
+    """Return the shared Risk Changes index, fetching it if missing or delta-syncing it once expired
+
+    Like get_snapshot(), the first call starts from the on-disk copy and a failed sync
+    keeps the current index, flagged offline.
+    """
+    global _changes_cold_start
+    changes_index = _changes_index
+    if changes_index is not None and not is_expired(changes_index, ttl):
+        return changes_index
+
+    with _changes_sync_lock:
+        if _changes_index is None:
+            saved = load_disk_changes_index() if _changes_cold_start else None
+            _changes_cold_start = False
+            if saved is not None:
+                with _changes_lock:
+                    publish_changes_index(saved)
+                sync_changes_in_background(risk_changes_table, reconcile_interval)
+            else:
+                refresh_changes_index(lambda base: fetch_or_load_changes_index(risk_changes_table))
+        elif is_expired(_changes_index, ttl):
+            try:
+                refresh_changes_index(lambda base: delta_sync_changes_index(base, risk_changes_table, reconcile_interval))
+            except Exception as e:
+                mark_changes_sync_failed(e)
+        return _changes_index
+
+
+def sync_changes_index(risk_changes_table, reconcile_interval=None):
+    """Delta-sync the shared Risk Changes index now (full fetch if nothing is loaded yet)"""
+    global _changes_cold_start
+    with _changes_sync_lock:
+        _changes_cold_start = False
+        if _changes_index is None:
+            refresh_changes_index(lambda base: fetch_or_load_changes_index(risk_changes_table))
+        else:
+            try:
+                refresh_changes_index(lambda base: delta_sync_changes_index(base, risk_changes_table, reconcile_interval))
+            except Exception as e:
+                mark_changes_sync_failed(e)
+                raise
+        return _changes_index
+
+
+def get_risk_changes(changes_index, risk_reference):
+    """All Risk Changes records for a risk reference, oldest first"""
+    return changes_index['by_reference'].get(str(risk_reference), [])
+
+
+def latest_risk_change(changes_index, risk_reference):
+    """Most recent Risk Changes record for a risk reference (None if there is none)"""
+    records = get_risk_changes(changes_index, risk_reference)
+    return records[-1] if records else None
+
+
+def invalidate_changes_index():
+    """Drop the shared Risk Changes index so it is re-fetched from Airtable on next use"""
+    global _changes_index, _changes_cold_start
+    with _changes_lock:
+        _changes_index = None
+        _changes_cold_start = False
+
+
+def pending_change(by_id, save):
+    """Index entry for a queued save that hasn't reached Airtable yet, flagged 'pending'
+
+    An update only carries the fields it changes, so it is applied on top of the
+    current record, which is kept as 'confirmed' in case the update is given up on.
+    Returns None for an update to a record that isn't in the index.
+    """
+    fields = field_schema.normalize_fields(save['fields'], 'changes')
+    if save['operation'] == 'create':
+        return {'id': save['id'], 'createdTime': save['createdTime'], 'fields': fields, 'pending': True}
+    current = by_id.get(save['id'])
+    if current is None:
+        return None
+    return {**current, 'fields': {**current['fields'], **fields}, 'pending': True,
+            'confirmed': current.get('confirmed', current)}
+
+
+def with_pending_changes(by_id, by_reference):
+    """Apply the queued saves on top of an index, returning new dicts"""
+    changed = dict(by_id)
+    changes = []
+    for save in _pending_changes.values():
+        change = pending_change(changed, save)
+        if change is not None:
+            changed[change['id']] = change
+            changes.append(change)
+    return index_changes(by_id, by_reference, changes) if changes else (by_id, by_reference)
+
+
+def apply_risk_changes(records, pending=False, entry_ids=(), replaced_ids=(), reverted_ids=()):
+    """Write saves through to the shared Risk Changes index
+
+    records are either queued saves (pending=True, see outbox.provisional_records) or
+    the records Airtable returned for the outbox entries in entry_ids. Created records
+    take the place of the provisional records in replaced_ids (in the same order), or
+    those are just dropped if the creates were given up on; reverted_ids go back to
+    their confirmed version (updates given up on). Queued saves are kept until then
+    and applied again on top of every newly fetched or synced index.
+    """
+    global _changes_index
+    with _changes_lock:
+        if pending:
+            for save in records:
+                _pending_changes[save['outbox_entry']] = save
+            records = []
+        else:
+            for entry_id in entry_ids:
+                _pending_changes.pop(entry_id, None)
+            if _confirmed_during_fetch is not None:
+                _confirmed_during_fetch.append((list(records), list(replaced_ids)))
+            # Updates queued for a record that was still being created now go to the created record
+            created_ids = dict(zip(replaced_ids, (record['id'] for record in records)))
+            for entry_id, save in list(_pending_changes.items()):
+                if save['id'] in created_ids:
+                    _pending_changes[entry_id] = {**save, 'id': created_ids[save['id']]}
+        if _changes_index is None:
+            return
+
+        by_id = _changes_index['by_id']
+        reverted = [by_id[record_id]['confirmed'] for record_id in reverted_ids
+                    if record_id in by_id and 'confirmed' in by_id[record_id]]
+        by_id, by_reference = index_changes(by_id, _changes_index['by_reference'], list(records) + reverted, replaced_ids)
+        by_id, by_reference = with_pending_changes(by_id, by_reference)
+        # A new version gets the confirmed records onto disk with the next sync
+        _changes_index = {
+            **_changes_index,
+            'version': next_changes_version(),
+            'by_id': by_id,
+            'by_reference': by_reference,
+        }
+
+
+# Saves are applied to the shared caches as soon as they are queued, and again with
+# what Airtable returns once the outbox has written them
+events.subscribe('risk_changes', apply_risk_changes)
@@ -0,0 +1,246 @@
+import itertools
+import math
+import re
+from bisect import bisect_left
+
+import numpy as np
+import pandas as pd
+
+import field_schema
+
+# In-memory inverted index for the risk search box.
+#
+# Every risk is a document made of the text fields below. Terms are lowercase runs of
+# letters and digits; each one maps to a posting of (document numbers, weights) as
+# numpy arrays, so a query only touches the postings of its terms. Documents are
+# numbered once per record ID and keep their number when the record changes, so an
+# index is updated by rewriting only the postings of the changed records' terms.
+#
+# An index is never modified once built - update() returns a new one sharing every
+# untouched posting, like the snapshots it belongs to.
+
+# Searched columns and how much a match in each counts
+SEARCH_FIELDS = {
+    field_schema.column('risk_description'): 2.0,
+    field_schema.column('root_causes'): 1.0,
+    field_schema.column('impact'): 1.0,
+    field_schema.column('process'): 1.5,
+    field_schema.column('sub_process'): 1.0,
+    field_schema.column('activity'): 1.5,
+    field_schema.column('components'): 1.0,
+}
+
+# Term frequency saturation (as in BM25) - repeating a word counts for less and less
+SATURATION = 1.2
+
+# A query word matching a longer term (by prefix) scores this share of an exact match
+PREFIX_WEIGHT = 0.5
+
+# Query words shorter than this only match whole terms - "a" would expand to half the vocabulary
+MIN_PREFIX_LENGTH = 2
+
+TOKEN = re.compile(r"[^\W_]+")
+
+
+def tokenize(text):
+    """Lowercase terms of a text"""
+    return TOKEN.findall(text.lower())
+
+
+def document_terms(texts, cache):
+    """{term: weight} for one document given {column: display string}
+
+    cache holds the terms of field values already seen - lookup lists and labels
+    repeat across many risks.
+    """
+    counts = {}
+    for column, boost in SEARCH_FIELDS.items():
+        text = texts.get(column)
+        if not text:
+            continue
+        key = (column, text)
+        terms = cache.get(key)
+        if terms is None:
+            terms = cache[key] = tokenize(text)
+        for term in terms:
+            counts[term] = counts.get(term, 0.0) + boost
+    return {term: count * (SATURATION + 1) / (count + SATURATION) for term, count in counts.items()}
+
+
+def rows(record_ids, columns):
+    """(record_id, {column: text}) per row of aligned text arrays ({column: array})"""
+    names = [column for column in SEARCH_FIELDS if column in columns]
+    for position, record_id in enumerate(record_ids):
+        yield record_id, {column: columns[column][position] for column in names}
+
+
+def build(record_ids, columns):
+    """Index documents given their record IDs and {column: display strings aligned with them}
+
+    Each distinct value of a column is tokenized once; the (document, term) pairs of
+    all columns are then summed and split into postings with numpy rather than per
+    document - tokenizing is most of what is left of the build time.
+    """
+    documents, tokens, boosts = [], [], []
+    for column, boost in SEARCH_FIELDS.items():
+        if column not in columns:
+            continue
+        # Tokens of every distinct value, laid end to end, and where each value's run starts
+        values = {}
+        codes = np.array([values.setdefault(text, len(values)) for text in columns[column]], dtype=np.int64)
+        value_tokens = [tokenize(text) if text else [] for text in values]
+        lengths = np.array([len(value) for value in value_tokens], dtype=np.int64)
+        starts = np.cumsum(lengths) - lengths
+        per_document = lengths[codes]
+        total = int(per_document.sum())
+        if not total:
+            continue
+        # Position of every token of every document: its value's start plus a running offset
+        run_starts = np.cumsum(per_document) - per_document
+        positions = np.repeat(starts[codes] - run_starts, per_document) + np.arange(total)
+        flat = np.empty(int(lengths.sum()), dtype=object)
+        flat[:] = list(itertools.chain.from_iterable(value_tokens))
+        documents.append(np.repeat(np.arange(len(codes), dtype=np.int64), per_document))
+        tokens.append(flat[positions])
+        boosts.append(np.full(total, boost))
+
+    postings = {}
+    if documents:
+        # Term IDs by hashing rather than sorting the tokens
+        terms, names = pd.factorize(np.concatenate(tokens))
+        documents = np.concatenate(documents)
+        # Sum the boosts of each (term, document) pair, ordered by term then document
+        pairs, inverse = np.unique(terms * len(record_ids) + documents, return_inverse=True)
+        counts = np.bincount(inverse, weights=np.concatenate(boosts))
+        weights = (counts * (SATURATION + 1) / (counts + SATURATION)).astype(np.float32)
+        pair_terms, pair_documents = pairs // len(record_ids), (pairs % len(record_ids)).astype(np.int32)
+        bounds = np.flatnonzero(np.diff(pair_terms)) + 1
+        for term, term_documents, term_weights in zip(
+            names[pair_terms[np.concatenate([[0], bounds])]],
+            np.split(pair_documents, bounds),
+            np.split(weights, bounds),
+        ):
+            postings[term] = (term_documents, term_weights)
+    return {
+        'numbers': {record_id: number for number, record_id in enumerate(record_ids)},
+        'record_ids': np.array(record_ids, dtype=object),
+        'postings': postings,
+        'terms': sorted(postings),
+        'count': len(record_ids),
+    }
+
+
+def update(index, old_record_ids, old_columns, new_record_ids, new_columns, deleted_ids=()):
+    """New index with documents changed, added or deleted, sharing every untouched posting
+
+    old_* are the previous texts of the changed documents that were already indexed
+    (to find the postings they were in) and new_* their current texts, including new
+    documents; deleted_ids are dropped.
+    """
+    numbers = dict(index['numbers'])
+    record_ids = index['record_ids']
+    added = [record_id for record_id in new_record_ids if record_id not in numbers]
+    if added:
+        # Deleted documents keep their numbers, so new ones are numbered past every document so far
+        for number, record_id in enumerate(added, start=len(record_ids)):
+            numbers[record_id] = number
+        record_ids = np.concatenate([record_ids, np.array(added, dtype=object)])
+    removed = {numbers[record_id] for record_id in deleted_ids if record_id in numbers}
+    for record_id in deleted_ids:
+        numbers.pop(record_id, None)
+
+    # Postings losing a document: every term its previous text had
+    cache = {}
+    touched = set()
+    for record_id, texts in rows(old_record_ids, old_columns):
+        if record_id in index['numbers']:
+            removed.add(index['numbers'][record_id])
+            touched.update(document_terms(texts, cache))
+    additions = {}
+    for record_id, texts in rows(new_record_ids, new_columns):
+        number = numbers[record_id]
+        removed.add(number)
+        for term, weight in document_terms(texts, cache).items():
+            additions.setdefault(term, ([], []))
+            additions[term][0].append(number)
+            additions[term][1].append(weight)
+    touched.update(additions)
+
+    postings = dict(index['postings'])
+    removed = np.array(sorted(removed), dtype=np.int32)
+    new_terms, dropped_terms = [], set()
+    for term in touched:
+        documents, weights = postings.get(term, (np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)))
+        keep = ~np.isin(documents, removed)
+        documents, weights = documents[keep], weights[keep]
+        if term in additions:
+            documents = np.concatenate([documents, np.array(additions[term][0], dtype=np.int32)])
+            weights = np.concatenate([weights, np.array(additions[term][1], dtype=np.float32)])
+        if len(documents):
+            if term not in postings:
+                new_terms.append(term)
+            postings[term] = (documents, weights)
+        elif term in postings:
+            del postings[term]
+            dropped_terms.add(term)
+
+    terms = index['terms']
+    if new_terms or dropped_terms:
+        terms = sorted(set(terms).difference(dropped_terms).union(new_terms))
+    return {'numbers': numbers, 'record_ids': record_ids, 'postings': postings, 'terms': terms, 'count': len(numbers)}
+
+
+def expand(index, word):
+    """Terms a query word matches: [(term, exact)] - itself and, unless it is short, the terms it starts"""
+    terms = index['terms']
+    if len(word) < MIN_PREFIX_LENGTH:
+        return [(word, True)] if word in index['postings'] else []
+    matches = []
+    for position in range(bisect_left(terms, word), len(terms)):
+        term = terms[position]
+        if not term.startswith(word):
+            break
+        matches.append((term, term == word))
+    return matches
+
+
+def rank(index, query, limit=None):
+    """Document numbers matching every word of a query, best first (all of them if limit is None)
+
+    Each word matches the terms it is a prefix of; a document scores the sum over the
+    query words of its best matching term's weight times that term's IDF. Ties keep
+    document order.
+    """
+    none = np.empty(0, dtype=np.int64)
+    words = list(dict.fromkeys(tokenize(query)))
+    if not words or not index['count']:
+        return none
+
+    size = len(index['record_ids'])
+    total = None
+    for word in words:
+        word_scores = np.zeros(size, dtype=np.float32)
+        for term, exact in expand(index, word):
+            documents, weights = index['postings'][term]
+            idf = math.log(1 + (index['count'] - len(documents) + 0.5) / (len(documents) + 0.5))
+            scores = weights * (idf if exact else idf * PREFIX_WEIGHT)
+            # Document numbers are unique within a posting, so a plain fancy assignment is safe
+            word_scores[documents] = np.maximum(word_scores[documents], scores)
+        if total is None:
+            total = word_scores
+        else:
+            # Every word has to match
+            total = np.where((word_scores > 0) & (total > 0), total + word_scores, 0)
+        if not total.any():
+            return none
+
+    matched = np.flatnonzero(total)
+    if limit is not None and len(matched) > limit:
+        matched = np.sort(matched[np.argpartition(-total[matched], limit - 1)[:limit]])
+    # matched is in document order, so a stable sort on the score keeps ties in that order
+    return matched[np.argsort(-total[matched], kind='stable')]
+
+
+def search(index, query, limit=50):
+    """Record IDs of the documents matching every word of a query, best first (all of them if limit is None)"""
+    return index['record_ids'][rank(index, query, limit)].tolist()
@@ -0,0 +1,99 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import outbox  # noqa: E402
+import risk_store  # noqa: E402
+
+REFERENCE_FIELD_ID = risk_store.CHANGES_RECONCILE_FIELD
+
+
+class FakeTable:
+    """Risk Changes table returning the given records for every request"""
+
+    def __init__(self, records=()):
+        self.records = list(records)
+
+    def all(self, **kwargs):
+        return list(self.records)
+
+
+def change(record_id, reference, created_time='2024-01-01T00:00:00.000Z'):
+    return {'id': record_id, 'createdTime': created_time, 'fields': {REFERENCE_FIELD_ID: reference}}
+
+
+@pytest.fixture(autouse=True)
+def shared_index(monkeypatch):
+    """Start every test from an empty shared index"""
+    monkeypatch.setattr(risk_store, '_changes_index', None)
+    monkeypatch.setattr(risk_store, '_pending_changes', {})
+    monkeypatch.setattr(risk_store, '_confirmed_during_fetch', None)
+    monkeypatch.setattr(risk_store.disk_snapshot, '_directory', None)
+
+
+def test_create_confirmed_during_fetch_replaces_provisional_record():
+    risk_store.refresh_changes_index(lambda base: risk_store.fetch_changes_index(FakeTable([change('recOld', 'R-1')])))
+
+    # A save is queued - the index shows it under a provisional ID until Airtable confirms it
+    risk_store.apply_risk_changes(outbox.provisional_records('create', [(7, None, {REFERENCE_FIELD_ID: 'R-2'})]), pending=True)
+    provisional_id = outbox.pending_record_id(7)
+    assert provisional_id in risk_store._changes_index['by_id']
+
+    def fetch(base):
+        # The outbox confirms the create while the sync is waiting for Airtable
+        created = change('recCreated', 'R-2', '2024-01-02T00:00:00.000Z')
+        risk_store.apply_risk_changes([created], entry_ids=[7], replaced_ids=[provisional_id])
+        return risk_store.delta_sync_changes_index(base, FakeTable())
+
+    changes_index = risk_store.refresh_changes_index(fetch)
+
+    assert not [record_id for record_id in changes_index['by_id'] if record_id.startswith(outbox.PENDING_PREFIX)]
+    assert [record['id'] for record in risk_store.get_risk_changes(changes_index, 'R-2')] == ['recCreated']
+    assert risk_store.latest_risk_change(changes_index, 'R-1')['id'] == 'recOld'
+
+
+def test_update_confirmed_during_fetch_wins_over_fetched_record():
+    risk_store.refresh_changes_index(lambda base: risk_store.fetch_changes_index(FakeTable([change('recA', 'R-1')])))
+
+    def fetch(base):
+        # The fetch read recA before the outbox's update to it was confirmed
+        fetched = risk_store.delta_sync_changes_index(base, FakeTable([change('recA', 'R-1')]))
+        updated = change('recA', 'R-1')
+        updated['fields']['fldj5ERls7Jsaq21H'] = "Accept"
+        risk_store.apply_risk_changes([updated], entry_ids=[3])
+        return fetched
+
+    changes_index = risk_store.refresh_changes_index(fetch)
+
+    assert risk_store.latest_risk_change(changes_index, 'R-1')['fields']['FH Response'] == "Accept"
+
+
+def test_queued_saves_stay_visible_over_a_fetch():
+    risk_store.apply_risk_changes(outbox.provisional_records('create', [(4, None, {REFERENCE_FIELD_ID: 'R-3'})]), pending=True)
+
+    changes_index = risk_store.refresh_changes_index(
+        lambda base: risk_store.fetch_changes_index(FakeTable([change('recOld', 'R-1')]))
+    )
+
+    latest = risk_store.latest_risk_change(changes_index, 'R-3')
+    assert latest['id'] == outbox.pending_record_id(4)
+    assert latest['pending']
+
+
+def test_failed_fetch_leaves_the_index_alone():
+    changes_index = risk_store.refresh_changes_index(
+        lambda base: risk_store.fetch_changes_index(FakeTable([change('recOld', 'R-1')]))
+    )
+
+    def fetch(base):
+        raise RuntimeError("Airtable unavailable")
+
+    with pytest.raises(RuntimeError):
+        risk_store.refresh_changes_index(fetch)
+
+    assert risk_store._changes_index is changes_index
+    # Confirmations are no longer collected once the fetch is over
+    assert risk_store._confirmed_during_fetch is None
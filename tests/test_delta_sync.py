@@ -0,0 +1,135 @@
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import risk_store  # noqa: E402
+
+
+class FakeRegisterTable:
+    """Risk Register table: a delta query returns changed, the ID-only pass live_ids"""
+
+    def __init__(self, changed=(), live_ids=()):
+        self.changed = list(changed)
+        self.live_ids = list(live_ids)
+        self.requests = []
+
+    def all(self, formula=None, fields=None):
+        self.requests.append('reconcile' if fields else 'delta')
+        if fields:
+            return [{'id': record_id, 'createdTime': '', 'fields': {}} for record_id in self.live_ids]
+        return list(self.changed)
+
+
+class FakeRiskTypesTable:
+    def __init__(self, names=None, error=None):
+        self.names = names or {}
+        self.error = error
+
+    def all(self):
+        if self.error:
+            raise self.error
+        return [{'id': record_id, 'fields': {'Risk type': name}} for record_id, name in self.names.items()]
+
+
+def risk(number, description=None, risk_types=('recType1',)):
+    return {'id': f"recRisk{number}", 'createdTime': '', 'fields': {
+        'Risk reference': f"R-{number}",
+        'Risk description': description or f"Risk number {number}",
+        'Risk types': list(risk_types),
+    }}
+
+
+def snapshot_of(records, risk_types_dict=None, reconciled_ago=0):
+    risk_types_dict = {'recType1': "Privacy"} if risk_types_dict is None else risk_types_dict
+    snapshot = risk_store.new_snapshot(records, risk_types_dict, None, datetime.now(timezone.utc))
+    return {**snapshot, 'reconciled_at': time.time() - reconciled_ago}
+
+
+def references(snapshot):
+    return risk_store.get_risk_references(snapshot['records_df'])
+
+
+@pytest.fixture
+def register():
+    return [risk(number) for number in range(5)]
+
+
+def test_delta_sync_merges_changed_records_in_place(register):
+    snapshot = snapshot_of(register)
+    table = FakeRegisterTable(changed=[risk(2, "Quokka escalation"), risk(9)])
+
+    synced = risk_store.delta_sync_snapshot(snapshot, table)
+
+    assert synced['version'] > snapshot['version']
+    # Changed rows keep their position, new ones are appended
+    assert references(synced) == ["R-0", "R-1", "R-2", "R-3", "R-4", "R-9"]
+    records_df = synced['records_df']
+    position = risk_store.get_ref_index(records_df)["R-2"]
+    assert risk_store.get_display_record(records_df, position)['Risk description'] == "Quokka escalation"
+    assert records_df['record_id'].iloc[risk_store.search_positions(records_df, "quokka")].tolist() == ['recRisk2']
+    assert table.requests == ['delta']
+    # The old snapshot is never modified
+    assert references(snapshot) == ["R-0", "R-1", "R-2", "R-3", "R-4"]
+
+
+def test_delta_sync_without_changes_keeps_the_frame(register):
+    snapshot = snapshot_of(register)
+
+    synced = risk_store.delta_sync_snapshot(snapshot, FakeRegisterTable())
+
+    assert synced['version'] == snapshot['version']
+    assert synced['records_df'] is snapshot['records_df']
+    assert synced['watermark'] >= snapshot['watermark']
+
+
+def test_reconcile_drops_deleted_records(register):
+    snapshot = snapshot_of(register, reconciled_ago=120)
+    table = FakeRegisterTable(live_ids=['recRisk0', 'recRisk1', 'recRisk3', 'recRisk4'])
+
+    synced = risk_store.delta_sync_snapshot(snapshot, table, reconcile_interval=60)
+
+    assert table.requests == ['delta', 'reconcile']
+    assert references(synced) == ["R-0", "R-1", "R-3", "R-4"]
+    assert "R-2" not in risk_store.get_ref_index(synced['records_df'])
+    records_df = synced['records_df']
+    assert 'recRisk2' not in records_df['record_id'].iloc[risk_store.search_positions(records_df, "risk")].tolist()
+    assert synced['reconciled_at'] > snapshot['reconciled_at']
+
+
+def test_reconcile_waits_for_its_interval(register):
+    snapshot = snapshot_of(register, reconciled_ago=10)
+    table = FakeRegisterTable(live_ids=['recRisk0'])
+
+    synced = risk_store.delta_sync_snapshot(snapshot, table, reconcile_interval=60)
+
+    assert table.requests == ['delta']
+    assert len(synced['records_df']) == 5
+
+
+def test_delta_sync_picks_up_renamed_risk_types(register):
+    snapshot = snapshot_of(register)
+
+    synced = risk_store.delta_sync_snapshot(
+        snapshot, FakeRegisterTable(), risk_types_table=FakeRiskTypesTable({'recType1': "Data protection"})
+    )
+
+    assert synced['version'] > snapshot['version']
+    assert synced['risk_types_dict'] == {'recType1': "Data protection"}
+    display = risk_store.get_display_record(synced['records_df'], 0, synced['risk_types_dict'])
+    assert display['risk_type'] == "Data protection"
+
+
+def test_delta_sync_keeps_risk_types_it_cannot_fetch(register):
+    snapshot = snapshot_of(register)
+
+    synced = risk_store.delta_sync_snapshot(
+        snapshot, FakeRegisterTable(), risk_types_table=FakeRiskTypesTable(error=RuntimeError("403"))
+    )
+
+    assert synced['version'] == snapshot['version']
+    assert synced['risk_types_dict'] == {'recType1': "Privacy"}
@@ -0,0 +1,162 @@
+import os
+import sys
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import events  # noqa: E402
+import outbox  # noqa: E402
+
+
+def http_error(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return requests.HTTPError(f"{status_code} error", response=response)
+
+
+class FakeTable:
+    """Risk Changes table recording the batches it was sent
+
+    Like Airtable, a batch of more than 10 records or with a 'bad' field is refused as a
+    whole with a 422; errors queued in fail_next are raised by the next requests instead.
+    """
+
+    def __init__(self):
+        self.creates = []
+        self.updates = []
+        self.fail_next = []
+        self.created_count = 0
+
+    def check(self, records):
+        if self.fail_next:
+            raise self.fail_next.pop(0)
+        if len(records) > outbox.BATCH_SIZE or any(fields.get('bad') for fields in records):
+            raise http_error(422)
+
+    def batch_create(self, records):
+        self.check(records)
+        self.creates.append(records)
+        created = []
+        for fields in records:
+            self.created_count += 1
+            created.append({'id': f"recCreated{self.created_count}", 'createdTime': '', 'fields': fields})
+        return created
+
+    def batch_update(self, records):
+        self.check([record['fields'] for record in records])
+        self.updates.append(records)
+        return [{'id': record['id'], 'createdTime': '', 'fields': record['fields']} for record in records]
+
+
+@pytest.fixture
+def table(tmp_path, monkeypatch):
+    """A fresh outbox file with a FakeTable registered for 'risk_changes' and no flusher thread"""
+    monkeypatch.setattr(outbox, '_path', outbox._path)
+    monkeypatch.setattr(outbox, '_tables', {})
+    monkeypatch.setattr(outbox, 'start_flusher', lambda: None)
+    outbox.configure(str(tmp_path / "outbox.sqlite3"))
+    table = FakeTable()
+    outbox.register_table('risk_changes', table)
+    return table
+
+
+@pytest.fixture
+def published(monkeypatch):
+    """(records, details) of everything the outbox publishes, in order"""
+    published = []
+    monkeypatch.setattr(events, '_subscribers', {
+        'risk_changes': [lambda records, **details: published.append((records, details))]
+    })
+    return published
+
+
+def test_creates_are_sent_in_batches_of_ten(table, published):
+    entry_ids = outbox.enqueue_many('risk_changes', 'create', [(None, {'n': number}) for number in range(23)])
+    outbox.flush()
+
+    assert [len(batch) for batch in table.creates] == [10, 10, 3]
+    assert [fields['n'] for batch in table.creates for fields in batch] == list(range(23))
+    assert outbox.get_stats() == {'sent': 23}
+    # Each created record takes the place of its entry's provisional record
+    confirmed = [details for records, details in published if not details.get('pending')]
+    assert [replaced for details in confirmed for replaced in details['replaced_ids']] == [
+        outbox.pending_record_id(entry_id) for entry_id in entry_ids
+    ]
+
+
+def test_updates_to_one_record_are_merged(table, published):
+    outbox.enqueue_update('risk_changes', 'recA', {'Status': "Todo", 'FH Response': "Unsure"})
+    outbox.enqueue_update('risk_changes', 'recB', {'Status': "Todo"})
+    outbox.enqueue_update('risk_changes', 'recA', {'FH Response': "Accept"})
+    outbox.flush()
+
+    assert table.updates == [[
+        {'id': 'recA', 'fields': {'Status': "Todo", 'FH Response': "Accept"}},
+        {'id': 'recB', 'fields': {'Status': "Todo"}},
+    ]]
+    assert outbox.get_stats() == {'sent': 3}
+
+
+def test_batch_refused_for_one_bad_create_is_split(table, published):
+    entries = [(None, {'n': number, 'bad': number == 6}) for number in range(10)]
+    entry_ids = outbox.enqueue_many('risk_changes', 'create', entries)
+    outbox.flush()
+
+    assert sorted(fields['n'] for batch in table.creates for fields in batch) == [0, 1, 2, 3, 4, 5, 7, 8, 9]
+    assert outbox.get_stats() == {'sent': 9, 'failed': 1}
+    assert [row[0] for row in outbox.get_failed()] == [entry_ids[6]]
+    # The given-up save is taken out of the shared caches
+    given_up = [details for records, details in published if not records and not details.get('pending')]
+    assert given_up == [{'entry_ids': [entry_ids[6]], 'replaced_ids': [outbox.pending_record_id(entry_ids[6])]}]
+
+
+def test_batch_refused_for_one_bad_update_is_split(table, published):
+    for number in range(10):
+        outbox.enqueue_update('risk_changes', f"rec{number}", {'n': number, 'bad': number == 3})
+    outbox.flush()
+
+    assert sorted(record['id'] for batch in table.updates for record in batch) == [
+        f"rec{number}" for number in range(10) if number != 3
+    ]
+    assert outbox.get_stats() == {'sent': 9, 'failed': 1}
+    reverted = [details['reverted_ids'] for records, details in published if 'reverted_ids' in details]
+    assert reverted == [['rec3']]
+
+
+def test_retryable_error_keeps_the_batch_queued(table, published):
+    table.fail_next.append(http_error(503))
+    outbox.enqueue_many('risk_changes', 'create', [(None, {'n': number}) for number in range(4)])
+    outbox.flush()
+
+    # A server error isn't about the records - the batch is retried whole later, not split
+    assert table.creates == []
+    assert outbox.get_stats() == {'pending': 4}
+
+
+def test_update_to_pending_create_goes_to_the_created_record(table, published):
+    table.fail_next.append(http_error(503))
+    entry_id = outbox.enqueue_create('risk_changes', {'Original Risk Reference': "R-1"})
+    outbox.enqueue_update('risk_changes', outbox.pending_record_id(entry_id), {'FH Response': "Accept"})
+    outbox.flush()
+
+    # The create failed, so the update is held back rather than sent to the provisional ID
+    assert table.updates == []
+    assert outbox.get_stats() == {'pending': 2}
+
+    with outbox.connect() as conn:
+        conn.execute("UPDATE outbox SET next_attempt_at = 0")
+    outbox.flush()
+
+    assert table.updates == [[{'id': 'recCreated1', 'fields': {'FH Response': "Accept"}}]]
+    assert outbox.get_stats() == {'sent': 2}
+
+
+def test_update_to_given_up_create_is_given_up(table, published):
+    entry_id = outbox.enqueue_create('risk_changes', {'bad': True})
+    update_id = outbox.enqueue_update('risk_changes', outbox.pending_record_id(entry_id), {'FH Response': "Accept"})
+    outbox.flush()
+
+    assert table.updates == []
+    assert sorted(row[0] for row in outbox.get_failed()) == [entry_id, update_id]
@@ -0,0 +1,58 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import risk_scoring  # noqa: E402
+
+
+@pytest.mark.parametrize('score, level', [
+    (1, "1. Very Low"),
+    (3, "1. Very Low"),
+    (4, "2. Low"),
+    (6, "2. Low"),
+    (8, "3. Moderate"),
+    (12, "3. Moderate"),
+    (18, "4. High"),
+    (27, "5. Critical"),
+])
+def test_score_to_level_thresholds(score, level):
+    assert risk_scoring.score_to_level([score])[0] == level
+
+
+def test_score_to_level_missing_score():
+    assert list(risk_scoring.score_to_level([np.nan, 8])) == [None, "3. Moderate"]
+
+
+def test_score_risk_accepts_form_labels():
+    assert risk_scoring.score_risk("1. High", "1. High", "3. Low") == ("5. Critical", 27)
+    assert risk_scoring.score_risk("High", "High", "Medium") == ("4. High", 18)
+    # Detectability is inverted - easy to detect is the lowest score
+    assert risk_scoring.score_risk("3. Low", "3. Low", "1. High") == ("1. Very Low", 1)
+    assert risk_scoring.score_risk("1. High", None, "3. Low") == (None, None)
+
+
+def test_score_risks_matches_score_risk():
+    severity = ["1. High", "2. Medium", None, "Low", ["High"]]
+    likelihood = ["2. Medium", "2. Medium", "1. High", "Low", "High"]
+    detectability = ["3. Low", "1. High", "2. Medium", "Low", "Low"]
+    scores, levels = risk_scoring.score_risks(severity, likelihood, detectability)
+
+    assert [scores[0], scores[1], scores[3]] == [18, 4, 3]
+    assert np.isnan(scores[2])
+    assert list(levels[:4]) == ["4. High", "2. Low", None, "1. Very Low"]
+    # Lookup fields can come back as lists - they are scored as text, unrecognised values counting as 1
+    assert scores[4] == 9
+    for row in range(4):
+        if severity[row]:
+            assert risk_scoring.score_risk(severity[row], likelihood[row], detectability[row]) == (levels[row], scores[row])
+
+
+def test_format_risk_level():
+    assert risk_scoring.format_risk_level(18) == "4. High (Score: 18.0)"
+    assert risk_scoring.format_risk_level("7", with_score=False) == "2. Low"
+    assert risk_scoring.format_risk_level("3. Moderate") == "3. Moderate"
+    assert risk_scoring.format_risk_level(float('nan')) == ""
@@ -0,0 +1,45 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import search_index  # noqa: E402
+
+DESCRIPTION = next(iter(search_index.SEARCH_FIELDS))
+
+
+def columns(descriptions):
+    return {DESCRIPTION: np.array(descriptions, dtype=object)}
+
+
+def postings(index):
+    """{term: {record_id: weight}} - comparable across indexes that number documents differently"""
+    return {
+        term: {index['record_ids'][number]: weight for number, weight in zip(documents, weights)}
+        for term, (documents, weights) in index['postings'].items()
+    }
+
+
+def test_update_after_delete_matches_build():
+    record_ids = [f"recRisk{number:03d}" for number in range(50)]
+    descriptions = [f"Data leakage in step {number}" for number in range(50)]
+    index = search_index.build(record_ids, columns(descriptions))
+
+    # One sync deletes a risk...
+    deleted = record_ids[10]
+    index = search_index.update(index, [deleted], columns([descriptions[10]]), [], columns([]), deleted_ids=[deleted])
+    # ...and the next one adds a new risk
+    index = search_index.update(index, [], columns([]), ['recNEW'], columns(["Quokka escalation"]))
+
+    live_ids = [record_id for record_id in record_ids if record_id != deleted] + ['recNEW']
+    live_descriptions = [text for record_id, text in zip(record_ids, descriptions) if record_id != deleted]
+    fresh = search_index.build(live_ids, columns(live_descriptions + ["Quokka escalation"]))
+
+    assert search_index.search(index, "quokka") == ['recNEW']
+    assert search_index.search(index, "step 49") == ['recRisk049']
+    assert deleted not in search_index.search(index, "data", limit=None)
+    assert postings(index) == postings(fresh)
+    assert index['terms'] == fresh['terms']
+    assert index['count'] == fresh['count']